@@ -0,0 +1,38 @@
+import sys
+import time
+from typing import Dict
+
+import numpy as np
+
+from core.egram_codec import (DEFAULT_SAMPLES_PER_FRAME, MAX_SAMPLES_PER_FRAME, compare_encodings,
+                              decode_packed, encode_packed, load_trace, sample_rate, synthetic_trace)
+
+
+def benchmark(frames: int = 20000, samples_per_frame: int = DEFAULT_SAMPLES_PER_FRAME,
+              seed: int = 0) -> Dict[str, float]:
+    """decode speed of packed payloads, in samples per channel per second"""
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 4096, size=(frames, samples_per_frame, 2))
+    payloads = [encode_packed(i * samples_per_frame, d[:, 0], d[:, 1]) for i, d in enumerate(data)]
+    start = time.perf_counter()
+    total = 0
+    for payload in payloads:
+        total += len(decode_packed(payload)[1])
+    elapsed = time.perf_counter() - start
+    return {"decoded_samples_per_s": total / elapsed,
+            "link_samples_per_s": sample_rate(samples_per_frame=samples_per_frame),
+            "legacy_link_samples_per_s": sample_rate(samples_per_frame=0)}
+
+
+if __name__ == "__main__":
+    for k in (1, 8, DEFAULT_SAMPLES_PER_FRAME, MAX_SAMPLES_PER_FRAME):
+        print(f"K={k:2d}: v1 {sample_rate(samples_per_frame=k, frame_version=1):6.0f} Hz, "
+              f"v2 {sample_rate(samples_per_frame=k):6.0f} Hz per channel at 115200 baud")
+    print(f"legacy 0xE0: {sample_rate(samples_per_frame=0):.0f} Hz")
+    r = benchmark()
+    print(f"decode: {r['decoded_samples_per_s']:,.0f} samples/s per channel")
+    trace = load_trace(sys.argv[1]) if len(sys.argv) > 1 else synthetic_trace()
+    c = compare_encodings(*trace)
+    print(f"replayed {len(trace[0])} samples: legacy {c['legacy_hz']:.0f} Hz, packed {c['packed_hz']:.0f} Hz, "
+          f"delta {c['delta_hz']:.0f} Hz ({c['delta_bytes_per_sample']:.2f} bytes/sample, "
+          f"lossless={c['lossless']}), delta decode {c['delta_decode_samples_per_s']:,.0f} samples/s")
@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+
+from core.filters import (DEFAULT_SAMPLE_RATE, MAINS_FREQUENCY, FirStage, IirStage,
+                          default_filter_bank, lowpass_taps, notch_sos, notch_taps)
+
+
+def _signal(fs: float, seconds: float) -> np.ndarray:
+    t = np.arange(int(fs * seconds)) / fs
+    return np.column_stack((512 + 100 * np.sin(2 * np.pi * 1.2 * t),
+                            512 + 100 * np.sin(2 * np.pi * MAINS_FREQUENCY * t)))
+
+
+def _throughput(stage, signal: np.ndarray, fs: float, chunk: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(signal), chunk):
+        stage.process(signal[i:i + chunk])
+    elapsed = time.perf_counter() - start
+    return (len(signal) / elapsed) / fs
+
+
+def benchmark(fs: float = DEFAULT_SAMPLE_RATE, seconds: float = 10.0, chunk: int = 64) -> float:
+    """
+    Push `seconds` of synthetic two-channel egram through the default bank in
+    `chunk`-sample batches. Returns throughput as a multiple of fs.
+    """
+    return _throughput(default_filter_bank(fs), _signal(fs, seconds), fs, chunk)
+
+
+def stage_benchmark(fs: float = DEFAULT_SAMPLE_RATE, seconds: float = 10.0, chunk: int = 64) -> dict:
+    """throughput of the notch and low-pass stages on their own, as multiples of fs"""
+    signal = _signal(fs, seconds)
+    stages = {
+        "iir notch": IirStage(notch_sos(MAINS_FREQUENCY, fs)),
+        "fir notch": FirStage(notch_taps(MAINS_FREQUENCY, fs)),
+        "fir low-pass": FirStage(lowpass_taps(100.0, fs)),
+    }
+    return {name: _throughput(stage, signal, fs, chunk) for name, stage in stages.items()}
+
+
+if __name__ == "__main__":
+    for chunk in (16, 64, 256):
+        print(f"chunk={chunk:4d}: {benchmark(chunk=chunk):8.1f}x real time at {DEFAULT_SAMPLE_RATE:.0f} Hz")
+        for name, speed in stage_benchmark(chunk=chunk).items():
+            print(f"    {name:12s} {speed:8.1f}x")
@@ -0,0 +1,35 @@
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from core.pacing_sim import screen, synthetic_activity
+from core.param_sweep import grid_size
+
+
+def benchmark(mode: str = "DDDR", traces: int = 4, seconds: float = 3600.0,
+              base: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """
+    Screen a rate-response grid (response factor x activity threshold x
+    reaction time x recovery time) against `traces` one-hour activity traces
+    with a 70 ppm sinus rhythm, and time it against the bench time the same
+    runs would need.
+    """
+    base = base or dict(LRL=60, URL=130, MSR=150, AV_delay=150, PVARP=250, ARP=250, VRP=320,
+                        activity_threshold=4, reaction_time=30, recovery_time=5, response_factor=8)
+    axes = {"response_factor": list(range(1, 17)), "activity_threshold": list(range(1, 8)),
+            "reaction_time": [10, 20, 30, 40, 50], "recovery_time": [2, 4, 8, 16]}
+    activity = np.stack([synthetic_activity(seconds, seed=s) for s in range(traces)])
+    start = time.perf_counter()
+    result = screen(base, axes, mode, activity, intrinsic_rate=70.0)
+    elapsed = time.perf_counter() - start
+    runs = len(result["index"]) * traces
+    return {"parameter_sets": len(result["index"]), "grid_size": grid_size(axes), "runs": runs,
+            "seconds": elapsed, "simulated_hours": runs * seconds / 3600.0,
+            "max_peak_rate": float(result["peak_rate"].max())}
+
+
+if __name__ == "__main__":
+    r = benchmark()
+    print(f"{r['parameter_sets']} parameter sets x 4 traces = {r['runs']} runs "
+          f"({r['simulated_hours']:.0f} h of pacing) in {r['seconds']:.2f} s")
@@ -0,0 +1,180 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .egram_shm import attach_segment
+
+CHANNELS = ("atrial", "ventricular")
+
+# (key, dtype string, shape, byte offset) for each array packed into a block
+_Layout = List[Tuple[str, str, Tuple[int, ...], int]]
+
+
+def window_from_buffer(buffer) -> Dict[str, np.ndarray]:
+    """
+    Snapshot egram history into plain arrays: "<channel>" for values and
+    "<channel>_t" for timestamps. Accepts an EgramBuffer or the GUI's
+    {channel: deque[(timestamp, value)]} dict.
+    """
+    window = {}
+    for ch in CHANNELS:
+        if hasattr(buffer, "buffers"):
+            samples = list(buffer.buffers[ch])
+            ts = np.fromiter((s.timestamp for s in samples), dtype=np.float64, count=len(samples))
+            vals = np.fromiter((s.value for s in samples), dtype=np.float64, count=len(samples))
+        else:
+            pairs = list(buffer[ch])
+            arr = np.asarray(pairs, dtype=np.float64).reshape(-1, 2)
+            ts, vals = arr[:, 0].copy(), arr[:, 1].copy()
+        window[f"{ch}_t"] = ts
+        window[ch] = vals
+    return window
+
+
+def summarize(window: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+    """min / max / mean / rms and sample count per channel"""
+    out = {}
+    for ch in CHANNELS:
+        vals = window.get(ch)
+        if vals is None or len(vals) == 0:
+            out[ch] = {"count": 0}
+            continue
+        out[ch] = {
+            "count": int(len(vals)),
+            "min": float(vals.min()),
+            "max": float(vals.max()),
+            "mean": float(vals.mean()),
+            "rms": float(np.sqrt(np.mean(np.square(vals)))),
+        }
+    return out
+
+
+def detect_beats(window: Dict[str, np.ndarray], threshold: Optional[float] = None,
+                 refractory: float = 0.2) -> Dict[str, Dict[str, float]]:
+    """
+    Count upward threshold crossings per channel, ignoring crossings inside
+    the refractory time (s) after a detected beat, and report the mean rate.
+    Without a threshold the midpoint of each channel's range is used.
+    Raises ValueError for a non-numeric threshold or a channel without a
+    "<ch>_t" timestamp per sample.
+    """
+    if threshold is not None and not isinstance(threshold, (int, float, np.number)):
+        raise ValueError(f"threshold must be a number, not {threshold!r}")
+    out = {}
+    for ch in CHANNELS:
+        vals = window.get(ch)
+        ts = window.get(f"{ch}_t")
+        if vals is None or len(vals) < 2:
+            out[ch] = {"beats": 0, "rate_bpm": 0.0}
+            continue
+        if ts is None or len(ts) != len(vals):
+            raise ValueError(f"{ch} needs one {ch}_t timestamp per sample")
+        level = threshold if threshold is not None else (vals.min() + vals.max()) / 2
+        above = vals > level
+        crossings = ts[1:][above[1:] & ~above[:-1]]
+        beats = []
+        for t in crossings:
+            if not beats or t - beats[-1] >= refractory:
+                beats.append(t)
+        rate = 0.0
+        if len(beats) > 1:
+            rate = 60.0 / float(np.mean(np.diff(beats)))
+        out[ch] = {"beats": len(beats), "rate_bpm": rate}
+    return out
+
+
+def _run_in_worker(func: Callable, shm_name: Optional[str], layout: _Layout, kwargs: dict):
+    """worker side: map the arrays out of shared memory and run the job"""
+    if shm_name is None:
+        return func({key: np.empty(shape, dtype=dtype) for key, dtype, shape, _ in layout}, **kwargs)
+    shm = attach_segment(shm_name)
+    try:
+        window = {
+            key: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for key, dtype, shape, offset in layout
+        }
+        result = func(window, **kwargs)
+        del window
+        return result
+    finally:
+        shm.close()
+
+
+class AnalysisExecutor:
+    """
+    Runs CPU-heavy egram jobs in worker processes so the Tk thread and the
+    serial reader thread never wait on them.
+
+    Arrays are copied once into a shared memory block instead of being pickled,
+    the worker maps them in place. Results are handed to `callback(result, error)`
+    through `dispatch`, e.g. `dispatch=lambda fn: root.after(0, fn)` for Tk.
+    """
+    def __init__(self, max_workers: Optional[int] = None,
+                 dispatch: Optional[Callable[[Callable[[], None]], None]] = None):
+        self.max_workers = max_workers
+        self.dispatch = dispatch
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that owns Tk and serial threads is unsafe
+                ctx = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+            return self._pool
+
+    def submit(self, func: Callable, window: Dict[str, np.ndarray],
+               callback: Optional[Callable] = None, **kwargs) -> Future:
+        """
+        Queue func(window, **kwargs) on the pool. func must be a module-level
+        function so the worker can import it, and its result must not keep
+        views of the window since the block is freed when the job ends.
+        """
+        arrays = {key: np.ascontiguousarray(val) for key, val in window.items()}
+        layout: _Layout = []
+        offset = 0
+        for key, arr in arrays.items():
+            layout.append((key, arr.dtype.str, arr.shape, offset))
+            offset += arr.nbytes
+
+        shm = None
+        if offset:
+            shm = shared_memory.SharedMemory(create=True, size=offset)
+            for (key, dtype, shape, start), arr in zip(layout, arrays.values()):
+                np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)[...] = arr
+
+        try:
+            future = self._get_pool().submit(
+                _run_in_worker, func, shm.name if shm else None, layout, kwargs)
+        except Exception:
+            if shm:
+                shm.close()
+                shm.unlink()
+            raise
+
+        def _done(fut: Future):
+            if shm:
+                shm.close()
+                shm.unlink()
+            if callback is None or fut.cancelled():
+                return
+            error = fut.exception()
+            result = None if error else fut.result()
+            if self.dispatch:
+                self.dispatch(lambda: callback(result, error))
+            else:
+                callback(result, error)
+
+        future.add_done_callback(_done)
+        return future
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
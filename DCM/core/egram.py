@@ -40,6 +40,16 @@ class EgramBuffer:
     def add_samples(self, samples: List[tuple]):
         for ch, val, ts in samples:
             self.add_sample(ch,val,ts)
+
+    def add_batch(self, timestamps, atrial, ventricular) -> None:
+        """
+        Add one batch in the SerialInterface.egram_batch_callback layout:
+        parallel sequences of timestamps and atrial / ventricular values.
+        """
+        self.buffers["atrial"].extend(
+            EgramSample(timestamp=ts, channel="atrial", value=val) for ts, val in zip(timestamps, atrial))
+        self.buffers["ventricular"].extend(
+            EgramSample(timestamp=ts, channel="ventricular", value=val) for ts, val in zip(timestamps, ventricular))
     
     def get_recent(self, channel:str, n:int) -> List[EgramSample]:
         if channel not in self.buffers:
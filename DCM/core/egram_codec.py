@@ -0,0 +1,241 @@
+import struct
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# packed egram frame: sample counter of the first sample, then K interleaved
+# (atrial, ventricular) samples, all little-endian uint16
+CMD_EGRAM_PACKED = 0xE1
+PACKED_HEADER = struct.Struct("<H")
+SAMPLE_DTYPE = np.dtype("<u2")
+COUNTER_MOD = 1 << 16
+
+DEFAULT_SAMPLES_PER_FRAME = 32
+# what still fits the one-byte length of a v2 frame
+MAX_SAMPLES_PER_FRAME = (255 - PACKED_HEADER.size) // (2 * SAMPLE_DTYPE.itemsize)
+
+# delta frame (v2 framing only, the payload length varies):
+#   counter u16 | count u8 | flags u8 | [keyframe: atrial u16, ventricular u16] | deltas
+# Deltas are zig-zag coded and interleaved (a, v); the flags pick one width
+# for the whole frame, so a frame decodes in a few array operations.
+CMD_EGRAM_DELTA = 0xE2
+DELTA_HEADER = struct.Struct("<HBB")
+KEYFRAME = 0x80
+WIDTH_BITS = (4, 8, 16)             # flags & 0x03 indexes this
+DEFAULT_KEYFRAME_INTERVAL = 16
+# even at 16-bit deltas a keyframe of this many samples fits a v2 frame
+MAX_DELTA_SAMPLES = (255 - DELTA_HEADER.size - 4) // 4
+DEFAULT_DELTA_SAMPLES = 60
+
+# bytes per frame outside the payload, and the legacy 0xE0 frame (one sample per channel)
+FRAME_OVERHEAD = {1: 2, 2: 6}
+LEGACY_FRAME_BYTES = 2 + 21
+
+
+def packed_size(samples: int) -> int:
+    """payload bytes of a packed frame carrying `samples` per channel"""
+    return PACKED_HEADER.size + 2 * samples * SAMPLE_DTYPE.itemsize
+
+
+def encode_packed(counter: int, atrial: Sequence[int], ventricular: Sequence[int]) -> bytes:
+    atrial = np.asarray(atrial)
+    ventricular = np.asarray(ventricular)
+    if atrial.shape != ventricular.shape or atrial.ndim != 1:
+        raise ValueError("atrial and ventricular need the same number of samples")
+    if not 0 < len(atrial) <= MAX_SAMPLES_PER_FRAME:
+        raise ValueError(f"a packed frame holds 1-{MAX_SAMPLES_PER_FRAME} samples per channel")
+    samples = np.empty((len(atrial), 2), dtype=SAMPLE_DTYPE)
+    samples[:, 0] = atrial
+    samples[:, 1] = ventricular
+    return PACKED_HEADER.pack(counter % COUNTER_MOD) + samples.tobytes()
+
+
+def decode_packed(payload: bytes) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    (counter, atrial, ventricular) from one packed payload. The sample arrays
+    are read-only views over the payload, no per-sample Python work.
+    """
+    body = len(payload) - PACKED_HEADER.size
+    if body <= 0 or body % (2 * SAMPLE_DTYPE.itemsize):
+        raise ValueError(f"{len(payload)} bytes is not a packed egram payload")
+    counter, = PACKED_HEADER.unpack_from(payload)
+    samples = np.frombuffer(payload, dtype=SAMPLE_DTYPE, offset=PACKED_HEADER.size).reshape(-1, 2)
+    return counter, samples[:, 0], samples[:, 1]
+
+
+def counter_gap(expected: int, counter: int) -> int:
+    """samples missing between the expected and the received counter, mod 2**16"""
+    return (counter - expected) % COUNTER_MOD
+
+
+def _zigzag(d: np.ndarray) -> np.ndarray:
+    return ((d << 1) ^ (d >> 63)).astype(np.uint32)
+
+
+def _unzigzag(z: np.ndarray) -> np.ndarray:
+    z = z.astype(np.int64)
+    return (z >> 1) ^ -(z & 1)
+
+
+class DeltaEncoder:
+    """
+    Device side of the delta stream (the firmware does the same); used by
+    PtyDevice and the benchmarks. Every `keyframe_interval`-th frame carries
+    the first sample raw so a decoder can join or resync.
+    """
+    def __init__(self, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._frames = 0
+        self._last: Optional[np.ndarray] = None
+
+    def encode(self, counter: int, atrial: Sequence[int], ventricular: Sequence[int]) -> bytes:
+        samples = np.stack([np.asarray(atrial, dtype=np.int64), np.asarray(ventricular, dtype=np.int64)], axis=1)
+        if not 0 < len(samples) <= MAX_DELTA_SAMPLES:
+            raise ValueError(f"a delta frame holds 1-{MAX_DELTA_SAMPLES} samples per channel")
+        key = self._last is None or self._frames % self.keyframe_interval == 0
+        self._frames += 1
+        rest = samples if key else np.concatenate([self._last[None, :], samples])
+        self._last = samples[-1]
+        # wrap deltas into int16 so 16-bit samples always round-trip
+        deltas = (np.diff(rest, axis=0).ravel() + 0x8000) % 0x10000 - 0x8000
+        z = _zigzag(deltas)
+        code = 0 if z.max(initial=0) < 16 else 1 if z.max() < 256 else 2
+        if code == 0:
+            if len(z) % 2:
+                z = np.append(z, 0)
+            body = (z[0::2] | z[1::2] << 4).astype(np.uint8).tobytes()
+        else:
+            body = z.astype(np.uint8 if code == 1 else "<u2").tobytes()
+        flags = code | (KEYFRAME if key else 0)
+        payload = DELTA_HEADER.pack(counter % COUNTER_MOD, len(samples), flags)
+        if key:
+            payload += struct.pack("<HH", *(int(x) % COUNTER_MOD for x in samples[0]))
+        return payload + body
+
+
+class DeltaDecoder:
+    """
+    Streaming decoder for delta frames. decode() expands a whole frame at once
+    (unpack, zig-zag, cumulative sum) and returns (counter, atrial,
+    ventricular), or None while it waits for a keyframe after a lost frame.
+    """
+    def __init__(self):
+        self._last: Optional[np.ndarray] = None
+        self._expected: Optional[int] = None
+        self.stats = {"frames": 0, "keyframes": 0, "skipped": 0}
+
+    def reset(self) -> None:
+        self._last = None
+        self._expected = None
+
+    def decode(self, payload: bytes) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        if len(payload) < DELTA_HEADER.size:
+            raise ValueError(f"{len(payload)} bytes is not a delta egram payload")
+        counter, count, flags = DELTA_HEADER.unpack_from(payload)
+        key = bool(flags & KEYFRAME)
+        width = WIDTH_BITS[flags & 0x03]
+        offset = DELTA_HEADER.size
+        if key:
+            first = np.frombuffer(payload, dtype="<u2", count=2, offset=offset).astype(np.int64)
+            offset += 4
+            n = 2 * (count - 1)
+        else:
+            if self._last is None or counter != self._expected:
+                self._last = None          # lost a frame, wait for the next keyframe
+                self.stats["skipped"] += 1
+                return None
+            first = self._last
+            n = 2 * count
+        body = payload[offset:]
+        if width == 4:
+            packed = np.frombuffer(body, dtype=np.uint8)
+            z = np.empty(2 * len(packed), dtype=np.uint8)
+            z[0::2] = packed & 0x0F
+            z[1::2] = packed >> 4
+        else:
+            z = np.frombuffer(body, dtype=np.uint8 if width == 8 else "<u2")
+        if len(z) < n:
+            raise ValueError(f"delta frame carries {len(z)} deltas, expected {n}")
+        deltas = _unzigzag(z[:n]).reshape(-1, 2)
+        if key:
+            values = np.concatenate([first[None, :], first + np.cumsum(deltas, axis=0)])
+        else:
+            values = first + np.cumsum(deltas, axis=0)
+        values &= 0xFFFF
+        self._last = values[-1]
+        self._expected = (counter + count) % COUNTER_MOD
+        self.stats["frames"] += 1
+        self.stats["keyframes"] += key
+        return counter, values[:, 0], values[:, 1]
+
+
+def sample_rate(baudrate: int = 115200, samples_per_frame: int = DEFAULT_SAMPLES_PER_FRAME,
+                frame_version: int = 2, bits_per_byte: int = 10) -> float:
+    """
+    Samples per second per channel a link can carry; samples_per_frame=0 is
+    the legacy 0xE0 frame. 8N1 costs 10 bits per byte.
+    """
+    bytes_per_s = baudrate / bits_per_byte
+    if samples_per_frame == 0:
+        return bytes_per_s / LEGACY_FRAME_BYTES
+    frame = FRAME_OVERHEAD[frame_version] + packed_size(samples_per_frame)
+    return bytes_per_s * samples_per_frame / frame
+
+
+def compare_encodings(atrial: Sequence[int], ventricular: Sequence[int], baudrate: int = 115200,
+                      samples_per_frame: int = DEFAULT_SAMPLES_PER_FRAME,
+                      delta_samples: int = DEFAULT_DELTA_SAMPLES,
+                      keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL) -> Dict[str, float]:
+    """
+    Replay a trace through the packed and the delta encodings over v2 frames
+    and return the sample rate per channel each sustains at `baudrate`.
+    Also checks the delta stream decodes back to the trace.
+    """
+    atrial = np.asarray(atrial, dtype=np.int64) % COUNTER_MOD
+    ventricular = np.asarray(ventricular, dtype=np.int64) % COUNTER_MOD
+    n = len(atrial)
+    overhead = FRAME_OVERHEAD[2]
+    raw_bytes = sum(overhead + packed_size(min(samples_per_frame, n - lo))
+                    for lo in range(0, n, samples_per_frame))
+    encoder, decoder = DeltaEncoder(keyframe_interval), DeltaDecoder()
+    payloads = [encoder.encode(lo, atrial[lo:lo + delta_samples], ventricular[lo:lo + delta_samples])
+                for lo in range(0, n, delta_samples)]
+    delta_bytes = sum(overhead + len(p) for p in payloads)
+    start = time.perf_counter()
+    decoded = [decoder.decode(p) for p in payloads]
+    decode_time = time.perf_counter() - start
+    exact = (np.array_equal(np.concatenate([d[1] for d in decoded]), atrial)
+             and np.array_equal(np.concatenate([d[2] for d in decoded]), ventricular))
+    bytes_per_s = baudrate / 10
+    return {
+        "legacy_hz": sample_rate(baudrate, 0),
+        "packed_hz": bytes_per_s * n / raw_bytes,
+        "delta_hz": bytes_per_s * n / delta_bytes,
+        "delta_bytes_per_sample": delta_bytes / n,
+        "delta_decode_samples_per_s": n / decode_time,
+        "lossless": exact,
+    }
+
+
+def load_trace(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(atrial, ventricular) from an egram_export CSV or columnar recording"""
+    if path.endswith(".csv"):
+        data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        return data[:, 1].round(), data[:, 2].round()
+    from .egram_export import ColumnarReader
+    with ColumnarReader(path) as reader:
+        batches = list(reader.query())
+    return (np.concatenate([b[1] for b in batches]).round(),
+            np.concatenate([b[2] for b in batches]).round())
+
+
+def synthetic_trace(seconds: float = 10.0, rate: float = 1000.0, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """12-bit intracardiac-like trace: baseline wander, noise and a beat each second"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    base = 2048 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = t % 1.0
+    atrial = base + 600 * np.exp(-((phase - 0.10) / 0.01) ** 2) + rng.normal(0, 2, len(t))
+    ventricular = base + 1500 * np.exp(-((phase - 0.25) / 0.008) ** 2) + rng.normal(0, 2, len(t))
+    return atrial.round(), ventricular.round()
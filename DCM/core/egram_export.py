@@ -0,0 +1,243 @@
+import csv
+import os
+import struct
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 4096
+
+# chunked columnar layout:
+#   "EGC1" | chunk* | index | "EGIX" u64(index offset) "EGC1"
+# each chunk is a fixed header followed by n float64 timestamps and
+# n float32 atrial / ventricular values
+FILE_MAGIC = b"EGC1"
+CHUNK_MAGIC = b"CHNK"
+INDEX_MAGIC = b"EGIX"
+_CHUNK_HEADER = struct.Struct("<4sIdddddd")   # magic, n, t/a/v min+max
+_INDEX_ENTRY = struct.Struct("<QIdddddd")     # offset, n, t/a/v min+max
+_TRAILER = struct.Struct("<4sQ4s")
+
+CSV_HEADER = ["timestamp", "atrial", "ventricular"]
+
+Batch = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+@dataclass(frozen=True)
+class ChunkInfo:
+    offset: int
+    count: int
+    t_min: float
+    t_max: float
+    atrial_min: float
+    atrial_max: float
+    ventricular_min: float
+    ventricular_max: float
+
+
+def iter_batches(source, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Batch]:
+    """
+    Walk an EgramBuffer (or the GUI's {channel: deque[(timestamp, value)]})
+    in chunk_size rows without copying the whole history. Channels are paired
+    by position from the newest sample backwards, timestamps come from atrial.
+    """
+    if hasattr(source, "buffers"):
+        atrial, ventricular = source.buffers["atrial"], source.buffers["ventricular"]
+        row = lambda a, v: (a.timestamp, a.value, v.value)
+    else:
+        atrial, ventricular = source["atrial"], source["ventricular"]
+        row = lambda a, v: (a[0], a[1], v[1])
+    n = min(len(atrial), len(ventricular))
+    pairs = zip(islice(atrial, len(atrial) - n, None), islice(ventricular, len(ventricular) - n, None))
+    while True:
+        rows = [row(a, v) for a, v in islice(pairs, chunk_size)]
+        if not rows:
+            return
+        block = np.asarray(rows, dtype=np.float64)
+        yield block[:, 0], block[:, 1], block[:, 2]
+
+
+class _ChunkedWriter(ABC):
+    """
+    collects batches into fixed-size chunks so memory stays bounded;
+    subclasses write each full chunk in _write_chunk
+    """
+    def __init__(self, chunk_size: int):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.chunk_size = chunk_size
+        self._ts = np.empty(chunk_size, dtype=np.float64)
+        self._a = np.empty(chunk_size, dtype=np.float64)
+        self._v = np.empty(chunk_size, dtype=np.float64)
+        self._fill = 0
+        self.rows_written = 0
+
+    def write_batch(self, timestamps, atrial, ventricular) -> None:
+        """same signature as SerialInterface.egram_batch_callback"""
+        ts = np.asarray(timestamps, dtype=np.float64)
+        a = np.asarray(atrial, dtype=np.float64)
+        v = np.asarray(ventricular, dtype=np.float64)
+        pos = 0
+        while pos < len(ts):
+            take = min(self.chunk_size - self._fill, len(ts) - pos)
+            end = self._fill + take
+            self._ts[self._fill:end] = ts[pos:pos + take]
+            self._a[self._fill:end] = a[pos:pos + take]
+            self._v[self._fill:end] = v[pos:pos + take]
+            self._fill = end
+            pos += take
+            if self._fill == self.chunk_size:
+                self.flush()
+
+    def flush(self) -> None:
+        if self._fill:
+            n = self._fill
+            self._write_chunk(self._ts[:n], self._a[:n], self._v[:n])
+            self.rows_written += n
+            self._fill = 0
+
+    @abstractmethod
+    def _write_chunk(self, ts, a, v) -> None:
+        """write one chunk, given as equal-length timestamp/atrial/ventricular arrays"""
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvExporter(_ChunkedWriter):
+    """streams egram rows to CSV one chunk at a time"""
+    def __init__(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(chunk_size)
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(CSV_HEADER)
+
+    def _write_chunk(self, ts, a, v) -> None:
+        self.writer.writerows(zip(ts.tolist(), a.tolist(), v.tolist()))
+
+    def close(self) -> None:
+        super().close()
+        self.file.close()
+
+
+class ColumnarExporter(_ChunkedWriter):
+    """
+    Writes the chunked columnar format. Each chunk carries min/max statistics
+    so ColumnarReader can skip chunks outside a query without reading them.
+    """
+    def __init__(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(chunk_size)
+        self.file = open(path, "wb")
+        self.file.write(FILE_MAGIC)
+        self.index: List[ChunkInfo] = []
+
+    def _write_chunk(self, ts, a, v) -> None:
+        info = ChunkInfo(self.file.tell(), len(ts), float(ts.min()), float(ts.max()),
+                         float(a.min()), float(a.max()), float(v.min()), float(v.max()))
+        self.file.write(_CHUNK_HEADER.pack(CHUNK_MAGIC, *_stats(info)))
+        self.file.write(ts.astype("<f8").tobytes())
+        self.file.write(a.astype("<f4").tobytes())
+        self.file.write(v.astype("<f4").tobytes())
+        self.index.append(info)
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        super().close()
+        index_offset = self.file.tell()
+        for info in self.index:
+            self.file.write(_INDEX_ENTRY.pack(info.offset, *_stats(info)))
+        self.file.write(_TRAILER.pack(INDEX_MAGIC, index_offset, FILE_MAGIC))
+        self.file.close()
+
+
+def _stats(info: ChunkInfo) -> tuple:
+    return (info.count, info.t_min, info.t_max, info.atrial_min, info.atrial_max,
+            info.ventricular_min, info.ventricular_max)
+
+
+class ColumnarReader:
+    """Reads a columnar egram file, using the chunk index to skip data."""
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        if self.file.read(4) != FILE_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a columnar egram file")
+        self.chunks = self._load_index()
+
+    def _load_index(self) -> List[ChunkInfo]:
+        size = self.file.seek(0, os.SEEK_END)
+        if size >= 4 + _TRAILER.size:
+            self.file.seek(size - _TRAILER.size)
+            magic, index_offset, end = _TRAILER.unpack(self.file.read(_TRAILER.size))
+            if magic == INDEX_MAGIC and end == FILE_MAGIC:
+                self.file.seek(index_offset)
+                raw = self.file.read(size - _TRAILER.size - index_offset)
+                return [ChunkInfo(*entry) for entry in _INDEX_ENTRY.iter_unpack(raw)]
+        # no index (recording was cut short): hop from header to header
+        chunks = []
+        offset = 4
+        while offset + _CHUNK_HEADER.size <= size:
+            self.file.seek(offset)
+            magic, *stats = _CHUNK_HEADER.unpack(self.file.read(_CHUNK_HEADER.size))
+            end = offset + _CHUNK_HEADER.size + stats[0] * 16
+            if magic != CHUNK_MAGIC or end > size:
+                break
+            chunks.append(ChunkInfo(offset, *stats))
+            offset = end
+        return chunks
+
+    def __len__(self) -> int:
+        return sum(c.count for c in self.chunks)
+
+    def read_chunk(self, info: ChunkInfo) -> Batch:
+        self.file.seek(info.offset + _CHUNK_HEADER.size)
+        raw = self.file.read(info.count * 16)
+        n = info.count
+        ts = np.frombuffer(raw, dtype="<f8", count=n)
+        a = np.frombuffer(raw, dtype="<f4", count=n, offset=n * 8).astype(np.float64)
+        v = np.frombuffer(raw, dtype="<f4", count=n, offset=n * 12).astype(np.float64)
+        return ts, a, v
+
+    def query(self, t0: Optional[float] = None, t1: Optional[float] = None) -> Iterator[Batch]:
+        """yield the rows with t0 <= timestamp <= t1, one chunk at a time"""
+        lo = -np.inf if t0 is None else t0
+        hi = np.inf if t1 is None else t1
+        for info in self.chunks:
+            if info.t_max < lo or info.t_min > hi:
+                continue
+            ts, a, v = self.read_chunk(info)
+            if info.t_min < lo or info.t_max > hi:
+                mask = (ts >= lo) & (ts <= hi)
+                ts, a, v = ts[mask], a[mask], v[mask]
+            yield ts, a, v
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_egram(source, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Export an EgramBuffer (or GUI egram dict) to CSV or, for any other
+    extension, the columnar format. Returns the number of rows written.
+    """
+    exporter_cls = CsvExporter if path.lower().endswith(".csv") else ColumnarExporter
+    with exporter_cls(path, chunk_size) as exporter:
+        for batch in iter_batches(source, chunk_size):
+            exporter.write_batch(*batch)
+    return exporter.rows_written
@@ -0,0 +1,152 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHANNELS = ("atrial", "ventricular")
+
+# each summary level collapses SUMMARY_FACTOR entries of the level below
+SUMMARY_FACTOR = 8
+
+
+class _Growable:
+    """append-only float64 array with amortised doubling"""
+    def __init__(self, capacity: int = 1024):
+        self.data = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+    def extend(self, values: np.ndarray) -> None:
+        need = self.size + len(values)
+        if need > len(self.data):
+            # fresh allocation instead of resize, so views handed out earlier stay valid
+            grown = np.empty(max(need, 2 * len(self.data)), dtype=np.float64)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:need] = values
+        self.size = need
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class _SummaryLevel:
+    """min/max envelope of fixed-size blocks, one row per block"""
+    def __init__(self, block: int):
+        self.block = block
+        self.t = _Growable()
+        self.mins = {ch: _Growable() for ch in CHANNELS}
+        self.maxs = {ch: _Growable() for ch in CHANNELS}
+
+    def __len__(self) -> int:
+        return self.t.size
+
+
+class EgramHistory:
+    """
+    Time-indexed egram store for a whole session.
+
+    Samples arrive in the egram_batch_callback layout and are kept in growing
+    NumPy columns sorted by time, so get_range() is a binary search that returns
+    views. Min/max summaries at SUMMARY_FACTOR**k samples per block are kept up
+    to date as data arrives, which keeps zoomed-out plots of long sessions cheap.
+    """
+    def __init__(self):
+        self.timestamps = _Growable()
+        self.values = {ch: _Growable() for ch in CHANNELS}
+        self.levels: List[_SummaryLevel] = []
+
+    def __len__(self) -> int:
+        return self.timestamps.size
+
+    def _check_channel(self, channel: str) -> None:
+        if channel not in self.values:
+            raise ValueError(f"{channel} is Not a Valid Chanel")
+
+    def add_batch(self, timestamps, atrial, ventricular) -> None:
+        ts = np.asarray(timestamps, dtype=np.float64)
+        atrial = np.asarray(atrial, dtype=np.float64)
+        ventricular = np.asarray(ventricular, dtype=np.float64)
+        if not len(ts) == len(atrial) == len(ventricular):
+            # a short column would shift every later value against its timestamp
+            raise ValueError(f"column lengths differ: {len(ts)} timestamps, "
+                             f"{len(atrial)} atrial, {len(ventricular)} ventricular")
+        if len(ts) == 0:
+            return
+        # the search needs sorted time; host clocks can step backwards, so clamp
+        if self.timestamps.size:
+            ts = np.maximum(ts, self.timestamps.data[self.timestamps.size - 1])
+        ts = np.maximum.accumulate(ts)
+        self.timestamps.extend(ts)
+        self.values["atrial"].extend(atrial)
+        self.values["ventricular"].extend(ventricular)
+        self._update_summaries()
+
+    def _update_summaries(self) -> None:
+        below_t = self.timestamps
+        below_min = below_max = self.values
+        below_len = len(self)
+        depth = 0
+        while below_len >= SUMMARY_FACTOR:
+            if depth == len(self.levels):
+                self.levels.append(_SummaryLevel(SUMMARY_FACTOR ** (depth + 1)))
+            level = self.levels[depth]
+            start = len(level) * SUMMARY_FACTOR
+            complete = (below_len - start) // SUMMARY_FACTOR
+            if complete == 0:
+                break
+            end = start + complete * SUMMARY_FACTOR
+            level.t.extend(below_t.data[start:end:SUMMARY_FACTOR])
+            for ch in CHANNELS:
+                lo = below_min[ch].data[start:end].reshape(complete, SUMMARY_FACTOR)
+                hi = below_max[ch].data[start:end].reshape(complete, SUMMARY_FACTOR)
+                level.mins[ch].extend(lo.min(axis=1))
+                level.maxs[ch].extend(hi.max(axis=1))
+            below_t, below_min, below_max = level.t, level.mins, level.maxs
+            below_len = len(level)
+            depth += 1
+
+    def _bounds(self, t: np.ndarray, t0: Optional[float], t1: Optional[float]) -> Tuple[int, int]:
+        i0 = 0 if t0 is None else int(np.searchsorted(t, t0, side="left"))
+        i1 = len(t) if t1 is None else int(np.searchsorted(t, t1, side="right"))
+        return i0, max(i0, i1)
+
+    def get_range(self, channel: str, t0: Optional[float] = None,
+                  t1: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps, values) views for t0 <= t <= t1, O(log n)"""
+        self._check_channel(channel)
+        t = self.timestamps.view()
+        i0, i1 = self._bounds(t, t0, t1)
+        return t[i0:i1], self.values[channel].view()[i0:i1]
+
+    def get_summary(self, channel: str, t0: Optional[float] = None, t1: Optional[float] = None,
+                    max_points: int = 2000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (timestamps, mins, maxs) covering [t0, t1] with at most about max_points
+        rows, taken from the finest level that fits. Raw samples come back with
+        mins == maxs.
+        """
+        self._check_channel(channel)
+        t = self.timestamps.view()
+        i0, i1 = self._bounds(t, t0, t1)
+        if i1 - i0 <= max_points or not self.levels:
+            vals = self.values[channel].view()[i0:i1]
+            return t[i0:i1], vals, vals
+        for level in self.levels:
+            lt = level.t.view()
+            # include the block that starts before t0 but overlaps it
+            j0, j1 = self._bounds(lt, t0, t1)
+            if j0 > 0 and t0 is not None:
+                j0 -= 1
+            if j1 - j0 <= max_points or level is self.levels[-1]:
+                return (lt[j0:j1], level.mins[channel].view()[j0:j1],
+                        level.maxs[channel].view()[j0:j1])
+
+    def time_span(self) -> Tuple[float, float]:
+        if not len(self):
+            return (0.0, 0.0)
+        t = self.timestamps.view()
+        return float(t[0]), float(t[-1])
+
+    def clear(self) -> None:
+        self.timestamps = _Growable()
+        self.values = {ch: _Growable() for ch in CHANNELS}
+        self.levels = []
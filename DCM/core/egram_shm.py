@@ -0,0 +1,202 @@
+import os
+import tempfile
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+# header slots (int64): magic, capacity, reserved sequence, committed sequence
+SHM_MAGIC = 0x45475231  # "EGR1"
+_HDR_MAGIC = 0
+_HDR_CAPACITY = 1
+_HDR_RESERVED = 2
+_HDR_COMMITTED = 3
+_HEADER_SLOTS = 4
+
+DEFAULT_CAPACITY = 65536
+
+# where the DCM publishes the name of its live ring for other local processes
+RING_NAME_FILE = os.path.join(tempfile.gettempdir(), "dcm_egram_ring")
+
+
+def attach_segment(name: str) -> shared_memory.SharedMemory:
+    """
+    map an existing segment without taking ownership of it: python < 3.13
+    registers every attach with the resource tracker, which would unlink the
+    segment when the attaching process exits
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # the tracker keys POSIX segments by their "/"-prefixed name
+            resource_tracker.unregister("/" + shm.name, "shared_memory")
+        return shm
+
+
+class SharedEgramRing:
+    """
+    Single-writer, many-reader egram ring buffer in shared memory.
+    The writer reserves a range of sequence numbers, fills the slots and then
+    commits them. Readers never take a lock, they just compare their own cursor
+    against the counters, so the writer is never blocked by a slow reader.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        if header[_HDR_MAGIC] != SHM_MAGIC:
+            del header
+            raise ValueError(f"{shm.name} is not an egram ring")
+        self.header = header
+        self.capacity = int(self.header[_HDR_CAPACITY])
+
+        offset = _HEADER_SLOTS * 8
+        cap = self.capacity
+        self.timestamps = np.ndarray((cap,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        self.atrial = np.ndarray((cap,), dtype=np.float64, buffer=shm.buf, offset=offset + cap * 8)
+        self.ventricular = np.ndarray((cap,), dtype=np.float64, buffer=shm.buf, offset=offset + cap * 16)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def create(cls, capacity: int = DEFAULT_CAPACITY, name: Optional[str] = None) -> "SharedEgramRing":
+        """allocate a new ring, the creating process is the only writer"""
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        size = _HEADER_SLOTS * 8 + capacity * 24
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = (SHM_MAGIC, capacity, 0, 0)
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedEgramRing":
+        """map an existing ring by name (reader side)"""
+        shm = attach_segment(name)
+        try:
+            return cls(shm, owner=False)
+        except ValueError:
+            shm.close()
+            raise
+
+    def committed(self) -> int:
+        return int(self.header[_HDR_COMMITTED])
+
+    def write(self, timestamps, atrial, ventricular) -> None:
+        """
+        Publish a batch of samples. Matches SerialInterface.egram_batch_callback
+        so it can be plugged straight into the reader thread.
+        """
+        ts = np.asarray(timestamps, dtype=np.float64)
+        a = np.asarray(atrial, dtype=np.float64)
+        v = np.asarray(ventricular, dtype=np.float64)
+        n = len(ts)
+        if not (len(a) == len(v) == n):
+            raise ValueError("batch columns must have the same length")
+        if n == 0:
+            return
+        cap = self.capacity
+        if n > cap:
+            ts, a, v = ts[-cap:], a[-cap:], v[-cap:]
+            start = int(self.header[_HDR_COMMITTED]) + n - cap
+            n = cap
+        else:
+            start = int(self.header[_HDR_COMMITTED])
+
+        end = start + n
+        self.header[_HDR_RESERVED] = end
+        first = start % cap
+        split = min(n, cap - first)
+        for dst, src in ((self.timestamps, ts), (self.atrial, a), (self.ventricular, v)):
+            dst[first:first + split] = src[:split]
+            dst[:n - split] = src[split:]
+        self.header[_HDR_COMMITTED] = end
+
+    def reader(self, from_start: bool = False) -> "EgramRingReader":
+        return EgramRingReader(self, from_start=from_start)
+
+    def close(self) -> None:
+        # drop our views before closing, the mmap refuses to close while exported
+        self.header = self.timestamps = self.atrial = self.ventricular = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        if self.owner:
+            self.shm.unlink()
+
+
+def publish_ring(ring: SharedEgramRing, path: str = RING_NAME_FILE) -> None:
+    """advertise the ring's name so attach_published() can find it"""
+    tmp = f"{path}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(ring.name)
+    os.replace(tmp, path)
+
+
+def unpublish_ring(ring: SharedEgramRing, path: str = RING_NAME_FILE) -> None:
+    """withdraw the advertisement, unless another ring has replaced it since"""
+    try:
+        with open(path) as f:
+            if f.read().strip() != ring.name:
+                return
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def attach_published(path: str = RING_NAME_FILE) -> SharedEgramRing:
+    """
+    attach to the ring the running DCM published. FileNotFoundError when no
+    DCM is connected, or when it disconnected after publishing
+    """
+    with open(path) as f:
+        name = f.read().strip()
+    return SharedEgramRing.attach(name)
+
+
+class EgramRingReader:
+    """
+    Follows a SharedEgramRing from its own cursor. Readers that fall more than
+    a full ring behind skip ahead and report how many samples they missed.
+    """
+    def __init__(self, ring: SharedEgramRing, from_start: bool = False):
+        self.ring = ring
+        self.cursor = 0 if from_start else ring.committed()
+        self.dropped = 0
+
+    def available(self) -> int:
+        return self.ring.committed() - self.cursor
+
+    def read(self, max_samples: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """return (timestamps, atrial, ventricular) published since the last read"""
+        ring = self.ring
+        cap = ring.capacity
+        end = ring.committed()
+        start = max(self.cursor, end - cap)
+        if max_samples is not None:
+            end = min(end, start + max_samples)
+        n = end - start
+        if n <= 0:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty.copy(), empty.copy()
+
+        idx = (start + np.arange(n)) % cap
+        ts = ring.timestamps[idx]
+        a = ring.atrial[idx]
+        v = ring.ventricular[idx]
+
+        # anything the writer reserved while we copied may have been overwritten
+        safe_start = int(ring.header[_HDR_RESERVED]) - cap
+        if safe_start > start:
+            cut = min(safe_start - start, n)
+            ts, a, v = ts[cut:], a[cut:], v[cut:]
+            start += cut
+
+        self.dropped += start - self.cursor
+        self.cursor = end
+        return ts, a, v
@@ -0,0 +1,265 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .egram_export import ColumnarExporter, CsvExporter
+
+CHANNELS = ("atrial", "ventricular")
+TRIGGER_KINDS = ("level", "slope", "rate")
+DIRECTIONS = ("rising", "falling", "either")
+
+
+@dataclass(frozen=True)
+class Trigger:
+    """
+    One trigger condition on one channel.
+
+    - level: the signal crosses `threshold` in `direction`.
+    - slope: the sample-to-sample slope (units per second) goes past
+      `threshold`; "falling" means steeper than -threshold.
+    - rate: beats are upward crossings of `threshold` at least `refractory`
+      s apart. Fires when a beat-to-beat rate is outside low_bpm..high_bpm,
+      or when no beat has come for 60/low_bpm s (loss of capture).
+    """
+    kind: str
+    channel: str
+    threshold: float
+    direction: str = "rising"
+    low_bpm: float = 40.0
+    high_bpm: float = 180.0
+    refractory: float = 0.2
+
+    def __post_init__(self):
+        if self.kind not in TRIGGER_KINDS:
+            raise ValueError(f"unknown trigger kind {self.kind!r}")
+        if self.channel not in CHANNELS:
+            raise ValueError(f"unknown channel {self.channel!r}")
+        if self.direction not in DIRECTIONS:
+            raise ValueError(f"unknown direction {self.direction!r}")
+        if self.kind == "rate" and not 0 < self.low_bpm < self.high_bpm:
+            raise ValueError("rate trigger needs 0 < low_bpm < high_bpm")
+
+    @property
+    def name(self) -> str:
+        return f"{self.channel} {self.kind}"
+
+
+@dataclass
+class Snapshot:
+    """pre- and post-trigger samples frozen around one trigger time"""
+    trigger: Trigger
+    time: float
+    timestamps: np.ndarray
+    atrial: np.ndarray
+    ventricular: np.ndarray
+    complete: bool          # False when the ring no longer held the whole pre-trigger window
+
+
+class _TriggerState:
+    """what a trigger carries from one batch to the next"""
+    def __init__(self):
+        self.t: Optional[float] = None
+        self.value: Optional[float] = None
+        self.hot = False                        # slope condition held at the last sample
+        self.last_beat: Optional[float] = None
+        self.missed = False                     # loss of capture already reported
+
+
+def _edges(above: np.ndarray, direction: str) -> np.ndarray:
+    """positions (in above[1:]) where the condition switches per direction"""
+    if direction == "rising":
+        return ~above[:-1] & above[1:]
+    if direction == "falling":
+        return above[:-1] & ~above[1:]
+    return above[:-1] != above[1:]
+
+
+def evaluate(trigger: Trigger, state: _TriggerState, t: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """times in this batch at which `trigger` fires; updates `state`"""
+    if state.t is not None:
+        t = np.concatenate(([state.t], t))
+        values = np.concatenate(([state.value], values))
+    if len(t) < 2:
+        state.t, state.value = float(t[-1]), float(values[-1])
+        return np.empty(0)
+
+    if trigger.kind == "level":
+        fired = t[1:][_edges(values > trigger.threshold, trigger.direction)]
+    elif trigger.kind == "slope":
+        dt = np.diff(t)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(dt > 0, np.diff(values) / dt, 0.0)
+        if trigger.direction == "rising":
+            hot = slope > trigger.threshold
+        elif trigger.direction == "falling":
+            hot = slope < -trigger.threshold
+        else:
+            hot = np.abs(slope) > trigger.threshold
+        fired = t[1:][hot & ~np.concatenate(([state.hot], hot[:-1]))]
+        state.hot = bool(hot[-1])
+    else:
+        fired = _evaluate_rate(trigger, state, t, values)
+
+    state.t, state.value = float(t[-1]), float(values[-1])
+    return fired
+
+
+def _evaluate_rate(trigger: Trigger, state: _TriggerState, t: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # the per-sample work is the vectorized crossing search; only the few
+    # crossings per batch go through the refractory loop
+    crossings = t[1:][_edges(values > trigger.threshold, "rising")]
+    fired = []
+    max_gap = 60.0 / trigger.low_bpm
+    for c in crossings.tolist():
+        last = state.last_beat
+        if last is not None:
+            if c - last < trigger.refractory:
+                continue
+            if not state.missed and c - last > max_gap:
+                fired.append(last + max_gap)          # fell past the deadline inside this batch
+            elif 60.0 / (c - last) > trigger.high_bpm:
+                fired.append(c)
+        state.last_beat = c
+        state.missed = False
+    if state.last_beat is not None and not state.missed and t[-1] - state.last_beat > max_gap:
+        fired.append(state.last_beat + max_gap)
+        state.missed = True
+    return np.asarray(fired)
+
+
+class RingBuffer:
+    """fixed-capacity timestamp/atrial/ventricular columns, new samples overwrite the oldest"""
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.t = np.zeros(capacity)
+        self.values = {ch: np.zeros(capacity) for ch in CHANNELS}
+        self.written = 0            # samples ever written
+
+    def __len__(self) -> int:
+        return min(self.written, self.capacity)
+
+    def extend(self, t: np.ndarray, atrial: np.ndarray, ventricular: np.ndarray) -> None:
+        columns = [(self.t, t), (self.values["atrial"], atrial), (self.values["ventricular"], ventricular)]
+        n = len(t)
+        skip = max(0, n - self.capacity)
+        start = (self.written + skip) % self.capacity
+        first = min(n - skip, self.capacity - start)
+        for dest, src in columns:
+            src = src[skip:]
+            dest[start:start + first] = src[:first]
+            dest[:len(src) - first] = src[first:]
+        self.written += n
+
+    def ordered(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """oldest-first copies of the held samples"""
+        idx = np.arange(self.written - len(self), self.written) % self.capacity
+        return self.t[idx], self.values["atrial"][idx], self.values["ventricular"][idx]
+
+    def oldest(self) -> Optional[float]:
+        if not self.written:
+            return None
+        return float(self.t[(self.written - len(self)) % self.capacity])
+
+    def window(self, t0: float, t1: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """held samples with t0 <= t <= t1"""
+        t, a, v = self.ordered()
+        lo, hi = np.searchsorted(t, t0, "left"), np.searchsorted(t, t1, "right")
+        return t[lo:hi], a[lo:hi], v[lo:hi]
+
+
+class TriggerEngine:
+    """
+    Watches the live egram stream for trigger conditions and freezes a
+    window around each hit without stopping acquisition.
+
+    feed() takes batches in the egram_batch_callback layout. Every batch is
+    written to a ring buffer and each trigger is evaluated over the whole
+    batch at once. A hit opens a capture; once `post` s of later samples
+    have arrived, the `pre` + `post` window is copied out of the ring into a
+    Snapshot, passed to `capture_callback` and returned from feed(). Hits
+    within `holdoff` s (default: `post`) of the previous one are ignored.
+
+        engine = TriggerEngine([Trigger("rate", "ventricular", 3000)], pre=2, post=3)
+        iface.egram_batch_callback = engine.feed
+    """
+    def __init__(self, triggers: List[Trigger], pre: float = 1.0, post: float = 2.0,
+                 sample_rate: float = 1000.0, holdoff: Optional[float] = None,
+                 capacity: Optional[int] = None):
+        if pre < 0 or post < 0:
+            raise ValueError("pre and post must not be negative")
+        self.triggers = list(triggers)
+        self.pre = pre
+        self.post = post
+        self.holdoff = post if holdoff is None else holdoff
+        # room for a whole capture plus slack for late batches and rate error
+        self.ring = RingBuffer(capacity or int(np.ceil((pre + post) * sample_rate * 2)) + 1024)
+        self.armed = True
+        self.capture_callback: Optional[Callable[[Snapshot], None]] = None
+        self.stats = {"samples": 0, "fired": 0, "captures": 0, "eval_s": 0.0}
+        self._states = [_TriggerState() for _ in self.triggers]
+        self._open: List[Tuple[Trigger, float]] = []
+        self._holdoff_until = -np.inf
+
+    def reset(self) -> None:
+        """forget trigger history and open captures, e.g. after a reconnect"""
+        self._states = [_TriggerState() for _ in self.triggers]
+        self._open = []
+        self._holdoff_until = -np.inf
+
+    def feed(self, timestamps, atrial, ventricular) -> List[Snapshot]:
+        t = np.asarray(timestamps, dtype=np.float64)
+        values = {"atrial": np.asarray(atrial, dtype=np.float64),
+                  "ventricular": np.asarray(ventricular, dtype=np.float64)}
+        n = min(len(t), *(len(v) for v in values.values()))
+        if not n:
+            return []
+        t = t[:n]
+        values = {ch: v[:n] for ch, v in values.items()}
+        self.ring.extend(t, values["atrial"], values["ventricular"])
+        self.stats["samples"] += n
+
+        if self.armed:
+            start = time.perf_counter()
+            hits = []
+            for trigger, state in zip(self.triggers, self._states):
+                hits += [(float(at), trigger) for at in evaluate(trigger, state, t, values[trigger.channel])]
+            self.stats["eval_s"] += time.perf_counter() - start
+            for at, trigger in sorted(hits, key=lambda hit: hit[0]):
+                if at >= self._holdoff_until:
+                    self._open.append((trigger, at))
+                    self._holdoff_until = at + self.holdoff
+                    self.stats["fired"] += 1
+
+        done = []
+        newest = t[-1]
+        while self._open and self._open[0][1] + self.post <= newest:
+            trigger, at = self._open.pop(0)
+            oldest = self.ring.oldest()
+            snapshot = Snapshot(trigger, at, *self.ring.window(at - self.pre, at + self.post),
+                                complete=oldest is not None and oldest <= at - self.pre)
+            self.stats["captures"] += 1
+            if self.capture_callback:
+                self.capture_callback(snapshot)
+            done.append(snapshot)
+        return done
+
+
+def save_snapshot(snapshot: Snapshot, directory: str, extension: str = ".egc") -> str:
+    """
+    Write a snapshot with the egram exporters (".csv" or the columnar
+    format); the trigger and its time are in the file name. Returns the path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(snapshot.time))
+    millis = int((snapshot.time % 1) * 1000)
+    name = f"capture_{stamp}.{millis:03d}_{snapshot.trigger.channel}_{snapshot.trigger.kind}{extension}"
+    path = os.path.join(directory, name)
+    exporter_cls = CsvExporter if extension.lower() == ".csv" else ColumnarExporter
+    with exporter_cls(path) as exporter:
+        exporter.write_batch(snapshot.timestamps, snapshot.atrial, snapshot.ventricular)
+    return path
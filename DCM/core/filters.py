@@ -0,0 +1,282 @@
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from .sample_clock import DEVICE_SAMPLE_RATE
+
+# nominal egram rate the default bank is designed for (Hz)
+DEFAULT_SAMPLE_RATE = DEVICE_SAMPLE_RATE
+MAINS_FREQUENCY = 60.0
+
+
+def lowpass_taps(cutoff: float, fs: float, numtaps: int = 101) -> np.ndarray:
+    """windowed-sinc low-pass design with unity DC gain"""
+    if numtaps % 2 == 0:
+        raise ValueError("numtaps must be odd")
+    if not 0 < cutoff < fs / 2:
+        raise ValueError("cutoff must be between 0 and fs/2")
+    n = np.arange(numtaps) - (numtaps - 1) / 2
+    taps = np.sinc(2 * cutoff / fs * n) * np.hamming(numtaps)
+    return taps / taps.sum()
+
+
+def highpass_taps(cutoff: float, fs: float, numtaps: int = 101) -> np.ndarray:
+    """spectral inversion of the matching low-pass"""
+    taps = -lowpass_taps(cutoff, fs, numtaps)
+    taps[(numtaps - 1) // 2] += 1.0
+    return taps
+
+
+def bandpass_taps(low: float, high: float, fs: float, numtaps: int = 101) -> np.ndarray:
+    if not low < high:
+        raise ValueError("low cutoff must be below high cutoff")
+    return lowpass_taps(high, fs, numtaps) - lowpass_taps(low, fs, numtaps)
+
+
+def notch_taps(freq: float, fs: float, numtaps: Optional[int] = None, width: float = 4.0) -> np.ndarray:
+    """
+    band-stop around freq, width is the half-width of the stop band (Hz).
+    By default the length is picked so the Hamming transition fits the band.
+    """
+    if numtaps is None:
+        numtaps = int(3.3 * fs / width) | 1
+    return lowpass_taps(freq - width, fs, numtaps) + highpass_taps(freq + width, fs, numtaps)
+
+
+def notch_sos(freq: float, fs: float, width: float = 4.0) -> np.ndarray:
+    """
+    second-order IIR notch (RBJ cookbook biquad) at freq, width is the
+    half-width of the -3 dB stop band (Hz). One second-order section as a
+    [b0, b1, b2, 1, a1, a2] row, the layout scipy.signal.sosfilt takes.
+    """
+    if not 0 < freq < fs / 2:
+        raise ValueError("freq must be between 0 and fs/2")
+    if width <= 0:
+        raise ValueError("width must be positive")
+    w0 = 2 * np.pi * freq / fs
+    alpha = np.sin(w0) * width / freq       # sin(w0) / 2Q with Q = freq / (2 * width)
+    a0 = 1 + alpha
+    cos = -2 * np.cos(w0) / a0
+    return np.array([[1 / a0, cos, 1 / a0, 1.0, cos, (1 - alpha) / a0]])
+
+
+class FirStage:
+    """
+    Streaming FIR filter over an (n, channels) block. The last numtaps-1 input
+    rows are carried over so consecutive chunks filter as one signal.
+    """
+    def __init__(self, taps: Sequence[float]):
+        self.taps = np.asarray(taps, dtype=np.float64)
+        self.history: Optional[np.ndarray] = None
+
+    @property
+    def delay(self) -> int:
+        return (len(self.taps) - 1) // 2
+
+    def reset(self) -> None:
+        self.history = None
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        m = len(self.taps) - 1
+        if self.history is None:
+            # prime with the first sample so a DC offset doesn't ring on start-up
+            self.history = np.repeat(x[:1], m, axis=0)
+        ext = np.concatenate((self.history, x))
+        out = np.empty_like(x)
+        for c in range(x.shape[1]):
+            out[:, c] = np.convolve(ext[:, c], self.taps, mode="valid")
+        self.history = ext[len(ext) - m:]
+        return out
+
+
+class IirStage:
+    """
+    Streaming cascade of biquads over an (n, channels) block, direct form II
+    transposed. The two state values per section and channel are carried over
+    so consecutive chunks filter as one signal.
+
+    Rather than stepping sample by sample, each section runs in blocks of
+    `block` samples with its closed-form state-space solution,
+
+        y = O @ s + T @ x        s' = F @ s + K @ x
+
+    so a block is two small matrix products over both channels at once. That
+    is about `block` multiplies per sample and channel, still well under the
+    hundreds of taps the equivalent FIR notch needs.
+    """
+    def __init__(self, sos: Sequence[Sequence[float]], block: int = 64):
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        if self.sos.shape[1] != 6 or np.any(self.sos[:, 3] != 1.0):
+            raise ValueError("sos rows must be [b0, b1, b2, 1, a1, a2]")
+        if block < 1:
+            raise ValueError("block must be at least one sample")
+        self.block = block
+        self._sections = [self._block_matrices(row, block) for row in self.sos]
+        self.state: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _block_matrices(row: np.ndarray, block: int):
+        """
+        O (block, 2), T (block, block), powers of A (block + 1, 2, 2) and
+        K (2, block) for one section; shorter blocks use the trailing slices
+        """
+        b0, b1, b2, _, a1, a2 = row
+        a = np.array([[-a1, 1.0], [-a2, 0.0]])
+        b = np.array([b1 - a1 * b0, b2 - a2 * b0])
+        powers = np.empty((block + 1, 2, 2))
+        powers[0] = np.eye(2)
+        for i in range(block):
+            powers[i + 1] = a @ powers[i]
+        observe = powers[:block, 0, :]                  # C A^i with C = [1, 0]
+        impulse = observe @ b                           # C A^i B
+        toeplitz = np.zeros((block, block))
+        for i in range(1, block):
+            toeplitz[i, :i] = impulse[i - 1::-1]
+        toeplitz[np.diag_indices(block)] = b0
+        drive = (powers[block - 1::-1] @ b).T           # A^(block-1-j) B
+        return observe, toeplitz, powers, drive
+
+    @property
+    def delay(self) -> int:
+        # a notch's phase only turns near its stop band, the passband is not delayed
+        return 0
+
+    def reset(self) -> None:
+        self.state = None
+
+    def _prime(self, first: np.ndarray) -> np.ndarray:
+        """state for a signal that has sat at `first` forever, so a DC offset doesn't ring"""
+        state = np.empty((len(self.sos), len(first), 2))
+        level = first.astype(np.float64)
+        for k, (b0, b1, b2, _, a1, a2) in enumerate(self.sos):
+            gain = (b0 + b1 + b2) / (1 + a1 + a2)
+            state[k, :, 0] = (gain - b0) * level
+            state[k, :, 1] = (b2 - a2 * gain) * level
+            level = gain * level
+        return state
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        if self.state is None:
+            self.state = self._prime(x[0])
+        out = np.array(x, dtype=np.float64)
+        size = self.block
+        for k, (observe, toeplitz, powers, drive) in enumerate(self._sections):
+            s = self.state[k].T                         # (2, channels)
+            for i in range(0, len(out), size):
+                xb = out[i:i + size].copy()
+                r = len(xb)
+                out[i:i + r] = observe[:r] @ s + toeplitz[:r, :r] @ xb
+                s = powers[r] @ s + drive[:, size - r:] @ xb
+            self.state[k] = s.T
+        return out
+
+
+class BaselineStage:
+    """
+    Baseline wander removal: subtracts a centred moving average of `window`
+    samples, computed with a running sum so the cost doesn't grow with window.
+    With passes=2 the average is taken twice (a triangular window), whose
+    smaller sidelobes keep the gain close to 1 above the cut-off.
+    """
+    def __init__(self, window: int, passes: int = 1):
+        if window < 1:
+            raise ValueError("window must be at least one sample")
+        if passes < 1:
+            raise ValueError("passes must be at least one")
+        self.window = window
+        self.passes = passes
+        self.history: Optional[np.ndarray] = None
+
+    @property
+    def delay(self) -> int:
+        return self.passes * (self.window - 1) // 2
+
+    def reset(self) -> None:
+        self.history = None
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        w = self.window
+        keep = self.passes * (w - 1)
+        if self.history is None:
+            self.history = np.repeat(x[:1], keep, axis=0)
+        ext = np.concatenate((self.history, x))
+        baseline = ext
+        for _ in range(self.passes):
+            csum = np.concatenate((np.zeros((1, x.shape[1])), np.cumsum(baseline, axis=0)))
+            baseline = (csum[w:] - csum[:-w]) / w
+        start = keep - self.delay
+        out = ext[start:start + len(x)] - baseline
+        self.history = ext[len(ext) - keep:]
+        return out
+
+
+class FilterBank:
+    """
+    Chain of streaming stages applied to both egram channels at once.
+    Slots in between SerialInterface batch delivery and EgramBuffer:
+
+        iface.egram_batch_callback = bank.pipe(buffer.add_batch)
+
+    process_batch() compensates the group delay: each output value carries
+    the timestamp of the input sample it corresponds to, `delay` samples
+    back, so the first `delay` outputs after a reset are held back.
+    """
+    def __init__(self, stages: List):
+        self.stages = list(stages)
+        # input timestamps whose filtered values haven't come out yet
+        self._timestamps = np.empty(0)
+
+    @property
+    def delay(self) -> int:
+        """total group delay in samples"""
+        return sum(stage.delay for stage in self.stages)
+
+    def reset(self) -> None:
+        for stage in self.stages:
+            stage.reset()
+        self._timestamps = np.empty(0)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        out = np.asarray(block, dtype=np.float64)
+        if out.ndim == 1:
+            out = out[:, None]
+        if len(out) == 0:
+            return out
+        for stage in self.stages:
+            out = stage.process(out)
+        return out
+
+    def process_batch(self, timestamps, atrial, ventricular):
+        """
+        same (timestamps, atrial, ventricular) layout in and out, with the
+        output stamped at the time its input was sampled; the batch can come
+        out shorter than it went in while the filters fill up
+        """
+        block = np.column_stack((np.asarray(atrial, dtype=np.float64),
+                                 np.asarray(ventricular, dtype=np.float64)))
+        out = self.process(block)
+        pending = np.concatenate((self._timestamps, np.asarray(timestamps, dtype=np.float64)))
+        ready = max(0, len(pending) - self.delay)
+        self._timestamps = pending[ready:]
+        out = out[len(out) - ready:]
+        return pending[:ready].tolist(), out[:, 0], out[:, 1]
+
+    def pipe(self, sink: Callable) -> Callable:
+        """wrap a batch sink so it receives filtered samples"""
+        def _callback(timestamps, atrial, ventricular):
+            sink(*self.process_batch(timestamps, atrial, ventricular))
+        return _callback
+
+
+def default_filter_bank(fs: float = DEFAULT_SAMPLE_RATE, mains: float = MAINS_FREQUENCY,
+                        cutoff: float = 100.0) -> FilterBank:
+    """
+    baseline removal, mains notch and low-pass sized for the given rate. The
+    1 s triangular baseline stage is the high-pass (-3 dB near 0.45 Hz); a
+    101-tap FIR can't reach that low and would cut in around 10 Hz instead.
+    """
+    stages = [BaselineStage(max(1, int(fs)) | 1, passes=2)]
+    if mains + 4.0 < fs / 2:
+        stages.append(IirStage(notch_sos(mains, fs)))
+    stages.append(FirStage(lowpass_taps(min(cutoff, fs * 0.45), fs)))
+    return FilterBank(stages)
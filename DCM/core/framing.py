@@ -0,0 +1,147 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# v1: START | cmd | payload, the payload length is implied by cmd
+START_BYTE = 0x16
+
+# command bytes, shared by SerialInterface and the PtyDevice stand-in
+CMD_SEND_PARAMS = 0x55
+CMD_REQUEST_EGRAM = 0x22
+CMD_REQUEST_EGRAM_PACKED = 0x23  # payload: samples per frame (1 byte)
+CMD_REQUEST_EGRAM_DELTA = 0x24   # same, delta-coded frames (v2 framing only)
+CMD_STOP_EGRAM = 0x25
+CMD_REQUEST_PARAMS = 0x66
+CMD_PARAMS_REPORT = 0x67     # device -> DCM, same payload as CMD_SEND_PARAMS
+CMD_ACK = 0xAA
+CMD_EGRAM = 0xE0
+
+# v2: SYNC | cmd | len | crc8(cmd, len) | payload[len] | crc16 (little endian)
+# The header CRC rejects a false SYNC after four bytes, so resync costs O(1)
+# per discarded byte; the CRC-16 covers cmd, len, header CRC and payload.
+SYNC_V2 = 0xA5
+V2_HEADER = 4
+V2_TRAILER = 2
+MAX_PAYLOAD = 255
+
+
+def _crc8_table(poly: int = 0x07) -> Tuple[int, ...]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+def _crc16_table(poly: int = 0x1021) -> Tuple[int, ...]:
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+# CRC-8 (poly 0x07) and CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF); the
+# tables are what the firmware side uses
+CRC8_TABLE = _crc8_table()
+CRC16_TABLE = _crc16_table()
+
+
+def crc8(data: bytes, crc: int = 0) -> int:
+    for b in data:
+        crc = CRC8_TABLE[crc ^ b]
+    return crc
+
+
+def crc16(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16/CCITT-FALSE, same result as binascii.crc_hqx(data, 0xFFFF)"""
+    for b in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[(crc >> 8) ^ b]
+    return crc
+
+
+def encode_frame(cmd: int, payload: bytes = b"") -> bytes:
+    """v2 frame around a payload"""
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload of {len(payload)} bytes does not fit a frame")
+    head = bytes((cmd, len(payload), CRC8_TABLE[CRC8_TABLE[cmd] ^ len(payload)]))
+    body = head + payload
+    return bytes((SYNC_V2,)) + body + crc16(body).to_bytes(2, "little")
+
+
+# next byte that could start a frame
+_SYNC_SEARCH = re.compile(rb"[\x16\xa5]")
+_SYNC_V2_SEARCH = re.compile(rb"\xa5")
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for a byte stream mixing v1 and v2 frames.
+    feed() returns [(cmd, payload)] for every complete frame and keeps the
+    remainder for the next call. v1 frames are recognised through
+    `v1_lengths` (cmd -> payload length); v1 has no check, so on a noisy
+    line only v2 frames are trustworthy.
+    """
+    def __init__(self, v1_lengths: Optional[Dict[int, int]] = None, accept_v1: bool = True):
+        self.v1_lengths = dict(v1_lengths or {})
+        self.accept_v1 = accept_v1
+        self.buffer = bytearray()
+        self.stats = {"frames": 0, "v1_frames": 0, "discarded": 0,
+                      "header_errors": 0, "crc_errors": 0}
+        self._search = _SYNC_SEARCH if accept_v1 else _SYNC_V2_SEARCH
+
+    def reset(self) -> None:
+        self.buffer.clear()
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        buf = self.buffer
+        buf.extend(data)
+        frames = []
+        stats = self.stats
+        pos = 0
+        size = len(buf)
+        while pos < size:
+            if buf[pos] != SYNC_V2 and not (self.accept_v1 and buf[pos] == START_BYTE):
+                match = self._search.search(buf, pos)
+                nxt = match.start() if match else size
+                stats["discarded"] += nxt - pos
+                pos = nxt
+                continue
+            if buf[pos] == SYNC_V2:
+                if size - pos < V2_HEADER:
+                    break
+                cmd, n, hcrc = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+                if CRC8_TABLE[CRC8_TABLE[cmd] ^ n] != hcrc:
+                    stats["header_errors"] += 1
+                    stats["discarded"] += 1
+                    pos += 1
+                    continue
+                end = pos + V2_HEADER + n + V2_TRAILER
+                if size < end:
+                    break
+                if crc16(buf[pos + 1:end - V2_TRAILER]) != buf[end - 2] | buf[end - 1] << 8:
+                    stats["crc_errors"] += 1
+                    stats["discarded"] += 1
+                    pos += 1
+                    continue
+                frames.append((cmd, bytes(buf[pos + V2_HEADER:end - V2_TRAILER])))
+                stats["frames"] += 1
+                pos = end
+            else:
+                if size - pos < 2:
+                    break
+                n = self.v1_lengths.get(buf[pos + 1])
+                if n is None:
+                    stats["discarded"] += 1
+                    pos += 1
+                    continue
+                if size < pos + 2 + n:
+                    break
+                frames.append((buf[pos + 1], bytes(buf[pos + 2:pos + 2 + n])))
+                stats["v1_frames"] += 1
+                pos += 2 + n
+        del buf[:pos]
+        return frames
@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+STATE_CONNECTED = "connected"
+STATE_RECONNECTING = "reconnecting"
+STATE_STOPPED = "stopped"
+
+
+def same_device(port: str) -> Callable[[], Optional[str]]:
+    """
+    Port finder for USB adapters: remembers the VID/PID/serial number behind
+    `port` and returns whatever name the board re-enumerates under, or the
+    old name when the identity isn't known.
+    """
+    try:
+        from serial.tools import list_ports
+    except ImportError:
+        return lambda: port
+    identity = next(((p.vid, p.pid, p.serial_number) for p in list_ports.comports()
+                     if p.device == port and p.vid is not None), None)
+
+    def find() -> Optional[str]:
+        if identity is None:
+            return port
+        for p in list_ports.comports():
+            if (p.vid, p.pid, p.serial_number) == identity:
+                return p.device
+        return None
+    return find
+
+
+class LinkSupervisor:
+    """
+    Keeps a SerialInterface connected across board resets and cable
+    re-seats. When the port fails it polls for the device with exponential
+    backoff (min_backoff up to max_backoff), reopens it, re-pushes the last
+    ACKed parameters and restarts the egram stream that was running.
+
+    `state_callback(state, detail)` is called from the supervisor thread;
+    `history` has one entry per recovery with the time from loss and from
+    reopen to the first egram frame.
+
+        supervisor = LinkSupervisor(iface, find_port=same_device(port))
+        supervisor.start()
+    """
+    def __init__(self, iface, find_port: Optional[Callable[[], Optional[str]]] = None,
+                 min_backoff: float = 0.05, max_backoff: float = 2.0, egram_timeout: float = 2.0):
+        self.iface = iface
+        self.find_port = find_port or (lambda: iface.port_name)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.egram_timeout = egram_timeout
+        self.state = STATE_CONNECTED
+        self.state_callback: Optional[Callable[[str, str], None]] = None
+        self.history: List[Dict[str, float]] = []
+        self._lost = threading.Event()
+        self._stop = threading.Event()
+        self._lost_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.iface.link_lost_callback = self._on_lost
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.iface.link_lost_callback = None
+        self._stop.set()
+        self._lost.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self._set_state(STATE_STOPPED, "")
+
+    def _set_state(self, state: str, detail: str) -> None:
+        self.state = state
+        if self.state_callback:
+            self.state_callback(state, detail)
+
+    def _on_lost(self, exc: Exception) -> None:
+        self._lost_at = time.perf_counter()
+        self._lost.set()
+        self._set_state(STATE_RECONNECTING, str(exc))
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                self._lost.wait()
+                if self._stop.is_set():
+                    return
+                self._lost.clear()
+                self._recover()
+        except Exception as e:
+            # a bug, not a lost port: retrying can't fix it, so stop and say why
+            log.exception("link supervisor stopped")
+            self._set_state(STATE_STOPPED, str(e))
+            raise
+
+    def _recover(self) -> None:
+        backoff = self.min_backoff
+        attempts = 0
+        iface = self.iface
+        while not self._stop.is_set():
+            attempts += 1
+            port = self.find_port()
+            if port:
+                # the port can drop again mid-recovery: a failed re-push or
+                # stream restart goes back round the backoff loop like a failed open
+                try:
+                    iface.reconnect(port)
+                    reopened = time.perf_counter()
+                    iface.egram_seen.clear()
+                    if iface.last_acked is not None:
+                        iface.send_parameters(*iface.last_acked)
+                    if iface.egram_request is not None:
+                        iface.request_egram(*iface.egram_request)
+                    break
+                except OSError as e:
+                    # serial.SerialException is an OSError
+                    log.warning("reconnect attempt %d on %s failed: %s", attempts, port, e)
+                    self._set_state(STATE_RECONNECTING, str(e))
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+        else:
+            return
+        record = {"attempts": attempts, "lost_to_open_s": reopened - self._lost_at}
+        if iface.egram_request is not None and iface.egram_seen.wait(self.egram_timeout):
+            now = time.perf_counter()
+            record["open_to_egram_s"] = now - reopened
+            record["lost_to_egram_s"] = now - self._lost_at
+        self.history.append(record)
+        self._set_state(STATE_CONNECTED, iface.port_name)
@@ -1,6 +1,9 @@
-from typing import Dict
+from typing import Dict, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from types import MappingProxyType
+
+from .param_schema import applicable_fields
 
 @dataclass(frozen=True)
 class ModeInfo:
@@ -33,13 +36,17 @@ MODE_ID_MAP = {
     "DDDR": 8
 }
 
-def parse_mode(mode) -> ModeInfo:
-    """Parse the mode string or enum into ModeInfo."""
-    if isinstance(mode, PaceMakerMode):
-        code = mode.value
-    else:
-        code = str(mode).upper()
+DESC_MAP = {
+    "O": "none",
+    "A": "Atrium",
+    "V": "Ventricle",
+    "D": "Dual",
+    "I": "Inhibit",
+    "T": "Trigger",
+}
 
+def _parse_code(code: str) -> ModeInfo:
+    """Parse a mode code such as "VVIR" into ModeInfo."""
     # Extract rate response (R)
     rate = code.endswith("R")
     if rate:
@@ -50,20 +57,11 @@ def parse_mode(mode) -> ModeInfo:
 
     paced, sensed, response = code[0], code[1], code[2]
 
-    desc_map = {
-        "O": "none",
-        "A": "Atrium",
-        "V": "Ventricle",
-        "D": "Dual",
-        "I": "Inhibit",
-        "T": "Trigger",
-    }
-
     descrpt = (
         f"{code}{'R' if rate else ''}: "
-        f"{desc_map.get(paced, paced)} paced, "
-        f"{desc_map.get(sensed, sensed)} sensed, "
-        f"{desc_map.get(response, response)} response, "
+        f"{DESC_MAP.get(paced, paced)} paced, "
+        f"{DESC_MAP.get(sensed, sensed)} sensed, "
+        f"{DESC_MAP.get(response, response)} response, "
         f"{'Rate-responsive ON' if rate else 'No rate response'}"
     )
 
@@ -75,14 +73,36 @@ def parse_mode(mode) -> ModeInfo:
         descrpt=descrpt
     )
 
+# Lookup tables for the supported modes, built once at import and read-only
+MODE_INFO = MappingProxyType({mode: _parse_code(mode.value) for mode in PaceMakerMode})
+MODE_IDS = MappingProxyType({mode: MODE_ID_MAP[mode.value] for mode in PaceMakerMode})
+MODES_BY_ID = MappingProxyType({MODE_ID_MAP[mode.value]: mode for mode in PaceMakerMode})
+REQUIRED_PARAMS: "MappingProxyType[PaceMakerMode, Tuple[str, ...]]" = MappingProxyType(
+    {mode: tuple(f.name for f in applicable_fields(info)) for mode, info in MODE_INFO.items()})
+_MODES_BY_CODE = {mode.value: mode for mode in PaceMakerMode}
+
+def parse_mode(mode) -> ModeInfo:
+    """Parse the mode string or enum into ModeInfo."""
+    if isinstance(mode, PaceMakerMode):
+        return MODE_INFO[mode]
+    code = str(mode).upper()
+    known = _MODES_BY_CODE.get(code)
+    # codes outside PaceMakerMode (future modes) are parsed on the fly
+    return MODE_INFO[known] if known is not None else _parse_code(code)
+
 def list_modes() -> Dict[str, str]:
     """Return mode -> description for all supported modes."""
-    return {mode.value: parse_mode(mode).descrpt for mode in PaceMakerMode}
+    return {mode.value: info.descrpt for mode, info in MODE_INFO.items()}
 
 def mode_id(mode) -> int:
     """Return numeric ID used by the Simulink hardware."""
     if isinstance(mode, PaceMakerMode):
-        key = mode.value
-    else:
-        key = str(mode).upper()
-    return MODE_ID_MAP[key]
+        return MODE_IDS[mode]
+    return MODE_ID_MAP[str(mode).upper()]
+
+def mode_from_id(value: int) -> PaceMakerMode:
+    """Reverse of mode_id, e.g. for a mode byte decoded from the device."""
+    try:
+        return MODES_BY_ID[value]
+    except KeyError:
+        raise ValueError(f"{value} is not a known mode id") from None
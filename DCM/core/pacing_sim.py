@@ -0,0 +1,242 @@
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+from .modes import parse_mode
+from .param_sweep import grid_chunks
+
+# Timing model of the pacing modes, one step per activity sample. It works on
+# rates rather than individual beats, so every parameter set and every step is
+# a column of an array and a whole grid runs in one pass. The sensor model is
+# an assumption (the firmware's accelerometer scaling isn't in this repo):
+#   target = LRL + RESPONSE_GAIN * response_factor * (activity - threshold),
+#   clipped to LRL..MSR, reached no faster than reaction_time (LRL to MSR)
+#   and left no faster than recovery_time (MSR to LRL).
+
+# activity_threshold 1-7 (V-Low to V-High) in g of accelerometer activity
+ACTIVITY_THRESHOLDS_G = (0.05, 0.08, 0.11, 0.14, 0.17, 0.20, 0.23)
+# ppm per g above threshold per response factor step
+RESPONSE_GAIN = 30.0
+# ventricular escape rhythm without AV conduction (ppm)
+DEFAULT_ESCAPE_RATE = 35.0
+# intrinsic AV conduction time when conduction is intact (ms)
+DEFAULT_PR_INTERVAL = 160.0
+
+# block states in the "block" series (dual-chamber tracking above URL)
+BLOCK_NONE = 0
+BLOCK_WENCKEBACH = 1
+BLOCK_2_TO_1 = 2
+
+SENSOR_FIELDS = ("LRL", "MSR", "activity_threshold", "reaction_time", "recovery_time", "response_factor")
+
+
+def _rows(values, traces: int, n: int) -> np.ndarray:
+    """parameter column (scalar or n values) as a (traces * n, 1) column"""
+    col = np.asarray(values, dtype=np.float64).reshape(-1)
+    if len(col) == 1:
+        col = np.repeat(col, n)
+    elif len(col) != n:
+        raise ValueError("parameter columns must all have the same length")
+    return np.tile(col, traces)[:, None]
+
+
+def _series(values, traces: int, n: int, steps: int) -> np.ndarray:
+    """per-step input (scalar, (T,) or (M, T)) broadcast against (traces * n, T)"""
+    arr = np.asarray(values, dtype=np.float64)
+    if arr.ndim < 2:
+        return np.broadcast_to(arr, (steps,))[None, :]
+    if arr.shape != (traces, steps):
+        raise ValueError("per-trace inputs must match the activity shape")
+    return np.repeat(arr, n, axis=0)
+
+
+def _columns(params) -> Dict[str, Any]:
+    return params.to_dict() if hasattr(params, "to_dict") else dict(params)
+
+
+def _count(columns: Dict[str, Any]) -> int:
+    return max((np.size(v) for v in columns.values()), default=1)
+
+
+def sensor_rate(params, activity, dt: float = 1.0, rate_adaptive: bool = True) -> np.ndarray:
+    """
+    Sensor-indicated pacing rate (ppm) for each parameter set and activity
+    step. `params` is a Parameters object, a dict, or the {field: column}
+    tables param_sweep.grid_chunks() yields. `activity` is (T,) or (M, T)
+    in g, one sample every `dt` s. Returns (M * N, T) float32, trace-major:
+    row m * N + n is parameter set n under trace m.
+    """
+    columns = _columns(params)
+    missing = [f for f in SENSOR_FIELDS if f not in columns]
+    if missing:
+        raise ValueError(f"missing parameters: {', '.join(missing)}")
+    activity = np.atleast_2d(np.asarray(activity, dtype=np.float64))
+    traces, steps = activity.shape
+    n = _count(columns)
+    lrl = _rows(columns["LRL"], traces, n)
+    if not rate_adaptive:
+        return np.broadcast_to(lrl, (traces * n, steps)).astype(np.float32)
+    msr = _rows(columns["MSR"], traces, n)
+    level = _rows(columns["activity_threshold"], traces, n).astype(np.int64)
+    threshold = np.asarray(ACTIVITY_THRESHOLDS_G)[np.clip(level, 1, 7) - 1]
+    factor = _rows(columns["response_factor"], traces, n)
+    span = msr - lrl
+    up = (span / _rows(columns["reaction_time"], traces, n) * dt)[:, 0]
+    down = (span / (_rows(columns["recovery_time"], traces, n) * 60.0) * dt)[:, 0]
+
+    excess = np.repeat(activity, n, axis=0) - threshold
+    target = lrl + np.clip(RESPONSE_GAIN * factor * excess, 0.0, span)
+    # the slew limit makes each step depend on the last; the loop runs over
+    # time only, every parameter set moves together
+    out = np.empty(target.shape, dtype=np.float32)
+    rate = lrl[:, 0].copy()
+    for i in range(steps):
+        rate += np.clip(target[:, i] - rate, -down, up)
+        out[:, i] = rate
+    return out
+
+
+def simulate(params, mode, activity, dt: float = 1.0, intrinsic_rate=0.0, conduction: bool = True,
+             escape_rate: float = DEFAULT_ESCAPE_RATE,
+             pr_interval: float = DEFAULT_PR_INTERVAL) -> Dict[str, np.ndarray]:
+    """
+    Pacing behaviour of `mode` for every parameter set and activity trace.
+
+    intrinsic_rate is the sinus rate (ppm; scalar, (T,) or (M, T); 0 = none).
+    With `conduction` the ventricles follow the atria after pr_interval ms,
+    otherwise they escape at escape_rate. Each series is (M * N, T), rows as
+    in sensor_rate():
+    - sensor_rate: rate the pacemaker is driven at
+    - atrial_rate / ventricular_rate: resulting chamber rates (ppm)
+    - atrial_paced / ventricular_paced: the device paces that chamber
+    - block: BLOCK_NONE / BLOCK_WENCKEBACH / BLOCK_2_TO_1 for atrial tracking
+    """
+    info = parse_mode(mode)
+    columns = _columns(params)
+    activity = np.atleast_2d(np.asarray(activity, dtype=np.float64))
+    traces, steps = activity.shape
+    n = _count(columns)
+    rows = traces * n
+
+    def col(name):
+        if name not in columns:
+            raise ValueError(f"{info.descrpt.split(':')[0]} needs {name}")
+        return _rows(columns[name], traces, n)
+
+    paced_rate = sensor_rate(columns, activity, dt, rate_adaptive=info.rate).astype(np.float64)
+    sinus = np.broadcast_to(_series(intrinsic_rate, traces, n, steps), (rows, steps))
+    with np.errstate(divide="ignore"):
+        sinus_interval = np.where(sinus > 0, 60000.0 / sinus, np.inf)
+
+    a_rate, a_paced = sinus, np.zeros((rows, steps), dtype=bool)
+    if info.paced in "AD":
+        if info.sensed in "AD" and info.response != "O":
+            # sensed when faster than the pacing rate; in single-chamber modes
+            # also outside ARP (dual-chamber refractoriness shows up as block)
+            sensed = sinus > paced_rate
+            if info.paced == "A":
+                sensed &= sinus_interval > col("ARP")
+        else:
+            sensed = np.zeros((rows, steps), dtype=bool)
+        a_paced = ~sensed
+        a_rate = np.where(sensed, sinus, paced_rate)
+
+    conducted = np.where(a_rate > 0, a_rate, 0.0) if conduction else np.zeros((rows, steps))
+    intrinsic_v = np.maximum(conducted, escape_rate)
+    v_rate, v_paced = intrinsic_v, np.zeros((rows, steps), dtype=bool)
+    block = np.zeros((rows, steps), dtype=np.int8)
+
+    if info.paced == "V":
+        if info.sensed in "VD" and info.response != "O":
+            sensed = (intrinsic_v > paced_rate) & (60000.0 / intrinsic_v > col("VRP"))
+        else:
+            sensed = np.zeros((rows, steps), dtype=bool)
+        v_paced = ~sensed
+        v_rate = np.where(sensed, intrinsic_v, paced_rate)
+    elif info.paced == "D":
+        # tracking of sensed atrial beats is capped at URL (Wenckebach) and
+        # halves once atrial intervals fall inside AV delay + PVARP (2:1)
+        url = col("URL")
+        two_to_one = 60000.0 / (col("AV_delay") + col("PVARP"))
+        tracked = ~a_paced
+        block = np.where(tracked & (a_rate > url),
+                         np.where(a_rate >= two_to_one, BLOCK_2_TO_1, BLOCK_WENCKEBACH),
+                         BLOCK_NONE).astype(np.int8)
+        limited = np.where(block == BLOCK_2_TO_1, a_rate / 2, np.minimum(url, two_to_one))
+        # the sensor keeps the ventricle from dropping below the sensor rate
+        v_rate = np.where(block == BLOCK_NONE, a_rate, np.maximum(limited, paced_rate))
+        # the AV delay runs out first unless the patient's own conduction is quicker
+        v_paced = ~(conduction & (pr_interval < col("AV_delay")) & (block == BLOCK_NONE))
+
+    return {"sensor_rate": paced_rate.astype(np.float32),
+            "atrial_rate": np.asarray(a_rate, dtype=np.float32),
+            "ventricular_rate": np.asarray(v_rate, dtype=np.float32),
+            "atrial_paced": np.broadcast_to(a_paced, (rows, steps)),
+            "ventricular_paced": np.broadcast_to(v_paced, (rows, steps)),
+            "block": block}
+
+
+def summarize(result: Dict[str, np.ndarray], dt: float = 1.0,
+              msr=None) -> Dict[str, np.ndarray]:
+    """
+    Per-row figures from simulate(): mean and peak ventricular rate, peak
+    sensor rate, percent of time each chamber is paced, and seconds spent
+    in Wenckebach and 2:1 block. With `msr` (per row), also seconds at MSR.
+    """
+    v = result["ventricular_rate"]
+    out = {
+        "mean_rate": v.mean(axis=1),
+        "peak_rate": v.max(axis=1),
+        "peak_sensor_rate": result["sensor_rate"].max(axis=1),
+        "atrial_paced_pct": 100.0 * result["atrial_paced"].mean(axis=1),
+        "ventricular_paced_pct": 100.0 * result["ventricular_paced"].mean(axis=1),
+        "wenckebach_s": dt * (result["block"] == BLOCK_WENCKEBACH).sum(axis=1),
+        "block_2to1_s": dt * (result["block"] == BLOCK_2_TO_1).sum(axis=1),
+    }
+    if msr is not None:
+        at_msr = result["sensor_rate"] >= np.asarray(msr, dtype=np.float32).reshape(-1, 1) - 0.5
+        out["time_at_msr_s"] = dt * at_msr.sum(axis=1)
+    return out
+
+
+def screen(base, axes: Dict[str, Sequence], mode, activity, dt: float = 1.0,
+           chunk_size: int = 256, **kwargs) -> Dict[str, np.ndarray]:
+    """
+    Simulate every valid combination of `axes` over `base` (see param_sweep)
+    under each activity trace. Returns "index" (grid index of each valid
+    row) and the summarize() figures, shaped (valid rows,) for one trace or
+    (M, valid rows) for M traces. chunk_size parameter sets are simulated
+    at a time to bound memory. Extra keyword arguments go to simulate().
+    """
+    activity = np.atleast_2d(np.asarray(activity, dtype=np.float64))
+    traces = activity.shape[0]
+    parts = []
+    for index, columns, masks in grid_chunks(base, axes, mode, chunk_size):
+        ok = np.flatnonzero(masks == 0)
+        if not len(ok):
+            continue
+        valid = {name: (col[ok] if np.ndim(col) else col) for name, col in columns.items()}
+        result = simulate(valid, mode, activity, dt, **kwargs)
+        msr = np.tile(np.broadcast_to(valid["MSR"], len(ok)), traces)
+        figures = summarize(result, dt, msr=msr)
+        parts.append((index[ok], {k: v.reshape(traces, len(ok)) for k, v in figures.items()}))
+    if not parts:
+        return {"index": np.empty(0, dtype=np.int64)}
+    out = {"index": np.concatenate([index for index, _ in parts])}
+    for key in parts[0][1]:
+        joined = np.concatenate([figures[key] for _, figures in parts], axis=1)
+        out[key] = joined[0] if traces == 1 else joined
+    return out
+
+
+def synthetic_activity(seconds: float = 3600.0, dt: float = 1.0, seed: int = 0) -> np.ndarray:
+    """rest with random bouts of walking (~0.3 g) and running (~0.8 g), in g"""
+    rng = np.random.default_rng(seed)
+    steps = int(seconds / dt)
+    activity = np.full(steps, 0.02)
+    i = int(rng.integers(60, 600) / dt)
+    while i < steps:
+        length = int(rng.integers(60, 900) / dt)
+        activity[i:i + length] = rng.choice([0.3, 0.3, 0.8])
+        i += length + int(rng.integers(120, 1200) / dt)
+    return np.clip(activity + rng.normal(0, 0.02, steps), 0.0, None)
@@ -0,0 +1,166 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import storage
+
+# a full snapshot is written every SNAPSHOT_INTERVAL entries, so rebuilding
+# the state at any time replays at most this many diffs
+SNAPSHOT_INTERVAL = 16
+
+
+class ParameterJournal:
+    """
+    Append-only audit trail of programmed parameters. Each entry stores only
+    the fields that changed since the previous one, plus the mode, who made
+    the change and why; every SNAPSHOT_INTERVAL entries the full set is
+    written instead. It is the only record of saved parameters, profiles and
+    history are read back from it.
+    """
+    def __init__(self, engine: Optional[storage.StorageEngine] = None):
+        self.engine = engine or storage.get_engine()
+        self._lock = threading.Lock()
+        self._state: Optional[Dict[str, Any]] = None
+        self._last: Dict[str, Any] = {}
+        self._last_id = 0
+        self._last_time = float("-inf")
+        self._since_snapshot = 0
+
+    def _load_tail(self) -> None:
+        """rebuild the latest state from the newest snapshot"""
+        snap = self.engine.last_journal_snapshot()
+        if snap is None:
+            self._state, self._last, self._last_id = {}, {}, 0
+            self._last_time, self._since_snapshot = float("-inf"), 0
+            return
+        state = dict(snap["fields"])
+        tail = self.engine.journal_after(snap["id"])
+        for entry in tail:
+            state.update(entry["fields"])
+        self._state = state
+        self._last = tail[-1] if tail else snap
+        self._last_id = self._last["id"]
+        self._since_snapshot = len(tail)
+        self._last_time = self._last["created"]
+
+    def record(self, params, username: Optional[str] = None, mode: Optional[str] = None,
+               event: str = "saved", at: Optional[float] = None) -> Optional[int]:
+        """
+        append a change. params is a Parameters object or dict. Returns the
+        entry id, or None if the last entry already has the same values, mode,
+        user and event
+        """
+        values = params.to_dict() if hasattr(params, "to_dict") else dict(params)
+        with self._lock, self.engine.transaction():
+            # the write lock is held from here, so a newer entry from another
+            # process is picked up before diffing and can't appear after it
+            if self._state is None or self.engine.last_journal_id() != self._last_id:
+                self._load_tail()
+            # entries must stay in time order for the lookups, clamp clock steps
+            created = max(time.time() if at is None else at, self._last_time)
+            diff = {k: v for k, v in values.items() if self._state.get(k, object()) != v}
+            snapshot = not self._state or self._since_snapshot + 1 >= SNAPSHOT_INTERVAL
+            same = (mode, username, event) == (self._last.get("mode"), self._last.get("username"),
+                                               self._last.get("event"))
+            if not diff and same and not snapshot:
+                return None
+            entry_id = self.engine.append_journal(
+                created, values if snapshot else diff, snapshot,
+                username=username, mode=mode, event=event)
+            self._state.update(values)
+            self._last = {"id": entry_id, "mode": mode, "username": username, "event": event}
+            self._last_id = entry_id
+            self._since_snapshot = 0 if snapshot else self._since_snapshot + 1
+            self._last_time = created
+            return entry_id
+
+    def reset(self, username: Optional[str] = None, at: Optional[float] = None) -> int:
+        """
+        append an empty snapshot: nothing is programmed from here on, earlier
+        entries stay in the journal
+        """
+        with self._lock, self.engine.transaction():
+            if self._state is None or self.engine.last_journal_id() != self._last_id:
+                self._load_tail()
+            created = max(time.time() if at is None else at, self._last_time)
+            entry_id = self.engine.append_journal(created, {}, True, username=username, event="reset")
+            self._state = {}
+            self._last = {"id": entry_id, "mode": None, "username": username, "event": "reset"}
+            self._last_id = entry_id
+            self._since_snapshot = 0
+            self._last_time = created
+            return entry_id
+
+    def latest(self, username: Optional[str] = None,
+               event: Optional[str] = None) -> Optional[Tuple[float, Dict[str, Any], Optional[str]]]:
+        """
+        (time, parameter dict, mode) of the newest entry by `username` for
+        `event`, None if there is none since the last reset
+        """
+        found = self.engine.journal_entries(username, event, newest=True)
+        reset = self.engine.journal_entries(event="reset", newest=True)
+        if not found or (reset and reset[0]["id"] > found[0]["id"]):
+            return None
+        entry = found[0]
+        snap = self.engine.last_journal_snapshot(upto=entry["id"])
+        state = dict(snap["fields"])
+        for later in self.engine.journal_after(snap["id"], upto=entry["id"]):
+            state.update(later["fields"])
+        return entry["created"], state, entry["mode"]
+
+    def history(self, username: Optional[str] = None, event: Optional[str] = None,
+                since: Optional[float] = None,
+                until: Optional[float] = None) -> List[Tuple[float, Dict[str, Any], Optional[str]]]:
+        """(time, parameter dict, mode) after every matching entry, oldest first"""
+        entries = self.engine.journal_entries(username, event, since, until)
+        if not entries:
+            return []
+        wanted = {e["id"] for e in entries}
+        snap = self.engine.last_journal_snapshot(upto=entries[0]["id"])
+        state, out = {}, []
+        for entry in [snap] + self.engine.journal_after(snap["id"], upto=entries[-1]["id"]):
+            state = dict(entry["fields"]) if entry["snapshot"] else dict(state, **entry["fields"])
+            if entry["id"] in wanted:
+                out.append((entry["created"], dict(state), entry["mode"]))
+        return out
+
+    def at(self, t: float) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        """(parameter dict, mode) in effect at time t, None before the first entry or after a reset"""
+        snap = self.engine.last_journal_snapshot(at=t)
+        if snap is None or snap["event"] == "reset":   # the entry after a reset is a snapshot
+            return None
+        state = dict(snap["fields"])
+        mode = snap["mode"]
+        for entry in self.engine.journal_after(snap["id"], until=t):
+            state.update(entry["fields"])
+            mode = entry["mode"]
+        return state, mode
+
+    def segments(self, t0: float, t1: float) -> List[Tuple[float, Dict[str, Any], Optional[str]]]:
+        """
+        (start time, parameters, mode) for every programming in effect during
+        [t0, t1], ready to line up against an egram recording
+        """
+        out = []
+        first = self.at(t0)
+        if first is not None:
+            out.append((t0, *first))
+        state = dict(first[0]) if first else {}
+        for entry in self.engine.journal_between(t0, t1):
+            state = dict(entry["fields"]) if entry["snapshot"] else dict(state, **entry["fields"])
+            out.append((entry["created"], dict(state), entry["mode"]))
+        return out
+
+    def changes(self, t0: float, t1: float) -> List[Dict[str, Any]]:
+        """raw journal entries in (t0, t1], e.g. to mark changes on an egram plot"""
+        return self.engine.journal_between(t0, t1)
+
+
+def align(segments: List[Tuple[float, Dict[str, Any], Optional[str]]], timestamps) -> "np.ndarray":
+    """
+    index into `segments` for every egram timestamp (-1 before the first one),
+    one vectorized search for a whole recording
+    """
+    import numpy as np  # params imports the journal, keep numpy off the GUI start-up path
+    starts = np.fromiter((s[0] for s in segments), dtype=np.float64, count=len(segments))
+    return np.searchsorted(starts, np.asarray(timestamps, dtype=np.float64), side="right") - 1
@@ -0,0 +1,276 @@
+import struct
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    label: str
+    unit: str
+    type: str               # "int" or "float", also how the GUI parses the entry
+    low: float
+    high: float
+    applies: Optional[str]  # see APPLIES, None = device setting not tied to a mode
+    range_text: Optional[str] = None
+
+    @property
+    def range(self) -> str:
+        return self.range_text or f"{self.low}-{self.high}"
+
+    def parse(self, text: str):
+        return int(text) if self.type == "int" else float(text)
+
+    def message(self, value) -> str:
+        return f"{self.label} {value} out of range ({self.low}-{self.high} {self.unit})".replace(" )", ")")
+
+
+@dataclass(frozen=True)
+class Rule:
+    """cross-field rule `left op right`, checked when both fields apply"""
+    left: str
+    op: str
+    right: str
+    message: str
+
+
+# which modes a field belongs to, in terms of parse_mode()'s ModeInfo
+APPLIES: Dict[str, Callable] = {
+    "all": lambda m: True,
+    "sensing": lambda m: m.sensed != "O",
+    "rate": lambda m: m.rate,
+    "atrial": lambda m: m.paced in "AD" or m.sensed in "AD",
+    "atrial_sensing": lambda m: m.sensed in "AD",
+    "ventricular": lambda m: m.paced in "VD" or m.sensed in "VD",
+    "ventricular_sensing": lambda m: m.sensed in "VD",
+    "dual": lambda m: m.paced == "D",
+}
+
+# in the order the GUI shows them
+FIELDS: Tuple[FieldSpec, ...] = (
+    FieldSpec("LRL", "Lower Rate Limit", "ppm", "int", 30, 175, "all"),
+    FieldSpec("URL", "Upper Rate Limit", "ppm", "int", 50, 175, "sensing"),
+    FieldSpec("MSR", "Maximum Sensor Rate", "ppm", "int", 50, 175, "rate"),
+    FieldSpec("activity_threshold", "Activity Threshold", "level", "int", 1, 7, "rate",
+              "1-7 (V-Low to V-High)"),
+    FieldSpec("reaction_time", "Reaction Time", "sec", "int", 10, 50, "rate"),
+    FieldSpec("recovery_time", "Recovery Time", "min", "int", 2, 16, "rate"),
+    FieldSpec("response_factor", "Response Factor", "level", "int", 1, 16, "rate"),
+    FieldSpec("atrial_amp", "Atrial Amplitude", "V", "float", 0.1, 5.0, "atrial"),
+    FieldSpec("atrial_width", "Atrial Pulse Width", "ms", "int", 1, 30, "atrial"),
+    FieldSpec("atrial_sensitivity", "Atrial Sensitivity", "V", "float", 0.0, 5.0, "atrial_sensing"),
+    FieldSpec("ARP", "Atrial Refractory Period", "ms", "int", 150, 500, "atrial_sensing"),
+    FieldSpec("ventricular_amp", "Ventricular Amplitude", "V", "float", 0.1, 5.0, "ventricular"),
+    FieldSpec("ventricular_width", "Ventricular Pulse Width", "ms", "int", 1, 30, "ventricular"),
+    FieldSpec("ventricular_sensitivity", "Ventricular Sensitivity", "V", "float", 0.0, 5.0,
+              "ventricular_sensing"),
+    FieldSpec("VRP", "Ventricular Refractory Period", "ms", "int", 150, 500, "ventricular_sensing"),
+    FieldSpec("AV_delay", "AV Delay", "ms", "int", 30, 300, "dual"),
+    # the parameter packet carries PVARP in one byte
+    FieldSpec("PVARP", "Post-Ventricular Atrial Refractory Period", "ms", "int", 150, 255, "dual"),
+    FieldSpec("rate_smoothing", "Rate Smoothing", "%", "int", 0, 25, None),
+    FieldSpec("atr_cmp_ref_pwm", "Atrial Comparator Reference PWM", "", "int", 0, 255, None),
+    FieldSpec("vent_cmp_ref_pwm", "Ventricular Comparator Reference PWM", "", "int", 0, 255, None),
+)
+
+FIELDS_BY_NAME: Dict[str, FieldSpec] = {f.name: f for f in FIELDS}
+
+RULES: Tuple[Rule, ...] = (
+    Rule("LRL", "<", "URL", "URL must be greater than LRL"),
+    Rule("URL", "<=", "MSR", "MSR must be >= URL"),
+    Rule("LRL", "<", "MSR", "MSR must be greater than LRL"),
+)
+
+_OPS = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+# bit positions in the violation masks from Validator.check_columns():
+# one per field in FIELDS order, then one per rule in RULES order
+FIELD_BITS: Dict[str, int] = {f.name: i for i, f in enumerate(FIELDS)}
+RULE_BITS: Dict[Rule, int] = {r: len(FIELDS) + i for i, r in enumerate(RULES)}
+
+# parameter payload of CMD_SEND_PARAMS, in firmware order; "mode" is the mode id
+WIRE_LAYOUT: Tuple[Tuple[str, str], ...] = (
+    ("mode", "B"),
+    ("ARP", "H"), ("VRP", "H"),
+    ("atrial_amp", "f"), ("ventricular_amp", "f"),
+    ("atrial_width", "H"), ("ventricular_width", "H"),
+    ("atr_cmp_ref_pwm", "B"), ("vent_cmp_ref_pwm", "B"),
+    ("reaction_time", "H"), ("recovery_time", "H"),
+    ("PVARP", "B"), ("AV_delay", "H"),
+    ("response_factor", "B"), ("activity_threshold", "B"),
+    ("LRL", "B"), ("URL", "B"), ("MSR", "B"), ("rate_smoothing", "B"),
+)
+WIRE_STRUCT = struct.Struct("<" + "".join(code for _, code in WIRE_LAYOUT))
+
+# float fields travel as float32, compare read-back values within this (V)
+FLOAT_TOLERANCE = 1e-3
+
+
+class Validator:
+    """
+    Range and cross-field checks for one mode, built once by validator_for().
+    Values can be a Parameters object or a dict; missing fields are skipped.
+    """
+    def __init__(self, fields: Sequence[FieldSpec], rules: Sequence[Rule]):
+        self.fields = tuple(fields)
+        self.names = frozenset(f.name for f in self.fields)
+        self._ranges = [(f.name, f.low, f.high, f.message) for f in self.fields]
+        self._rules = [(r.left, _OPS[r.op], r.right, r.message) for r in rules]
+        self._range_bits = [(f.name, f.low, f.high, 1 << FIELD_BITS[f.name]) for f in self.fields]
+        self._rule_bits = [(r.left, _OPS[r.op], r.right, 1 << RULE_BITS[r]) for r in rules]
+        self._rules_by_field: Dict[str, list] = {}
+        for rule in self._rules:
+            self._rules_by_field.setdefault(rule[0], []).append(rule)
+            self._rules_by_field.setdefault(rule[2], []).append(rule)
+
+    def check_field(self, name: str, value, values=None) -> Optional[str]:
+        """error message for one field as it is edited, None if it's fine"""
+        spec = FIELDS_BY_NAME.get(name)
+        if spec is None or name not in self.names:
+            return None
+        if not spec.low <= value <= spec.high:
+            return spec.message(value)
+        if values is not None:
+            values = dict(_as_dict(values), **{name: value})
+            for left, op, right, message in self._rules_by_field.get(name, ()):
+                if left in values and right in values and not op(values[left], values[right]):
+                    return message
+        return None
+
+    def errors(self, values) -> List[str]:
+        """every violation, in form order"""
+        values = _as_dict(values)
+        out = []
+        for name, low, high, message in self._ranges:
+            if name in values and not low <= values[name] <= high:
+                out.append(message(values[name]))
+        for left, op, right, message in self._rules:
+            if left in values and right in values and not op(values[left], values[right]):
+                out.append(message)
+        return out
+
+    def validate(self, values) -> bool:
+        """raise ValueError with the first violation"""
+        errors = self.errors(values)
+        if errors:
+            raise ValueError(errors[0])
+        return True
+
+    def check_batch(self, rows) -> List[List[str]]:
+        """errors() for each candidate parameter set"""
+        return [self.errors(row) for row in rows]
+
+    def check_columns(self, columns) -> "np.ndarray":
+        """
+        Validate a columnar table ({field: array} or a structured array) in one
+        pass of NumPy comparisons. Returns a uint32 violation mask per row, see
+        FIELD_BITS / RULE_BITS and describe(); 0 means the row is valid.
+        Scalars broadcast, missing fields are skipped.
+        """
+        import numpy as np  # only bulk checks need it, keeps GUI start-up light
+        names = columns.dtype.names if hasattr(columns, "dtype") else columns.keys()
+        cols = {name: np.asarray(columns[name]) for name in names}
+        n = max((c.shape[0] for c in cols.values() if c.ndim), default=1)
+        mask = np.zeros(n, dtype=np.uint32)
+        for name, low, high, bit in self._range_bits:
+            col = cols.get(name)
+            if col is not None:
+                mask |= np.where((col >= low) & (col <= high), np.uint32(0), np.uint32(bit))
+        for left, op, right, bit in self._rule_bits:
+            if left in cols and right in cols:
+                mask |= np.where(op(cols[left], cols[right]), np.uint32(0), np.uint32(bit))
+        return mask
+
+
+def describe(mask: int) -> List[str]:
+    """field names and rule messages behind one violation mask"""
+    mask = int(mask)
+    out = [name for name, bit in FIELD_BITS.items() if mask >> bit & 1]
+    out += [rule.message for rule, bit in RULE_BITS.items() if mask >> bit & 1]
+    return out
+
+
+def _as_dict(values) -> Dict[str, Any]:
+    return values.to_dict() if hasattr(values, "to_dict") else values
+
+
+def fields_for(mode=None) -> List[FieldSpec]:
+    """fields used by a mode, every field when mode is None"""
+    if mode is None:
+        return list(FIELDS)
+    from .modes import parse_mode   # modes builds on the schema, import lazily
+    return applicable_fields(parse_mode(mode))
+
+
+def applicable_fields(info) -> List[FieldSpec]:
+    """fields used by a parsed mode (ModeInfo)"""
+    return [f for f in FIELDS if f.applies is not None and APPLIES[f.applies](info)]
+
+
+_validators: Dict[Optional[str], Validator] = {}
+
+def validator_for(mode=None) -> Validator:
+    """compiled validator for a mode (enum or string), or for all fields"""
+    key = None if mode is None else str(getattr(mode, "value", mode)).upper()
+    validator = _validators.get(key)
+    if validator is None:
+        fields = fields_for(key)
+        names = {f.name for f in fields}
+        rules = [r for r in RULES if r.left in names and r.right in names]
+        validator = _validators[key] = Validator(fields, rules)
+    return validator
+
+
+def form_fields(mode) -> List[Dict[str, str]]:
+    """entry rows for the GUI parameter form"""
+    return [{"name": f.name, "label": f.label, "unit": f.unit, "range": f.range, "type": f.type}
+            for f in fields_for(mode)]
+
+
+def encode_parameters(values, mode_id_val: int = 0) -> bytes:
+    """CMD_SEND_PARAMS payload; missing fields are sent as 0"""
+    values = _as_dict(values)
+    packed = []
+    for name, code in WIRE_LAYOUT:
+        value = mode_id_val if name == "mode" else values.get(name, 0)
+        packed.append(float(value) if code == "f" else int(round(value)))
+    try:
+        return WIRE_STRUCT.pack(*packed)
+    except struct.error:
+        for (name, code), value in zip(WIRE_LAYOUT, packed):
+            try:
+                struct.pack("<" + code, value)
+            except struct.error:
+                raise ValueError(f"{name} {value} does not fit the parameter packet") from None
+        raise
+
+
+def diff_parameters(expected, reported: Dict[str, Any]) -> List[Tuple[str, Any, Any]]:
+    """
+    (field, expected, reported) for every wire field that differs between the
+    DCM's copy and a read-back block. Integer fields are compared as sent
+    (rounded), float fields within FLOAT_TOLERANCE.
+    """
+    expected = _as_dict(expected)
+    out = []
+    for name, code in WIRE_LAYOUT:
+        if name == "mode" or name not in reported:
+            continue
+        want = expected.get(name, 0)
+        got = reported[name]
+        if code == "f":
+            same = abs(float(want) - float(got)) <= FLOAT_TOLERANCE
+        else:
+            same = int(round(want)) == int(got)
+        if not same:
+            out.append((name, want, got))
+    return out
+
+
+def decode_parameters(payload: bytes) -> Tuple[int, Dict[str, Any]]:
+    """(mode id, field dict) from a CMD_SEND_PARAMS payload"""
+    values = dict(zip((name for name, _ in WIRE_LAYOUT), WIRE_STRUCT.unpack(payload)))
+    return values.pop("mode"), values
@@ -0,0 +1,74 @@
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+import numpy as np
+
+from .param_schema import FIELDS_BY_NAME, validator_for
+
+# grid rows materialised and validated at a time
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def _axes(axes: Dict[str, Sequence]) -> Dict[str, np.ndarray]:
+    out = {}
+    for name, values in axes.items():
+        if name not in FIELDS_BY_NAME:
+            raise ValueError(f"{name} is not a parameter")
+        arr = np.asarray(values)
+        if arr.ndim != 1 or len(arr) == 0:
+            raise ValueError(f"sweep axis {name} needs a non-empty list of values")
+        out[name] = arr
+    return out
+
+
+def grid_size(axes: Dict[str, Sequence]) -> int:
+    return int(np.prod([len(v) for v in axes.values()], dtype=np.int64))
+
+
+def grid_chunks(base, axes: Dict[str, Sequence], mode=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                start: int = 0) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray]]:
+    """
+    Walk the cartesian product of `axes` over the `base` parameters (Parameters
+    or dict) chunk_size rows at a time, without building the whole grid.
+    Yields (grid indices, {field: column}, violation masks) for every chunk;
+    fields not being swept stay scalars.
+    """
+    axes = _axes(axes)
+    base = base.to_dict() if hasattr(base, "to_dict") else dict(base)
+    validator = validator_for(mode)
+    shape = tuple(len(v) for v in axes.values())
+    total = grid_size(axes)
+    for lo in range(start, total, chunk_size):
+        index = np.arange(lo, min(lo + chunk_size, total))
+        positions = np.unravel_index(index, shape)
+        columns: Dict[str, Any] = dict(base)
+        for (name, values), pos in zip(axes.items(), positions):
+            columns[name] = values[pos]
+        yield index, columns, validator.check_columns(columns)
+
+
+def sweep(base, axes: Dict[str, Sequence], mode=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+          start: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lazily yield (grid index, parameter dict) for every valid combination,
+    in grid order. The index is stable, so a run can resume with start=index+1.
+    """
+    for index, columns, masks in grid_chunks(base, axes, mode, chunk_size, start):
+        ok = np.flatnonzero(masks == 0)
+        if not len(ok):
+            continue
+        swept = {name: col[ok].tolist() for name, col in columns.items() if np.ndim(col)}
+        fixed = {name: val for name, val in columns.items() if not np.ndim(val)}
+        for row, i in enumerate(index[ok].tolist()):
+            values = dict(fixed)
+            for name, col in swept.items():
+                values[name] = col[row]
+            yield i, _coerce(values)
+
+
+def _coerce(values: Dict[str, Any]) -> Dict[str, Any]:
+    """plain int/float per the schema, so rows feed straight into Parameters(**row)"""
+    for name, value in values.items():
+        spec = FIELDS_BY_NAME.get(name)
+        if spec is not None:
+            values[name] = int(value) if spec.type == "int" else float(value)
+    return values
@@ -1,8 +1,15 @@
 import json
-from typing import Dict, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass, asdict, fields
 import os
 
+import weakref
+
+from . import storage
+from .param_schema import validator_for
+from .param_journal import ParameterJournal
+
+# Legacy JSON parameter file, imported into the database (storage.DB_FILE) the first time it is opened
 PARAMS_FILE = os.path.join(os.path.dirname(__file__), "..", "storage", "params.json")
 
 @dataclass
@@ -41,77 +48,75 @@ class Parameters:
     vent_cmp_ref_pwm: int
 
     def validate(self) -> bool:
-
-        # Basic ranges
-        if not (30 <= self.LRL <= 175):
-            raise ValueError("LRL out of range (30–175)")
-        if not (50 <= self.URL <= 175):
-            raise ValueError("URL out of range (50–175)")
-        if self.LRL >= self.URL:
-            raise ValueError("URL must be greater than LRL")
-
-        if not (self.URL <= self.MSR <= 175):
-            raise ValueError("MSR must be >= URL and ≤ 175")
-
-        if not (0 <= self.rate_smoothing <= 25):
-            raise ValueError("Rate smoothing out of range")
-
-        # Amplitude (0.1 – 5.0 V)
-        for amp in (self.atrial_amp, self.ventrical_amp if hasattr(self, "ventrical_amp") else self.ventricular_amp):
-            if not (0.1 <= amp <= 5.0):
-                raise ValueError("Amplitude out of range (0.1–5.0 V)")
-
-        # Sensitivity (0.0 – 5.0 V)
-        for sens in (self.atrial_sensitivity, self.ventricular_sensitivity):
-            if not (0.0 <= sens <= 5.0):
-                raise ValueError("Sensitivity out of range (0–5.0 V)")
-
-        # Pulse widths (1–30 ms)
-        if not (1 <= self.atrial_width <= 30):
-            raise ValueError("Atrial pulse width out of range (1–30 ms)")
-        if not (1 <= self.ventricular_width <= 30):
-            raise ValueError("Ventricular pulse width out of range (1–30 ms)")
-
-        # Refractory periods
-        for rp in (self.ARP, self.VRP):
-            if not (150 <= rp <= 500):
-                raise ValueError("ARP/VRP out of range (150–500 ms)")
-
-        # PVARP
-        if not (150 <= self.PVARP <= 500):
-            raise ValueError("PVARP out of range")
-
-        # AV delay
-        if not (30 <= self.AV_delay <= 300):
-            raise ValueError("AV delay out of range")
-
-        # Rate response parameters
-        if not (1 <= self.activity_threshold <= 7):
-            raise ValueError("Activity threshold out of range (1–7)")
-        if not (10 <= self.reaction_time <= 50):
-            raise ValueError("Reaction time out of range (10–50 s)")
-        if not (2 <= self.recovery_time <= 16):
-            raise ValueError("Recovery time out of range (2–16 min)")
-        if not (1 <= self.response_factor <= 16):
-            raise ValueError("Response factor out of range (1–16)")
-
-        return True
+        """check every field against the parameter schema, ValueError on the first violation"""
+        return validator_for(None).validate(self)
 
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
-def save_parameters(params: Parameters) -> None:
+def _engine() -> storage.StorageEngine:
+    """database behind the parameter functions, imports PARAMS_FILE on first use"""
+    engine = storage.get_engine()
+    if engine.get_meta("params_migrated") is None:
+        data = None
+        if os.path.exists(PARAMS_FILE):
+            with open(PARAMS_FILE, "r") as f:
+                content = f.read().strip()
+            data = json.loads(content) if content else None
+        storage.migrate_json(engine, {}, data)
+        engine.set_meta("params_migrated", "1")
+    return engine
+
+_journals: "weakref.WeakKeyDictionary[storage.StorageEngine, ParameterJournal]" = weakref.WeakKeyDictionary()
+
+def _journal() -> ParameterJournal:
+    """change journal for the current database"""
+    engine = _engine()
+    journal = _journals.get(engine)
+    if journal is None:
+        journal = _journals[engine] = ParameterJournal(engine)
+    return journal
+
+def save_parameters(params: Parameters, username: Optional[str] = None,
+                    mode: Optional[str] = None) -> None:
+    """validate and journal the parameters as saved, earlier saves are kept as history"""
     params.validate()
-    with open(PARAMS_FILE, "w") as f:
-        json.dump(params.to_dict(), f, indent=4)
-
-def load_parameters() -> Parameters:
-    if not os.path.exists(PARAMS_FILE):
-        raise FileNotFoundError("No parameters file found")
-    with open(PARAMS_FILE, "r") as f:
-        data = json.load(f)
-    return Parameters(**data)
-
-def reset_parameters_file() -> None:
-    with open(PARAMS_FILE, "w") as f:
-        json.dump({}, f, indent=4)
+    _journal().record(params, username=username, mode=mode, event="saved")
+
+def record_programmed(params, username: Optional[str] = None,
+                      mode: Optional[str] = None) -> None:
+    """
+    log parameters the device acknowledged in the change journal. params is a
+    Parameters object or a dict of every field; ValueError for a partial dict,
+    the wire push leaves out fields the journal needs to rebuild a Parameters
+    """
+    if not isinstance(params, Parameters):
+        missing = [f.name for f in fields(Parameters) if f.name not in params]
+        if missing:
+            raise ValueError(f"incomplete parameter set, missing: {', '.join(missing)}")
+    _journal().record(params, username=username, mode=mode, event="transmitted")
+
+def parameters_at(t: float) -> Optional[Tuple[Parameters, Optional[str]]]:
+    """(Parameters, mode) in effect at time t according to the journal, None before any entry"""
+    found = _journal().at(t)
+    if found is None:
+        return None
+    fields, mode = found
+    return Parameters(**fields), mode
+
+def load_parameters(username: Optional[str] = None) -> Parameters:
+    """most recently saved parameters (by one user if given). FileNotFoundError if none saved"""
+    found = _journal().latest(username, event="saved")
+    if found is None:
+        raise FileNotFoundError("No saved parameters found")
+    return Parameters(**found[1])
+
+def parameter_history(username: Optional[str] = None, since: Optional[float] = None,
+                      until: Optional[float] = None) -> List[Tuple[float, Parameters]]:
+    """(saved time, Parameters) for every save in the journal, oldest first"""
+    return [(created, Parameters(**fields))
+            for created, fields, _ in _journal().history(username, "saved", since, until)]
+
+def reset_parameters_file(username: Optional[str] = None) -> None:
+    """forget the saved parameters by journaling a reset, the history before it is kept"""
+    _journal().reset(username=username)
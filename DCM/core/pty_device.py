@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .egram_codec import CMD_EGRAM_DELTA, CMD_EGRAM_PACKED, DeltaEncoder, encode_packed
+from .framing import (CMD_ACK, CMD_EGRAM, CMD_PARAMS_REPORT, CMD_REQUEST_EGRAM, CMD_REQUEST_EGRAM_DELTA,
+                      CMD_REQUEST_EGRAM_PACKED, CMD_REQUEST_PARAMS, CMD_SEND_PARAMS, CMD_STOP_EGRAM,
+                      START_BYTE, FrameDecoder, encode_frame)
+from .param_schema import WIRE_STRUCT, decode_parameters, encode_parameters
+
+EGRAM_PAYLOAD = 21
+
+# payload length of each command the stand-in understands
+_COMMANDS = {CMD_SEND_PARAMS: WIRE_STRUCT.size, CMD_REQUEST_EGRAM: 0, CMD_REQUEST_PARAMS: 0,
+             CMD_REQUEST_EGRAM_PACKED: 1, CMD_REQUEST_EGRAM_DELTA: 1, CMD_STOP_EGRAM: 0}
+
+
+class PtyDevice:
+    """
+    Pseudo-terminal stand-in for the pacemaker board, for bench scripts and
+    tests without hardware. Open `port` with SerialInterface as usual: the
+    stand-in ACKs parameter packets, reports them back on request and, once
+    egram is requested, streams 0xE0 packets (or packed 0xE1 / delta 0xE2
+    frames) at `rate` Hz with a beat at the programmed LRL. `frame_version` 2 answers in CRC-checked frames; both
+    versions are accepted. POSIX only.
+    """
+    def __init__(self, rate: float = 500.0, burst: int = 10, frame_version: int = 1):
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        # a full line buffer drops data like a UART overrun instead of blocking
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.rate = rate
+        self.burst = burst
+        self.frame_version = frame_version
+        self.received: List[Tuple[int, Dict]] = []
+        self.mode_id = 0
+        self.params: Dict = {"LRL": 60}
+        self.streaming = False
+        self.samples_per_frame = 0     # > 0 once packed egram was requested
+        self.delta_encoder: Optional[DeltaEncoder] = None
+        self.responsive = True         # set False to simulate a device that stops answering
+        self._lock = threading.Lock()
+        self._running = True
+        self._threads = [threading.Thread(target=self._rx_loop, daemon=True),
+                         threading.Thread(target=self._egram_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+
+    def close(self) -> None:
+        self._running = False
+        for t in self._threads:
+            t.join(timeout=1.0)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, data: bytes) -> None:
+        with self._lock:
+            try:
+                os.write(self.master, data)
+            except BlockingIOError:
+                pass
+
+    def _frame(self, cmd: int, payload: bytes = b"") -> bytes:
+        if self.frame_version == 2:
+            return encode_frame(cmd, payload)
+        return bytes((START_BYTE, cmd)) + payload
+
+    def _rx_loop(self) -> None:
+        import select
+        decoder = FrameDecoder(_COMMANDS)
+        while self._running:
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 4096)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            for cmd, payload in decoder.feed(data):
+                self._handle(cmd, payload)
+
+    def _handle(self, cmd: int, payload: bytes) -> None:
+        if cmd == CMD_SEND_PARAMS:
+            self.mode_id, self.params = decode_parameters(payload)
+            self.received.append((self.mode_id, self.params))
+            if self.responsive:
+                self._write(self._frame(CMD_ACK))
+        elif cmd == CMD_REQUEST_PARAMS:
+            if self.responsive:
+                self._write(self._frame(CMD_PARAMS_REPORT, encode_parameters(self.params, self.mode_id)))
+        elif cmd == CMD_REQUEST_EGRAM:
+            self.samples_per_frame = 0
+            self.delta_encoder = None
+            self.streaming = True
+        elif cmd in (CMD_REQUEST_EGRAM_PACKED, CMD_REQUEST_EGRAM_DELTA):
+            self.delta_encoder = DeltaEncoder() if cmd == CMD_REQUEST_EGRAM_DELTA else None
+            self.samples_per_frame = payload[0]
+            self.streaming = True
+        elif cmd == CMD_STOP_EGRAM:
+            self.streaming = False
+
+    def _egram_loop(self) -> None:
+        n = 0
+        count = self.burst
+        next_time = time.perf_counter()
+        while self._running:
+            next_time += count / self.rate
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+            if not self.streaming:
+                count = self.burst
+                continue
+            period = max(1, int(self.rate * 60.0 / max(self.params.get("LRL") or 60, 1)))
+            k = self.samples_per_frame
+            if k:
+                # whole frames only, the counter tells the host the sample number
+                count = max(k, self.burst - self.burst % k)
+            else:
+                count = self.burst
+            atrial, ventricular = [], []
+            for i in range(n, n + count):
+                phase = i % period
+                atrial.append(200 if phase < 3 else 20)
+                ventricular.append(220 if 0 <= phase - period // 8 < 3 else 30)
+            packets = bytearray()
+            encoder = self.delta_encoder
+            if k:
+                for lo in range(0, count, k):
+                    a, v = atrial[lo:lo + k], ventricular[lo:lo + k]
+                    if encoder is not None:
+                        packets += self._frame(CMD_EGRAM_DELTA, encoder.encode(n + lo, a, v))
+                    else:
+                        packets += self._frame(CMD_EGRAM_PACKED, encode_packed(n + lo, a, v))
+            else:
+                for a, v in zip(atrial, ventricular):
+                    packets += self._frame(CMD_EGRAM, bytes(EGRAM_PAYLOAD - 2) + bytes((a, v)))
+            n += count
+            try:
+                self._write(bytes(packets))
+            except OSError:
+                return
@@ -0,0 +1,114 @@
+from typing import Optional
+
+import numpy as np
+
+COUNTER_MOD = 1 << 16
+# a counter jump further back than this is a device restart, not reordering
+RESTART_GAP = COUNTER_MOD // 2
+# weight of older observations per new one, ~1/(1-FORGETTING) reads of memory
+DEFAULT_FORGETTING = 0.995
+# nominal egram rate of the board (Hz), spaces the first read before there is a fit
+DEVICE_SAMPLE_RATE = 1000.0
+
+
+class SampleClock:
+    """
+    Maps device sample numbers to host time. Each read gives one observation
+    (index of its newest sample, host arrival time); a recursive least-squares
+    line through them, with exponential forgetting, tracks the offset and the
+    drift between the two clocks. Samples are then stamped from the line, so
+    every sample in a chunk is evenly spaced and scheduler jitter on the host
+    side averages out.
+
+    Without device counters (legacy 0xE0 frames) samples are numbered in
+    arrival order with advance().
+    """
+    def __init__(self, nominal_rate: Optional[float] = None, forgetting: float = DEFAULT_FORGETTING):
+        self.nominal_rate = nominal_rate
+        self.forgetting = forgetting
+        self.reset()
+
+    def reset(self) -> None:
+        self._index: Optional[int] = None    # unwrapped index of the next expected sample
+        self._origin: Optional[tuple] = None  # (index, host time) the fit is centred on
+        self._sums = np.zeros(5)              # weight, x, y, xx, xy
+        self._last_stamp: Optional[float] = None
+        self.observations = 0
+
+    # sample numbering
+
+    def unwrap(self, counter: int, count: int) -> int:
+        """unwrapped index of the first of `count` samples whose 16-bit counter is `counter`"""
+        if self._index is None:
+            start = counter
+        else:
+            gap = (counter - self._index) % COUNTER_MOD
+            if gap >= RESTART_GAP:
+                # the device restarted its counter: start a new fit
+                self.reset()
+                start = counter
+            else:
+                start = self._index + gap
+        self._index = start + count
+        return start
+
+    def advance(self, count: int) -> int:
+        """index of the first of `count` samples that carry no counter"""
+        start = 0 if self._index is None else self._index
+        self._index = start + count
+        return start
+
+    # clock fit
+
+    def observe(self, index: int, host_time: float) -> None:
+        """sample `index` had arrived by `host_time`"""
+        if self._origin is None:
+            self._origin = (index, host_time)
+        x = index - self._origin[0]
+        y = host_time - self._origin[1]
+        self._sums *= self.forgetting
+        self._sums += (1.0, x, y, x * x, x * y)
+        self.observations += 1
+
+    @property
+    def period(self) -> Optional[float]:
+        """seconds per sample (host clock), None until two distinct observations"""
+        w, sx, sy, sxx, sxy = self._sums
+        det = w * sxx - sx * sx
+        if self.observations < 2 or det <= 1e-9 * max(w * sxx, 1.0):
+            return 1.0 / self.nominal_rate if self.nominal_rate else None
+        return (w * sxy - sx * sy) / det
+
+    @property
+    def rate(self) -> Optional[float]:
+        """device sample rate in Hz as measured against the host clock"""
+        period = self.period
+        return 1.0 / period if period else None
+
+    def times(self, indices) -> np.ndarray:
+        """host timestamps for unwrapped sample indices, from the current fit"""
+        indices = np.asarray(indices, dtype=np.float64)
+        if self._origin is None:
+            raise ValueError("no observations yet")
+        w, sx, sy, _, _ = self._sums
+        period = self.period or 0.0
+        # the line passes through the weighted mean of the observations
+        mx, my = sx / w, sy / w
+        return self._origin[1] + my + (indices - self._origin[0] - mx) * period
+
+    def stamp(self, indices, host_time: float) -> np.ndarray:
+        """
+        Observe that the samples at `indices` (one read, ascending) had
+        arrived by host_time and return their timestamps in one batch: evenly
+        spaced on the device clock and never earlier than anything stamped
+        before.
+        """
+        indices = np.asarray(indices)
+        if not len(indices):
+            return np.empty(0)
+        self.observe(int(indices[-1]), host_time)
+        stamps = self.times(indices)
+        if self._last_stamp is not None and stamps[0] <= self._last_stamp:
+            stamps += self._last_stamp - stamps[0] + (self.period or 0.0)
+        self._last_stamp = float(stamps[-1])
+        return stamps
@@ -1,38 +1,137 @@
+import logging
 import struct
 import threading
 import time
+import numpy as np
 import serial 
 
-START_BYTE = 0x16
+from .egram_codec import (CMD_EGRAM_DELTA, CMD_EGRAM_PACKED, DEFAULT_SAMPLES_PER_FRAME,
+                          MAX_DELTA_SAMPLES, MAX_SAMPLES_PER_FRAME, DeltaDecoder, counter_gap,
+                          decode_packed, packed_size)
+from .framing import (CMD_ACK, CMD_EGRAM, CMD_PARAMS_REPORT, CMD_REQUEST_EGRAM, CMD_REQUEST_EGRAM_DELTA,
+                      CMD_REQUEST_EGRAM_PACKED, CMD_REQUEST_PARAMS, CMD_SEND_PARAMS, CMD_STOP_EGRAM,
+                      START_BYTE, FrameDecoder, encode_frame)
+from .sample_clock import DEVICE_SAMPLE_RATE, SampleClock
+from .param_schema import WIRE_STRUCT, decode_parameters, diff_parameters, encode_parameters
+from .tx_queue import PRIORITY_CONTROL, TxQueue
+
+log = logging.getLogger(__name__)
+
 END_BYTE = 0x04
 
-CMD_SEND_PARAMS = 0x55
-CMD_REQUEST_EGRAM = 0x22
+# payload length of each v1 frame the device sends, v1 has no length byte;
+# packed egram over v1 always carries DEFAULT_SAMPLES_PER_FRAME
+V1_PAYLOAD_LENGTHS = {CMD_EGRAM: 21, CMD_ACK: 0, CMD_PARAMS_REPORT: WIRE_STRUCT.size,
+                      CMD_EGRAM_PACKED: packed_size(DEFAULT_SAMPLES_PER_FRAME)}
 
 
 class SerialInterface:
-    def __init__(self, port, baudrate=115200):
+    def __init__(self, port, baudrate=115200, frame_version=1, sample_rate=DEVICE_SAMPLE_RATE):
+        """frame_version 2 sends and receives only length-prefixed, CRC-checked
+        frames (see framing.py); v1 frames have no check, so a v2 link ignores them.
+        sample_rate is the nominal egram rate, it spaces the samples of the
+        first read until the sample clock has a fit"""
         self.port_name = port
         self.baudrate = baudrate
+        self.frame_version = frame_version
+        self.decoder = FrameDecoder(V1_PAYLOAD_LENGTHS, accept_v1=frame_version == 1)
         self.serial = None
         self.running = False
+        # writer thread + priority queue, see connect(tx_queue=True)
+        self.tx = None
         
         self.egram_callback = None
+        # called once per read with (timestamps, atrial, ventricular) lists;
+        # timestamps come from the device sample clock, see sample_clock.py
+        self.egram_batch_callback = None
         self.ack_callback = None
+        # called with (mode id, field dict) when the device reports its parameters
+        self.params_callback = None
+        self._pending_egram = ([], [])
+        # [first sample index or None, count] per run of samples in this read
+        self._pending_ranges = []
+        self.clock = SampleClock(sample_rate)
+        # sample counter expected in the next packed egram frame
+        self._egram_counter = None
+        self.egram_stats = {"samples": 0, "lost": 0}
+        # frames skipped because decoding them or a callback raised
+        self.frame_errors = 0
+        self.delta_decoder = DeltaDecoder()
+        self._report_lock = threading.Lock()
+        self._report_waiters = []
+        # set by a LinkSupervisor: called once with the exception when the port
+        # goes away; without it the read loop keeps retrying the dead port
+        self.link_lost_callback = None
+        self._link_lock = threading.Lock()
+        self._generation = 0
+        # what to restore after a reconnect
+        # ACKs carry no id, so only the newest push is in flight: (fields, mode id,
+        # push number, sent at). A new push replaces it, after ack_timeout it expires
+        self._in_flight = None
+        self._ack_lock = threading.Lock()
+        self._push_lock = threading.Lock()
+        self.ack_timeout = 1.0
+        self.push_seq = 0               # number of the newest push
+        self.acked_seq = 0              # number of the push confirmed last
+        self.last_acked = None          # (field dict, mode id) the device ACKed last
+        self.egram_request = None       # (samples_per_frame, delta) of the last request_egram
+        self.egram_seen = threading.Event()
     
-    def connect(self):
+    def connect(self, tx_queue=False):
+        """
+        open the port and start the read thread. With tx_queue, writes go
+        through a TxQueue drained by a writer thread, so a stalled adapter
+        never blocks the caller; otherwise they are written synchronously
+        """
         self.serial = serial.Serial(self.port_name, self.baudrate,timeout=0.1)
         self.running = True
-        threading.Thread(target=self._read_loop, daemon=True).start()
+        self._generation += 1
+        self.decoder.reset()
+        self._egram_counter = None
+        self.delta_decoder.reset()
+        self.clock.reset()
+        with self._ack_lock:
+            self._in_flight = None          # no ACK comes for a push to the old link
+        threading.Thread(target=self._read_loop, args=(self._generation,), daemon=True).start()
+        if tx_queue:
+            self.tx = TxQueue(self.serial.write)
+            self.tx.error_callback = self._link_lost
+            self.tx.start()
     
     def disconnect(self):
         self.running = False
+        if self.tx is not None:
+            self.tx.stop(drain=True, timeout=0.5)
         if self.serial and self.serial.is_open:
             self.serial.close()
+
+    def reconnect(self, port=None):
+        """reopen the port (optionally under a new name), keeping callbacks and the TX mode"""
+        tx_queue = self.tx is not None
+        if self.tx is not None:
+            self.tx.stop(drain=False, timeout=0.1)
+        if port:
+            self.port_name = port
+        self.connect(tx_queue=tx_queue)
+
+    def _link_lost(self, exc):
+        """the port failed: stop using it and tell the supervisor, once"""
+        if not self.link_lost_callback:
+            return
+        with self._link_lock:
+            if not self.running:
+                return
+            self.running = False
+        try:
+            self.serial.close()
+        except Exception:
+            pass
+        self.link_lost_callback(exc)
             
     #build packet
     def _build_packet(self, cmd, payload_bytes):
-        #length = len(payload_bytes)
+        if self.frame_version == 2:
+            return encode_frame(cmd, bytes(payload_bytes))
         packet = bytearray()
         packet.append(START_BYTE)
         packet.append(cmd)
@@ -41,190 +140,236 @@ class SerialInterface:
         
         return packet
 
+    def _send(self, packet, priority=PRIORITY_CONTROL, key=None):
+        """queue the packet when the TX queue runs, else write it now"""
+        if self.tx is not None and self.tx.running:
+            self.tx.put(packet, priority, key)
+        else:
+            self.serial.write(packet)
+
     #public api
-    def send_parameters(self, params, mode_id_val=0):
+    def send_parameters(self, params, mode_id_val=0, priority=PRIORITY_CONTROL):
         """
         params = Parameters object or dict containing keys matching params.py
         mode_id_val = Integer ID of the mode (from modes.py)
+        priority = tx_queue priority; a queued push not yet on the wire is
+        replaced by the newer one. Returns the push number, see acked_seq
         """ 
-        # Handle Parameters object
-        if hasattr(params, 'to_dict'):
-            p = params.to_dict()
+        # field order and packing come from the parameter schema
+        payload = encode_parameters(params, mode_id_val)
+        packet = self._build_packet(CMD_SEND_PARAMS,payload)
+        log.debug("parameter packet: %s", packet.hex())
+        fields = dict(params.to_dict() if hasattr(params, "to_dict") else params)
+        # _ack_lock only covers the bookkeeping, so a stalled synchronous write
+        # doesn't hold up ACK matching on the read thread; _push_lock keeps
+        # concurrent pushes on the wire in push-number order
+        with self._push_lock:
+            with self._ack_lock:
+                self.push_seq += 1
+                seq = self.push_seq
+                self._in_flight = (fields, mode_id_val, seq, time.monotonic())
+            self._send(packet, priority, key="params")
+        return seq
+
+    def request_egram(self, samples_per_frame=0, delta=False):
+        """
+        ask the device to start streaming egram packets. samples_per_frame > 0
+        asks for packed frames carrying that many samples per channel (up to
+        MAX_SAMPLES_PER_FRAME; v1 links must use DEFAULT_SAMPLES_PER_FRAME).
+        delta=True asks for delta-coded frames instead (v2 links, up to
+        MAX_DELTA_SAMPLES)
+        """
+        self.egram_request = (samples_per_frame, delta)
+        if not samples_per_frame:
+            self._send(self._build_packet(CMD_REQUEST_EGRAM, b""), key="egram")
+            return
+        if delta:
+            if self.frame_version != 2:
+                raise ValueError("delta egram needs frame_version=2")
+            if not 0 < samples_per_frame <= MAX_DELTA_SAMPLES:
+                raise ValueError(f"samples_per_frame must be 1-{MAX_DELTA_SAMPLES}")
+            cmd = CMD_REQUEST_EGRAM_DELTA
         else:
-            p = params
+            if not 0 < samples_per_frame <= MAX_SAMPLES_PER_FRAME:
+                raise ValueError(f"samples_per_frame must be 1-{MAX_SAMPLES_PER_FRAME}")
+            if self.frame_version == 1 and samples_per_frame != DEFAULT_SAMPLES_PER_FRAME:
+                raise ValueError(f"v1 frames only carry {DEFAULT_SAMPLES_PER_FRAME} samples per frame")
+            cmd = CMD_REQUEST_EGRAM_PACKED
+        self._egram_counter = None
+        self.delta_decoder.reset()
+        self._send(self._build_packet(cmd, bytes((samples_per_frame,))), key="egram")
 
-        # Helper to safely get value
-        def get_val(key, default=0):
-            return p.get(key, default)
-    
+    def stop_egram(self):
+        """ask the device to stop streaming; a LinkSupervisor no longer restarts it"""
+        self.egram_request = None
+        self._send(self._build_packet(CMD_STOP_EGRAM, b""), key="egram")
 
-        values = [
-            mode_id_val,                            # MODE
-            get_val("ARP"),                         # ARP
-            get_val("VRP"),                         # VRP
-            get_val("atrial_amp")  ,        # ATR_AMPLITUDE
-            get_val("ventricular_amp") ,   # VENT_AMPLITUDE
-            get_val("atrial_width"),                # ATR_PULSEWIDTH
-            get_val("ventricular_width"),           # VENT_PULSEWIDTH
-            get_val("atr_cmp_ref_pwm"),             # ATR_CMP_REF_PWM
-            get_val("vent_cmp_ref_pwm"),            # VENT_CMP_REF_PWM
-            get_val("reaction_time"),               # REACTION_TIME
-            get_val("recovery_time"),               # RECOVERY_TIME
-            get_val("PVARP"),                       # PVARP
-            get_val("AV_delay"),                    # FIXED_AV_DELAY
-            get_val("response_factor"),             # RESPONSE_FACTOR
-            get_val("activity_threshold"),          # ACTIVITY_THRESHOLD
-            get_val("LRL"),                         # LOWER_RATE_LIMIT
-            get_val("URL"),                         # UPPER_RATE_LIMIT
-            get_val("MSR"),                         # MAXIMUM_SENSOR_RATE
-            get_val("rate_smoothing")               # RATE_SMOOTHING
-        ]
-        
-        
-        #values = [int(v) if not isinstance(v, float) else int(v) for v in values]
-     
-        print(f"[DEBUG] Packing parameters: {values}")
-        # payload = struct.pack('<19H', *values)
-        payload = struct.pack('<B H H f f H H B B H H B H B B B B B B', *values)
-        packet = self._build_packet(CMD_SEND_PARAMS,payload)
-        print(f"[DEBUG] Sending Parameter Packet: {packet.hex()}")
-        self.serial.write(packet)
-        print(f"im here")
+    def request_parameters(self):
+        """ask the device for its whole parameter block, answered via params_callback"""
+        self._send(self._build_packet(CMD_REQUEST_PARAMS, b""))
+
+    def read_parameters(self, timeout=1.0):
+        """
+        blocking read-back: (mode id, field dict) as stored on the device.
+        TimeoutError if no report arrives. Don't call from the read thread.
+        """
+        waiter = [threading.Event(), None]
+        with self._report_lock:
+            self._report_waiters.append(waiter)
+        try:
+            self.request_parameters()
+            if not waiter[0].wait(timeout):
+                raise TimeoutError("device did not report its parameters")
+            return waiter[1]
+        finally:
+            with self._report_lock:
+                if waiter in self._report_waiters:
+                    self._report_waiters.remove(waiter)
+
+    def verify_parameters(self, params, mode_id_val=0, timeout=1.0):
+        """
+        read the block back in one round trip and compare it with what the DCM
+        holds. Returns [(field, expected, reported)], empty when they match
+        """
+        reported_mode, reported = self.read_parameters(timeout)
+        mismatches = diff_parameters(params, reported)
+        if reported_mode != mode_id_val:
+            mismatches.insert(0, ("mode", mode_id_val, reported_mode))
+        return mismatches
     
-    def _read_loop(self):
-        buffer = bytearray()
-        while self.running:
+    def _read_loop(self, generation=0):
+        while self.running and generation == self._generation:
             try:
-                if self.serial.in_waiting:
-                    data = self.serial.read(self.serial.in_waiting)
-                    if data:
-                        print(f"[DEBUG] RAW READ: {data.hex()}")
-                        buffer.extend(data)
-                        
-                        while True:
-                            # 1. Find START_BYTE
-                            if not buffer:
-                                break
-                                
-                            if buffer[0] != START_BYTE:
-                                try:
-                                    start_idx = buffer.index(START_BYTE)
-                                    print(f"[DEBUG] Discarding garbage: {buffer[:start_idx].hex()}")
-                                    del buffer[:start_idx]
-                                except ValueError:
-                                    # No start byte found yet, discard all
-                                    print(f"[DEBUG] Discarding garbage: {buffer.hex()}")
-                                    buffer.clear()
-                                    break
-                            
-                            # 2. Check if we have enough for header (START, CMD)
-                            if len(buffer) < 2:
-                                break
-                                
-                            cmd = buffer[1]
-                            
-                            # Determine payload length based on command
-                            # CMD_SEND_PARAMS: Not received by PC usually, but for completeness
-                            # CMD_REQUEST_EGRAM: 0 payload
-                            # ACK (0xAA): 0 payload
-                            # EGRAM_DATA (0xE0): 3 bytes (1 byte ch + 2 bytes val)
-                            
-                            payload_len = 0
-                            if cmd == 0xE0: # EGRAM DATA
-                                payload_len =  21
-                            elif cmd == 0xAA: # ACK
-                                payload_len = 0
-
-                            total_len = 2 + payload_len  # Header(2: START, CMD) + Payload(N) + Checksum(1) + End(1)
-                            
-                            # 3. Check if we have full packet
-                            if len(buffer) < total_len:
-                                break
-                                
-                            # 4. Extract packet
-                            packet = buffer[:total_len]
-                            del buffer[:total_len]
-                            
-                            self._process_packet(packet)
-                            
-            except Exception as e:
-                print(f"[ERROR] Serial read error: {e}")
+                data = self.serial.read(self.serial.in_waiting) if self.serial.in_waiting else b""
+            except (serial.SerialException, OSError) as e:
+                # only the port failing is a lost link, a bad frame is not
+                log.error("serial read error: %s", e)
+                if self.link_lost_callback:
+                    self._link_lost(e)
+                    return
                 time.sleep(1)
-                
+                continue
+            if data:
+                log.debug("raw read: %s", data.hex())
+                # the decoder keeps partial frames between reads and
+                # skips line noise up to the next valid header
+                for cmd, payload in self.decoder.feed(data):
+                    self._guarded(self._handle_frame, cmd, payload)
+                self._guarded(self._flush_egram_batch)
             time.sleep(0.001)
+
+    def _guarded(self, handler, *args):
+        """run a frame handler; if it or a callback raises, log and count it and skip the frame"""
+        try:
+            handler(*args)
+        except Exception:
+            self.frame_errors += 1
+            log.exception("dropped frame after handler error")
+
+    def _flush_egram_batch(self):
+        """hand every egram sample decoded from one read to the batch callback"""
+        atrial, ventricular = self._pending_egram
+        if not atrial:
+            return
+        now = time.time()
+        ranges, self._pending_ranges = self._pending_ranges, []
+        self._pending_egram = ([], [])
+        # one index per sample: the device counter, or arrival order for 0xE0
+        parts = []
+        for start, count in ranges:
+            if start is None:
+                start = self.clock.advance(count)
+            parts.append(np.arange(start, start + count))
+        timestamps = self.clock.stamp(np.concatenate(parts), now)
+        if self.egram_batch_callback:
+            self.egram_batch_callback(timestamps.tolist(), atrial, ventricular)
+
     def _process_packet(self, packet):
-        print(f"[DEBUG] Processing packet: {packet.hex()}")
+        """handle one complete v1 packet (START, cmd, payload)"""
+        log.debug("v1 packet: %s", packet.hex())
         if len(packet) < 2:  # Reduced minimum length
             return
         if packet[0] != START_BYTE:
             return
-            
-        cmd = packet[1]
-        payload = packet[2:]
-        
-        # REMOVE THIS BLOCK - don't send ACK for parameter commands
-        # elif cmd == CMD_SEND_PARAMS:
-        #     ack = self._build_packet(0xAA, b"")
-        #     if self.serial:
-        #         print(f"[DEBUG] Sending ACK: {ack.hex()}")
-        #         self.serial.write(ack)
-        
-        if cmd == 0xAA:
-            print("[DEBUG] Received ACK packet")
+        self._handle_frame(packet[1], packet[2:])
+
+    def _handle_frame(self, cmd, payload):
+        if cmd == CMD_ACK:
+            log.debug("ACK")
+            self._confirm_push()
             if self.ack_callback:
                 self.ack_callback()
-        elif cmd == 0xE0:
+        elif cmd == CMD_PARAMS_REPORT:
+            report = decode_parameters(bytes(payload))
+            self._confirm_push(report)
+            with self._report_lock:
+                waiters, self._report_waiters = self._report_waiters, []
+            for waiter in waiters:
+                waiter[1] = report
+                waiter[0].set()
+            if self.params_callback:
+                self.params_callback(*report)
+        elif cmd == CMD_EGRAM:
+            self.egram_seen.set()
+            val1 = payload[-2]
+            val2 = payload[-1]
             if self.egram_callback:
                 
                 ch1 = 'atrial'
                 ch2 = 'ventricular'
-                val1 = payload[-2]
-                val2 = payload[-1]
-                self.egram_callback(ch1, val)
-                self.egram_callback(ch2, val)
-                
-        # def _process_packet(self,packet):
-    #     print(f"[DEBUG] Processing packet: {packet.hex()}")
-    #     if len(packet)<4:
-    #         return
-    #     if packet[0] != START_BYTE:
-    #         return
-    #     cmd = packet[1]
-    #     # length is no longer in packet
-    #     # payload is from index 2 up to -2 (excluding checksum and end)
-    #     payload = packet[2:]
-    #     # recv_checksum = packet[-2]
-        
-    #     # Verify End Byte
-    #     # if packet[-1] != END_BYTE:
-    #     #     print(f"[ERROR] Invalid End Byte: {hex(packet[-1])}")
-    #     #     return
-
-    #     # calc_checksum = 0
-    #     # for b in packet[1:-2]: # CMD + PAYLOAD
-    #     #     calc_checksum ^= b
-        
-    #     # if recv_checksum != calc_checksum:
-    #     #     print(f"[ERROR] Checksum mismatch! Recv: {hex(recv_checksum)}, Calc: {hex(calc_checksum)}")
-    #     #     return
-        
-    #     if cmd == 0xAA:
-    #         print("[DEBUG] Received ACK packet")
-    #         if self.ack_callback:
-    #             self.ack_callback()
-    #     elif cmd == CMD_SEND_PARAMS:
-    #         ack = self._build_packet(0xAA, b"")
-    #         if self.serial:
-    #             print(f"[DEBUG] Sending ACK: {ack.hex()}")
-    #             self.serial.write(ack)
-    #     elif cmd == 0xE0:
-    #         if self.egram_callback:
-    #             i = 0
-    #             while i + 2 < len(payload):
-    #                 ch = payload[i]
-    #                 val = payload[i+1] | (payload[i+2] << 8)
-    #                 self.egram_callback(ch, val)
-    #                 i += 3
-            
-        
-    
\ No newline at end of file
+                self.egram_callback(ch1, val1)
+                self.egram_callback(ch2, val2)
+            if self.egram_batch_callback:
+                self._pending_egram[0].append(val1)
+                self._pending_egram[1].append(val2)
+                ranges = self._pending_ranges
+                if ranges and ranges[-1][0] is None:
+                    ranges[-1][1] += 1
+                else:
+                    ranges.append([None, 1])
+        elif cmd == CMD_EGRAM_PACKED:
+            self._handle_egram_frame(*decode_packed(bytes(payload)))
+        elif cmd == CMD_EGRAM_DELTA:
+            # the whole frame expands in one step; None until the first keyframe
+            decoded = self.delta_decoder.decode(bytes(payload))
+            if decoded is not None:
+                self._handle_egram_frame(*decoded)
+
+    def _confirm_push(self, report=None):
+        """
+        mark the push in flight as acknowledged on an ACK within ack_timeout, or
+        on a read-back block (mode id, fields) that matches it
+        """
+        with self._ack_lock:
+            pushed = self._in_flight
+            if pushed is None:
+                return
+            fields, mode_id_val, seq, sent = pushed
+            if report is None:
+                if time.monotonic() - sent > self.ack_timeout:
+                    self._in_flight = None      # too late to be this push's ACK
+                    return
+            elif report[0] != mode_id_val or diff_parameters(fields, report[1]):
+                return
+            self._in_flight = None
+            self.last_acked = (fields, mode_id_val)
+            self.acked_seq = seq
+
+    def _handle_egram_frame(self, counter, atrial, ventricular):
+        """samples of one packed or delta frame, counter = number of the first"""
+        self.egram_seen.set()
+        if self._egram_counter is not None:
+            gap = counter_gap(self._egram_counter, counter)
+            if gap < 0x8000:            # a larger jump is a restart, not a loss
+                self.egram_stats["lost"] += gap
+        self._egram_counter = (counter + len(atrial)) & 0xFFFF
+        self.egram_stats["samples"] += len(atrial)
+        start = self.clock.unwrap(counter, len(atrial))
+        if self.egram_batch_callback:
+            self._pending_ranges.append([start, len(atrial)])
+            self._pending_egram[0].extend(atrial.tolist())
+            self._pending_egram[1].extend(ventricular.tolist())
+        if self.egram_callback:
+            for val1, val2 in zip(atrial.tolist(), ventricular.tolist()):
+                self.egram_callback('atrial', val1)
+                self.egram_callback('ventricular', val2)
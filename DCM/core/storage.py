@@ -0,0 +1,287 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+#Path to the DCM database, user_management and params are facades over it
+DB_FILE = os.path.join(os.path.dirname(__file__), "..", "storage", "dcm.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    pw_hash  TEXT NOT NULL,
+    created  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS param_journal (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    created  REAL NOT NULL,
+    username TEXT,
+    mode     TEXT,
+    event    TEXT,
+    snapshot INTEGER NOT NULL,
+    fields   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_journal_time ON param_journal(created);
+CREATE INDEX IF NOT EXISTS idx_journal_snapshots ON param_journal(snapshot, created);
+CREATE TABLE IF NOT EXISTS egram_sessions (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    username     TEXT,
+    mode         TEXT,
+    started      REAL NOT NULL,
+    ended        REAL,
+    sample_count INTEGER NOT NULL DEFAULT 0,
+    path         TEXT,
+    notes        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_time ON egram_sessions(username, started);
+CREATE INDEX IF NOT EXISTS idx_sessions_time ON egram_sessions(started);
+"""
+
+
+class StorageEngine:
+    """
+    SQLite storage for users, the parameter journal and egram session metadata.
+    The database runs in WAL mode so several DCM processes can read while one
+    writes; a single connection is shared between threads behind a lock.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def _write(self, sql: str, args=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self.conn.execute(sql, args)
+
+    def _query(self, sql: str, args=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """
+        hold the database write lock for a read-then-write sequence, committed
+        on exit and rolled back on error
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def data_version(self) -> int:
+        """changes whenever another connection commits, a cheap staleness check for caches"""
+        return self._query("PRAGMA data_version")[0][0]
+
+    # meta
+
+    def get_meta(self, key: str) -> Optional[str]:
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self._write("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    # users
+
+    def get_user_hash(self, username: str) -> Optional[str]:
+        rows = self._query("SELECT pw_hash FROM users WHERE username = ?", (username,))
+        return rows[0]["pw_hash"] if rows else None
+
+    def get_users(self) -> Dict[str, str]:
+        """{username: hash} in registration order"""
+        return {r["username"]: r["pw_hash"]
+                for r in self._query("SELECT username, pw_hash FROM users ORDER BY created, username")}
+
+    def list_users(self) -> List[str]:
+        return [r["username"] for r in self._query("SELECT username FROM users ORDER BY created, username")]
+
+    def count_users(self) -> int:
+        return self._query("SELECT COUNT(*) AS n FROM users")[0]["n"]
+
+    def add_user(self, username: str, pw_hash: str, limit: Optional[int] = None) -> bool:
+        """insert a new user, False if it exists or the limit is reached"""
+        # the write lock is taken up front so the limit check can't race
+        with self.transaction():
+            if limit is not None and self.conn.execute(
+                    "SELECT COUNT(*) FROM users").fetchone()[0] >= limit:
+                return False
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO users(username, pw_hash, created) VALUES (?, ?, ?)",
+                (username, pw_hash, time.time()))
+            return cur.rowcount == 1
+
+    def set_user_hash(self, username: str, pw_hash: str) -> None:
+        self._write("UPDATE users SET pw_hash = ? WHERE username = ?", (pw_hash, username))
+
+    def delete_user(self, username: str) -> bool:
+        return self._write("DELETE FROM users WHERE username = ?", (username,)).rowcount == 1
+
+    def replace_users(self, users: Dict[str, str]) -> None:
+        with self.transaction():
+            self.conn.execute("DELETE FROM users")
+            now = time.time()
+            self.conn.executemany(
+                "INSERT INTO users(username, pw_hash, created) VALUES (?, ?, ?)",
+                [(name, pw_hash, now) for name, pw_hash in users.items()])
+
+    # parameter journal
+
+    def append_journal(self, created: float, fields: Dict[str, Any], snapshot: bool,
+                       username: Optional[str] = None, mode: Optional[str] = None,
+                       event: Optional[str] = None) -> int:
+        cur = self._write(
+            "INSERT INTO param_journal(created, username, mode, event, snapshot, fields) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (created, username, mode, event, int(snapshot), json.dumps(fields)))
+        return cur.lastrowid
+
+    def last_journal_id(self) -> int:
+        """id of the newest entry, 0 for an empty journal"""
+        return self._query("SELECT COALESCE(MAX(id), 0) AS id FROM param_journal")[0]["id"]
+
+    def last_journal_snapshot(self, at: Optional[float] = None,
+                              upto: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """newest full snapshot at or before time `at` and entry id `upto` (or overall)"""
+        sql = "SELECT * FROM param_journal WHERE snapshot = 1"
+        args: list = []
+        if at is not None:
+            sql += " AND created <= ?"
+            args.append(at)
+        if upto is not None:
+            sql += " AND id <= ?"
+            args.append(upto)
+        rows = self._query(sql + " ORDER BY created DESC, id DESC LIMIT 1", args)
+        return _journal_entry(rows[0]) if rows else None
+
+    def journal_after(self, entry_id: int, until: Optional[float] = None,
+                      upto: Optional[int] = None) -> List[Dict[str, Any]]:
+        """entries newer than entry_id (up to time `until` and id `upto`), oldest first"""
+        sql = "SELECT * FROM param_journal WHERE id > ?"
+        args: list = [entry_id]
+        if until is not None:
+            sql += " AND created <= ?"
+            args.append(until)
+        if upto is not None:
+            sql += " AND id <= ?"
+            args.append(upto)
+        return [_journal_entry(r) for r in self._query(sql + " ORDER BY id", args)]
+
+    def journal_between(self, t0: float, t1: float) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM param_journal WHERE created > ? AND created <= ? "
+                           "ORDER BY id", (t0, t1))
+        return [_journal_entry(r) for r in rows]
+
+    def journal_entries(self, username: Optional[str] = None, event: Optional[str] = None,
+                        since: Optional[float] = None, until: Optional[float] = None,
+                        newest: bool = False) -> List[Dict[str, Any]]:
+        """entries by one user and/or for one event, oldest first (only the last one if newest)"""
+        sql = "SELECT * FROM param_journal WHERE 1=1"
+        args: list = []
+        if username is not None:
+            sql += " AND username = ?"
+            args.append(username)
+        if event is not None:
+            sql += " AND event = ?"
+            args.append(event)
+        if since is not None:
+            sql += " AND created >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND created <= ?"
+            args.append(until)
+        sql += " ORDER BY id DESC LIMIT 1" if newest else " ORDER BY id"
+        return [_journal_entry(r) for r in self._query(sql, args)]
+
+    # egram sessions
+
+    def start_egram_session(self, username: Optional[str] = None, mode: Optional[str] = None,
+                            path: Optional[str] = None, started: Optional[float] = None,
+                            notes: Optional[str] = None) -> int:
+        cur = self._write(
+            "INSERT INTO egram_sessions(username, mode, started, path, notes) VALUES (?, ?, ?, ?, ?)",
+            (username, mode, time.time() if started is None else started, path, notes))
+        return cur.lastrowid
+
+    def finish_egram_session(self, session_id: int, sample_count: int,
+                             ended: Optional[float] = None) -> None:
+        self._write("UPDATE egram_sessions SET ended = ?, sample_count = ? WHERE id = ?",
+                    (time.time() if ended is None else ended, sample_count, session_id))
+
+    def list_egram_sessions(self, username: Optional[str] = None, since: Optional[float] = None,
+                            until: Optional[float] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT * FROM egram_sessions WHERE 1=1"
+        args: list = []
+        if username is not None:
+            sql += " AND username = ?"
+            args.append(username)
+        if since is not None:
+            sql += " AND started >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND started <= ?"
+            args.append(until)
+        return [dict(r) for r in self._query(sql + " ORDER BY started, id", args)]
+
+
+def _journal_entry(row: sqlite3.Row) -> Dict[str, Any]:
+    out = dict(row)
+    out["fields"] = json.loads(out["fields"])
+    out["snapshot"] = bool(out["snapshot"])
+    return out
+
+
+_engines: Dict[str, StorageEngine] = {}
+_engines_lock = threading.Lock()
+
+def get_engine(path: Optional[str] = None) -> StorageEngine:
+    """
+    shared engine for a database file (DB_FILE by default), opened on first use
+    """
+    path = os.path.abspath(path or DB_FILE)
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            engine = _engines[path] = StorageEngine(path)
+        return engine
+
+def close_engines() -> None:
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.close()
+        _engines.clear()
+
+def migrate_json(engine: StorageEngine, users: Dict[str, str],
+                 params: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    import the legacy users.json / params.json contents. Existing users are
+    kept, params become the first journal snapshot only if the journal is empty
+    """
+    added = 0
+    for username, pw_hash in users.items():
+        if engine.add_user(username, pw_hash):
+            added += 1
+    imported = 0
+    if params and engine.last_journal_id() == 0:
+        engine.append_journal(time.time(), params, True, event="saved")
+        imported = 1
+    return {"users": added, "params": imported}
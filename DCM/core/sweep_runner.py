@@ -0,0 +1,295 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .analysis import detect_beats, summarize
+
+STATUS_OK = "ok"
+STATUS_NO_ACK = "no_ack"
+STATUS_INTERRUPTED = "interrupted"      # capture cut short by stop(), retried on resume
+
+
+def completed_indices(path: str) -> Set[int]:
+    """grid indices already recorded as ok in a results file"""
+    done: Set[int] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue        # line cut short by an interrupted run
+            if record.get("status") == STATUS_OK:
+                done.add(record["index"])
+    return done
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    out = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                continue
+    return out
+
+
+class SweepRunner:
+    """
+    Programs a sequence of parameter sets over a SerialInterface and records
+    the device's response, one JSON line per grid row in `results_path`.
+
+    For each row: push the parameters, wait for the ACK of that push
+    (retrying up to `retries` times), then capture `window` seconds of egram.
+    The device runs one parameter set at a time, so a push can't overlap a
+    capture; everything else does. A producer thread draws the next rows
+    from `rows` during the capture, and metrics and the disk write run on a
+    writer thread, so the next push goes out as soon as a capture ends. Rows
+    already recorded as ok are skipped, so an interrupted
+    run picks up where it stopped; a row whose capture was cut short by stop()
+    is recorded as interrupted and programmed again.
+
+        runner = SweepRunner(iface, "sweep.jsonl", mode_id("DDDR"))
+        runner.run(param_sweep.sweep(base, axes, mode="DDDR"))
+    """
+    def __init__(self, iface, results_path: str, mode_id_val: int = 0, window: float = 2.0,
+                 ack_timeout: float = 1.0, retries: int = 2, settle: float = 0.0,
+                 request_egram: bool = True):
+        self.iface = iface
+        self.results_path = results_path
+        self.mode_id_val = mode_id_val
+        self.window = window
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.settle = settle
+        self.request_egram = request_egram
+        self._ack = threading.Condition()
+        self._capture_lock = threading.Lock()
+        self._capture: Optional[Tuple[list, list, list]] = None
+        self._results: "queue.Queue" = queue.Queue(maxsize=64)
+        self._stop = threading.Event()
+        self._writer_error: Optional[BaseException] = None
+        self.stats = {"ok": 0, "no_ack": 0, "interrupted": 0, "skipped": 0}
+
+    def stop(self) -> None:
+        """end the current capture early, record its row as interrupted and return from run()"""
+        self._stop.set()
+
+    # callbacks, chained in front of whatever the interface already had
+
+    def _install(self):
+        previous = (self.iface.ack_callback, self.iface.egram_batch_callback)
+        prev_ack, prev_batch = previous
+
+        def on_ack():
+            with self._ack:
+                self._ack.notify_all()
+            if prev_ack:
+                prev_ack()
+
+        def on_batch(timestamps, atrial, ventricular):
+            with self._capture_lock:
+                if self._capture is not None:
+                    self._capture[0].extend(timestamps)
+                    self._capture[1].extend(atrial)
+                    self._capture[2].extend(ventricular)
+            if prev_batch:
+                prev_batch(timestamps, atrial, ventricular)
+
+        self.iface.ack_callback = on_ack
+        self.iface.egram_batch_callback = on_batch
+        return previous
+
+    def _push(self, params: Dict[str, Any]) -> bool:
+        """
+        send and wait for the ACK the interface matched to this very push
+        (iface.acked_seq); an ACK left over from an earlier push doesn't count
+        """
+        iface = self.iface
+        for _ in range(self.retries + 1):
+            with self._ack:
+                seq = iface.send_parameters(params, self.mode_id_val)
+                self._ack.wait_for(lambda: iface.acked_seq >= seq, self.ack_timeout)
+                if iface.acked_seq == seq:
+                    return True
+        return False
+
+    def _prefetch(self, rows: Iterable[Tuple[int, Dict[str, Any]]], out: "queue.Queue",
+                  done: threading.Event) -> None:
+        """producer thread: draw rows ahead of the push/capture loop"""
+        try:
+            for row in rows:
+                item = (row, None)
+                while not done.is_set():
+                    try:
+                        out.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if done.is_set():
+                    return
+            out.put(None)
+        except Exception as e:
+            out.put((None, e))
+
+    def _capture_window(self) -> Tuple[Tuple[list, list, list], bool]:
+        """egram received during the window, and whether stop() cut it short"""
+        with self._capture_lock:
+            self._capture = ([], [], [])
+        interrupted = self._stop.wait(self.window)
+        with self._capture_lock:
+            captured, self._capture = self._capture, None
+        return captured, interrupted
+
+    def _writer(self) -> None:
+        try:
+            with open(self.results_path, "a+") as f:
+                # an interrupted run can leave half a line, start on a fresh one
+                if f.tell() > 0:
+                    f.seek(f.tell() - 1)
+                    if f.read(1) != "\n":
+                        f.write("\n")
+                while True:
+                    item = self._results.get()
+                    if item is None:
+                        return
+                    f.write(json.dumps(_record(*item)) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception as e:
+            # run() re-raises it; keep draining so its put() never blocks on a full queue
+            self._writer_error = e
+            while self._results.get() is not None:
+                pass
+
+    def run(self, rows: Iterable[Tuple[int, Dict[str, Any]]], limit: Optional[int] = None) -> Dict[str, int]:
+        """program every (index, params) row not already done, returns counts"""
+        done = completed_indices(self.results_path)
+        previous = self._install()
+        writer = threading.Thread(target=self._writer, daemon=True)
+        writer.start()
+        self._stop.clear()
+        self._writer_error = None
+        pending: "queue.Queue" = queue.Queue(maxsize=256)
+        finished = threading.Event()
+        threading.Thread(target=self._prefetch, args=(rows, pending, finished), daemon=True).start()
+        try:
+            if self.request_egram:
+                self.iface.request_egram()
+            programmed = 0
+            while self._writer_error is None:
+                item = pending.get()
+                if item is None:
+                    break
+                row, error = item
+                if error is not None:
+                    raise error
+                index, params = row
+                if self._stop.is_set() or (limit is not None and programmed >= limit):
+                    break
+                if index in done:
+                    self.stats["skipped"] += 1
+                    continue
+                started = time.time()
+                if not self._push(params):
+                    self.stats["no_ack"] += 1
+                    self._results.put((index, params, STATUS_NO_ACK, started, None))
+                    continue
+                if self.settle:
+                    time.sleep(self.settle)
+                captured, interrupted = self._capture_window()
+                if interrupted:
+                    # a partial window isn't comparable with the others
+                    self.stats["interrupted"] += 1
+                    self._results.put((index, params, STATUS_INTERRUPTED, started, captured))
+                    break
+                self.stats["ok"] += 1
+                programmed += 1
+                self._results.put((index, params, STATUS_OK, started, captured))
+        finally:
+            finished.set()
+            self._results.put(None)
+            writer.join()
+            self.iface.ack_callback, self.iface.egram_batch_callback = previous
+        if self._writer_error is not None:
+            raise self._writer_error
+        return dict(self.stats)
+
+
+def _record(index: int, params: Dict[str, Any], status: str, started: float,
+            captured: Optional[Tuple[list, list, list]]) -> Dict[str, Any]:
+    record = {"index": index, "status": status, "time": started, "params": params}
+    if captured is not None:
+        ts = np.asarray(captured[0], dtype=np.float64)
+        window = {"atrial": np.asarray(captured[1], dtype=np.float64), "atrial_t": ts,
+                  "ventricular": np.asarray(captured[2], dtype=np.float64), "ventricular_t": ts}
+        record["samples"] = int(len(ts))
+        record["summary"] = summarize(window)
+        record["beats"] = detect_beats(window)
+    return record
+
+
+def _parse_axis(text: str) -> Tuple[str, list]:
+    """LRL=40:120:10 (stop inclusive) or AV_delay=100,150,200"""
+    name, _, spec = text.partition("=")
+    if ":" in spec:
+        lo, hi, step = (float(x) for x in spec.split(":"))
+        values = np.arange(lo, hi + step / 2, step).round(6).tolist()
+    else:
+        values = [float(x) for x in spec.split(",")]
+    return name, values
+
+
+def main(argv=None) -> None:
+    import argparse
+    from .modes import mode_id
+    from .param_sweep import grid_size, sweep
+    from .params import load_parameters
+    from .serial_interface import SerialInterface
+
+    parser = argparse.ArgumentParser(description="program a parameter sweep and record the egram response")
+    parser.add_argument("port", nargs="?", help="serial port of the board (omit with --pty)")
+    parser.add_argument("--pty", action="store_true", help="run against the pseudo-terminal stand-in")
+    parser.add_argument("--mode", default="DDDR")
+    parser.add_argument("--axis", action="append", required=True, help="NAME=lo:hi:step or NAME=a,b,c")
+    parser.add_argument("--base", help="JSON file of base parameters (default: last saved profile)")
+    parser.add_argument("--out", default="sweep_results.jsonl")
+    parser.add_argument("--window", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    if args.base:
+        with open(args.base) as f:
+            base = json.load(f)
+    else:
+        base = load_parameters().to_dict()
+    axes = dict(_parse_axis(a) for a in args.axis)
+
+    device = None
+    port = args.port
+    if args.pty:
+        from .pty_device import PtyDevice
+        device = PtyDevice()
+        port = device.port
+    iface = SerialInterface(port)
+    iface.connect()
+    try:
+        runner = SweepRunner(iface, args.out, mode_id(args.mode), window=args.window)
+        print(f"{grid_size(axes)} combinations, results in {args.out}")
+        print(runner.run(sweep(base, axes, mode=args.mode)))
+    except KeyboardInterrupt:
+        print("interrupted, rerun the same command to resume")
+    finally:
+        iface.disconnect()
+        if device is not None:
+            device.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# lower goes first
+PRIORITY_URGENT = 0     # pushbutton inhibit and anything safety related
+PRIORITY_CONTROL = 1    # parameter pushes, egram / parameter requests
+PRIORITY_BULK = 2       # sweeps and other background traffic
+PRIORITY_NAMES = {PRIORITY_URGENT: "urgent", PRIORITY_CONTROL: "control", PRIORITY_BULK: "bulk"}
+
+log = logging.getLogger(__name__)
+
+# latencies kept per priority class for the percentiles
+LATENCY_WINDOW = 1000
+
+
+class _Entry:
+    __slots__ = ("data", "priority", "key", "enqueued", "cancelled")
+
+    def __init__(self, data: bytes, priority: int, key: Optional[str], enqueued: float):
+        self.data = data
+        self.priority = priority
+        self.key = key
+        self.enqueued = enqueued
+        self.cancelled = False
+
+
+class TxQueue:
+    """
+    Prioritized transmit queue drained by one writer thread, so a stalled
+    adapter blocks that thread instead of the caller (the Tk thread).
+
+    put() with a `key` supersedes a still-queued entry with the same key: only
+    the latest parameter push goes out, at the more urgent of the two
+    priorities. latency() reports enqueue-to-wire times per priority class.
+
+        tx = TxQueue(port.write)
+        tx.start()
+        tx.put(packet, PRIORITY_CONTROL, key="params")
+    """
+    def __init__(self, write: Callable[[bytes], object], clock: Callable[[], float] = time.perf_counter):
+        self.write = write
+        self.clock = clock
+        self._heap: list = []
+        self._keys: Dict[str, _Entry] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._latencies = {p: deque(maxlen=LATENCY_WINDOW) for p in PRIORITY_NAMES}
+        self.stats = {"sent": 0, "coalesced": 0, "errors": 0}
+        self.last_error: Optional[Exception] = None
+        # called from the writer thread with the exception when a write fails
+        self.error_callback: Optional[Callable[[Exception], None]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def stop(self, drain: bool = True, timeout: float = 1.0) -> None:
+        """stop the writer; with drain, whatever is queued is written first"""
+        with self._cond:
+            if not drain:
+                self._heap.clear()
+                self._keys.clear()
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def put(self, data: bytes, priority: int = PRIORITY_CONTROL, key: Optional[str] = None) -> None:
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"unknown priority {priority}")
+        with self._cond:
+            if key is not None:
+                old = self._keys.get(key)
+                if old is not None:
+                    old.cancelled = True
+                    priority = min(priority, old.priority)
+                    self.stats["coalesced"] += 1
+            entry = _Entry(bytes(data), priority, key, self.clock())
+            if key is not None:
+                self._keys[key] = entry
+            heapq.heappush(self._heap, (priority, next(self._seq), entry))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(1 for _, _, e in self._heap if not e.cancelled)
+
+    def _next(self) -> Optional[_Entry]:
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    entry = heapq.heappop(self._heap)[2]
+                    if entry.key is not None and self._keys.get(entry.key) is entry:
+                        del self._keys[entry.key]
+                    return entry
+                if not self._running:
+                    return None
+                self._cond.wait()
+
+    def _writer(self) -> None:
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+            try:
+                self.write(entry.data)
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.last_error = e
+                log.error("serial write error: %s", e)
+                if self.error_callback:
+                    self.error_callback(e)
+                continue
+            self._latencies[entry.priority].append(self.clock() - entry.enqueued)
+            self.stats["sent"] += 1
+
+    def latency(self) -> Dict[str, Dict[str, float]]:
+        """{class: {count, mean_ms, p50_ms, p95_ms, max_ms}} over the recent writes"""
+        out = {}
+        for priority, name in PRIORITY_NAMES.items():
+            samples = sorted(self._latencies[priority])
+            if not samples:
+                continue
+            n = len(samples)
+            out[name] = {
+                "count": n,
+                "mean_ms": 1000 * sum(samples) / n,
+                "p50_ms": 1000 * samples[n // 2],
+                "p95_ms": 1000 * samples[min(n - 1, int(n * 0.95))],
+                "max_ms": 1000 * samples[-1],
+            }
+        return out
@@ -1,40 +1,138 @@
 import json
 import hashlib
+import hmac
 import os
-from typing import Optional, Dict, List
+import secrets
+import threading
+import time
+import weakref
+from typing import Callable, Optional, Dict, List, Tuple
 
-#Path to the file used to store users, constant
+from . import storage
+
+#Legacy JSON user file, imported into the database (storage.DB_FILE) the first time it is opened
 USER_FILE = os.path.join(os.path.dirname(__file__), "..", "storage", "users.json")
 
 #max number of users allow in the local system
 MAX_USERS = 10
 
+#cost used for new hashes, every stored hash keeps its own parameters so these can be raised later
+SCRYPT_PARAMS = {"n": 2**14, "r": 8, "p": 1}
+PBKDF2_ITERATIONS = 200_000   # fallback when hashlib was built without scrypt
+SALT_BYTES = 16
+
+#seconds a verified session stays valid without being used
+SESSION_TTL = 15 * 60
+
+#hash checked for unknown usernames so they cost the same KDF as known ones, made on first use
+_dummy_hash: Optional[str] = None
+
+_sessions: Dict[str, Tuple[str, float]] = {}
+_sessions_lock = threading.Lock()
+
 #note on notation, functions starting with "_" are internal and not a part of the external library API
 
+def _read_legacy_users(path: str) -> Dict[str, str]:
+    """users from the old users.json, read once for the migration"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        content = f.read().strip()
+    return json.loads(content) if content else {}
+
+class _UserCache:
+    """
+    in-memory copy of the users table of one database. Reads are served from
+    it and revalidated with PRAGMA data_version, which changes when another
+    DCM process commits; writes through this process invalidate it directly
+    """
+    def __init__(self, engine: storage.StorageEngine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._users: Optional[Dict[str, str]] = None
+        self._version = None
+
+    def users(self) -> Dict[str, str]:
+        version = self.engine.data_version()
+        with self._lock:
+            if self._users is None or version != self._version:
+                self._users = self.engine.get_users()
+                self._version = version
+            return self._users
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._users = None
+
+_caches: "weakref.WeakKeyDictionary[storage.StorageEngine, _UserCache]" = weakref.WeakKeyDictionary()
+
+def _cache() -> _UserCache:
+    """
+    user cache for the current database. the first time a database is used the
+    legacy USER_FILE is imported into it
+    """
+    engine = storage.get_engine()
+    cache = _caches.get(engine)
+    if cache is None:
+        if engine.get_meta("users_migrated") is None:
+            legacy = _read_legacy_users(os.path.abspath(USER_FILE))
+            storage.migrate_json(engine, legacy, None)
+            engine.set_meta("users_migrated", "1")
+        cache = _caches[engine] = _UserCache(engine)
+    return cache
+
 def _loadUsers() -> Dict[str, str]:
     """
-    Load user from JSON file. Returns dict{username: password_hash}
+    Load users from the database. Returns dict{username: password_hash}
     """
-    if not os.path.exists(USER_FILE):
-        return {}
-    with open(USER_FILE, "r") as f:
-        content = f.read().strip()
-        if not content:
-            return {}
-        return json.loads(content)
+    return dict(_cache().users())
 
 def _saveUsers(users: Dict[str, str]) -> None:
     """
-    Save the user data into JSON File.
+    Replace every stored user with the given dict{username: password_hash}
     """
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+    cache = _cache()
+    cache.engine.replace_users(users)
+    cache.invalidate()
 
 def _hashPassword(password: str) -> str:
     """
-    basic encrypting of passwords using SHA256. returns the hashed version. 
+    salted, memory-hard hash of the password. returns
+    "scrypt$n$r$p$salt$hash" (or "pbkdf2_sha256$iterations$salt$hash")
     """
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    salt = os.urandom(SALT_BYTES)
+    if hasattr(hashlib, "scrypt"):
+        n, r, p = SCRYPT_PARAMS["n"], SCRYPT_PARAMS["r"], SCRYPT_PARAMS["p"]
+        digest = _scrypt(password, salt, n, r, p)
+        return f"scrypt${n}${r}${p}${salt.hex()}${digest.hex()}"
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+def _verifyPassword(password: str, stored: str) -> Tuple[bool, bool]:
+    """
+    check a password against a stored hash. returns (matches, needs_rehash),
+    needs_rehash is set for legacy unsalted SHA256 hashes and outdated costs
+    """
+    parts = stored.split("$")
+    if parts[0] == "scrypt" and len(parts) == 6:
+        n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        digest = _scrypt(password, bytes.fromhex(parts[4]), n, r, p)
+        ok = hmac.compare_digest(digest.hex(), parts[5])
+        outdated = (n, r, p) != (SCRYPT_PARAMS["n"], SCRYPT_PARAMS["r"], SCRYPT_PARAMS["p"])
+        return ok, outdated
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        iterations = int(parts[1])
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"),
+                                     bytes.fromhex(parts[2]), iterations)
+        ok = hmac.compare_digest(digest.hex(), parts[3])
+        return ok, hasattr(hashlib, "scrypt") or iterations < PBKDF2_ITERATIONS
+    #legacy: bare SHA256 hex digest
+    legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    return hmac.compare_digest(legacy, stored), True
 
 def register_user(username : str, password : str) -> bool:
     """
@@ -42,53 +140,135 @@ def register_user(username : str, password : str) -> bool:
     - username is taken
     - user_limit exceeeded
     """
-    users = _loadUsers()
+    cache = _cache()
+    users = cache.users()
     
     if username in users:
         return False
     if len(users) >= MAX_USERS:
         return False
 
-    users[username] = _hashPassword(password)
-    _saveUsers(users)
-    return True
+    #checked again inside the insert transaction in case another DCM registered meanwhile
+    added = cache.engine.add_user(username, _hashPassword(password), limit=MAX_USERS)
+    cache.invalidate()
+    return added
 
 def authenticate_user(username: str, password: str) -> bool:
     """
     Check if username exists and password is correct
     """
-    users = _loadUsers()
+    global _dummy_hash
+    cache = _cache()
+    stored = cache.users().get(username)
     
-    if username not in users:
+    if stored is None:
+        #run the same KDF anyway, an early return would tell which usernames exist
+        if _dummy_hash is None:
+            _dummy_hash = _hashPassword(secrets.token_hex(SALT_BYTES))
+        _verifyPassword(password, _dummy_hash)
         return False
-    return users[username] == _hashPassword(password)
+    ok, needs_rehash = _verifyPassword(password, stored)
+    if ok and needs_rehash:
+        #transparent migration of legacy / weaker hashes on successful login
+        cache.engine.set_user_hash(username, _hashPassword(password))
+        cache.invalidate()
+    return ok
+
+def authenticate_user_async(username: str, password: str,
+                            callback: Callable[[bool, Optional[Exception]], None]) -> None:
+    """
+    run authenticate_user on a worker thread so the slow hash doesn't block the
+    UI. callback(ok, error) is called from that thread; error is the exception
+    when the check itself failed (e.g. a locked database), so it isn't mistaken
+    for a wrong password. GUI code should marshal it back with root.after
+    """
+    _run_async(authenticate_user, username, password, callback)
+
+def register_user_async(username: str, password: str,
+                        callback: Callable[[bool, Optional[Exception]], None]) -> None:
+    """
+    run register_user on a worker thread, hashing the new password costs the
+    same KDF as a login. callback(ok, error) as for authenticate_user_async
+    """
+    _run_async(register_user, username, password, callback)
+
+def _run_async(func: Callable[[str, str], bool], username: str, password: str,
+               callback: Callable[[bool, Optional[Exception]], None]) -> None:
+    def _worker():
+        try:
+            ok = func(username, password)
+        except Exception as e:
+            callback(False, e)
+            return
+        callback(ok, None)
+    threading.Thread(target=_worker, daemon=True).start()
+
+def start_session(username: str) -> str:
+    """
+    remember a verified login and return its token, so privileged actions
+    can be checked with check_session instead of hashing the password again
+    """
+    token = secrets.token_urlsafe(32)
+    with _sessions_lock:
+        _sessions[token] = (username, time.monotonic() + SESSION_TTL)
+    return token
+
+def check_session(token: Optional[str]) -> Optional[str]:
+    """
+    returns the username for a live session token (and extends it), None if
+    the token is unknown or expired
+    """
+    if not token:
+        return None
+    now = time.monotonic()
+    with _sessions_lock:
+        entry = _sessions.get(token)
+        if entry is None:
+            return None
+        username, expires = entry
+        if expires < now:
+            del _sessions[token]
+            return None
+        _sessions[token] = (username, now + SESSION_TTL)
+        return username
+
+def end_session(token: Optional[str]) -> None:
+    """
+    forget a session token (logout)
+    """
+    with _sessions_lock:
+        _sessions.pop(token, None)
 
 def list_users() -> List[str]:
     """
     give a list of the all the users currently stored
     """
     
-    return list(_loadUsers().keys())
+    return list(_cache().users())
 
 def remove_user(username: str) -> bool:
     """
     returns true if removed false if not found
     """
     
-    users = _loadUsers()
-    
-    if username not in users:
+    cache = _cache()
+    removed = cache.engine.delete_user(username)
+    cache.invalidate()
+    if not removed:
         return False
-    del users[username]
-    _saveUsers(users)
+    with _sessions_lock:
+        for token in [t for t, (name, _) in _sessions.items() if name == username]:
+            del _sessions[token]
     return True
 
 def reset_users()->None:
     """
-    clears out all the users from the json file
+    clears out all the users
     """
     
     _saveUsers({})
+    with _sessions_lock:
+        _sessions.clear()
     
     
     
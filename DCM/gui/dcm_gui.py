@@ -6,29 +6,42 @@ user authentication, mode selection, parameter management, status monitoring,
 and egram display for Deliverable 2.
 """
 
+import time
+
+# start of the cold-start measurement (DCM_TIMINGS=1 prints it)
+_STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import sys
 import os
-import json
 import threading
-import time
+import importlib.util
 from collections import deque
+from dataclasses import replace
+from itertools import islice
 from typing import Optional
 
 # Add parent directory to path to import core modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from core.user_management import authenticate_user, register_user, MAX_USERS, list_users
-from core.params import Parameters, load_parameters
+from core.user_management import (authenticate_user_async, register_user_async, MAX_USERS, list_users,
+                                  start_session, check_session, end_session)
+from core.params import Parameters, load_parameters, save_parameters, record_programmed
+from core.param_schema import FIELDS_BY_NAME, form_fields, validator_for
 from core.modes import PaceMakerMode, parse_mode, mode_id
-try:
-    from core.serial_interface import SerialInterface
-    SERIAL_AVAILABLE = True
-except ImportError:
-    SERIAL_AVAILABLE = False
+
+# numpy, multiprocessing and pyserial are loaded on first use (analysis, export,
+# Connect) so the login screen comes up without them
+SERIAL_AVAILABLE = importlib.util.find_spec("serial") is not None
+if not SERIAL_AVAILABLE:
     print("Warning: Serial interface not available")
 
+SHOW_TIMINGS = bool(os.environ.get("DCM_TIMINGS"))
+
+# triggered egram captures are written here
+CAPTURE_DIR = os.path.join(os.path.dirname(__file__), '..', 'storage', 'captures')
+
 
 class DCMApplication:
     """Main application controller for DCM GUI"""
@@ -41,23 +54,74 @@ class DCMApplication:
         self.root.configure(bg="#ffd9ec")
         
         self.current_user = None
+        self.session_token = None
         self.current_mode = None
         self.parameters = self._get_default_parameters()
         self.ventricular_inhibit_active = False
         
         # Serial communication
         self.serial_interface = None
+        self.link_supervisor = None
         self.serial_port = None
         self.is_connected = False
+        # push number -> (username, mode) of parameter pushes waiting for their ACK
+        self.unacked_pushes = {}
         
         # Egram data
         self.egram_data = {'atrial': deque(maxlen=1000), 'ventricular': deque(maxlen=1000)}
+        # both deques and the count of samples ever appended move together
+        # under this lock, so a renderer can take just the new tail
+        self.egram_lock = threading.Lock()
+        self.egram_written = 0
         self.egram_window = None
         self.egram_streaming = False
+        # the one pending 50 ms refresh of the egram window, and the sample
+        # count it last drew up to
+        self._egram_refresh = None
+        self._egram_refresh_n = None
+        # raster renderer state: pixel buffer, its PhotoImage, samples drawn
+        self.egram_raster = None
+        self.egram_photo = None
+        self._egram_raster_n = None
+        # armed trigger engine, fed from the serial thread with every batch
+        self.egram_trigger = None
+        # where serial batches go: through a FilterBank into the deques, or
+        # straight in when filtering is off; see _reset_egram_filter
+        self.egram_filter_enabled = True
+        self._egram_sink = self._store_egram_batch
+        # raw samples published in shared memory while connected, so analysis
+        # scripts can follow the stream (core.egram_shm.attach_published)
+        self.egram_ring = None
+        
+        # background processes for heavy egram analysis, started on first Analyze
+        self._analysis_executor = None
+        # summary and beat results of the latest Analyze click, keyed by job
+        self.egram_analysis = {}
+        
+        # one parameter form per mode, built the first time the mode is selected
+        self.param_forms = {}
+        self.visible_form = None
+        
+        # cold start and mode switch latency (s)
+        self.timings = {}
         
         self._configure_styles()
         self.show_login_screen()
     
+    @property
+    def analysis_executor(self):
+        """process pool for egram analysis, results come back via root.after"""
+        if self._analysis_executor is None:
+            from core.analysis import AnalysisExecutor
+            self._analysis_executor = AnalysisExecutor(
+                max_workers=2, dispatch=lambda fn: self.root.after(0, fn))
+        return self._analysis_executor
+    
+    def _record_timing(self, name, seconds):
+        self.timings[name] = seconds
+        if SHOW_TIMINGS:
+            print(f"[TIMING] {name}: {seconds * 1000:.1f} ms")
+    
     def _configure_styles(self):
         """configure shared ttk styles"""
         style = ttk.Style()
@@ -142,6 +206,10 @@ class DCMApplication:
         
         username_entry.focus()
         password_entry.bind('<Return>', lambda e: self._handle_login(username_entry.get(), password_entry.get()))
+        
+        if 'cold_start' not in self.timings:
+            self.root.update_idletasks()
+            self._record_timing('cold_start', time.perf_counter() - _STARTED)
     
     def show_registration_screen(self):
         """Display registration screen"""
@@ -202,11 +270,45 @@ class DCMApplication:
             self.login_status.config(text="Please enter both username and password")
             return
         
-        if authenticate_user(username, password):
+        # hashing is deliberately slow, verify off the Tk thread
+        self.login_status.config(text="Verifying...", foreground='#7f8c8d')
+        authenticate_user_async(username, password,
+                                lambda ok, error: self.root.after(0, self._on_login_result, username, ok, error))
+    
+    def _on_login_result(self, username, ok, error=None):
+        """Finish a login once the background verification completes"""
+        if error is not None:
+            if self.login_status.winfo_exists():
+                self.login_status.config(text=f"Login unavailable: {error}", foreground='red')
+        elif ok:
             self.current_user = username
+            self.session_token = start_session(username)
             self.show_dashboard()
-        else:
-            self.login_status.config(text="Invalid username or password")
+        elif self.login_status.winfo_exists():
+            self.login_status.config(text="Invalid username or password", foreground='red')
+    
+    def _with_session(self, action):
+        """Run a privileged action, asking for the password again only if the session expired"""
+        if check_session(self.session_token) == self.current_user:
+            action()
+            return
+        password = simpledialog.askstring("Session Expired",
+                                          f"Re-enter the password for {self.current_user}:",
+                                          show="*", parent=self.root)
+        if not password:
+            return
+        
+        def on_result(ok, error):
+            if error is not None:
+                messagebox.showerror("Authentication Error", f"Could not verify the password:\n{error}")
+            elif ok:
+                self.session_token = start_session(self.current_user)
+                action()
+            else:
+                messagebox.showerror("Authentication Failed", "Incorrect password.")
+        
+        authenticate_user_async(self.current_user, password,
+                                lambda ok, error: self.root.after(0, on_result, ok, error))
     
     def _handle_registration(self, username, password, confirm_password):
         """Handle user registration"""
@@ -223,7 +325,20 @@ class DCMApplication:
             self.reg_status.config(text="Passwords do not match")
             return
         
-        if register_user(username, password):
+        # the new password is hashed with the same slow KDF as a login, off the Tk thread
+        self.reg_status.config(text="Registering...", foreground='#7f8c8d')
+        register_user_async(username, password,
+                            lambda ok, error: self.root.after(0, self._on_registration_result,
+                                                              username, ok, error))
+    
+    def _on_registration_result(self, username, ok, error=None):
+        """Finish a registration once the background hash and insert complete"""
+        if not self.reg_status.winfo_exists():
+            return
+        self.reg_status.config(foreground='red')
+        if error is not None:
+            self.reg_status.config(text=f"Registration unavailable: {error}")
+        elif ok:
             messagebox.showinfo("Success", f"User '{username}' registered successfully!")
             self.show_login_screen()
         else:
@@ -344,19 +459,21 @@ class DCMApplication:
         self.param_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 15))
         
         self.param_widgets = {}
+        self.param_forms = {}
+        self.visible_form = None
         self._display_parameter_message()
         
         action_frame = ttk.Frame(main_frame)
         action_frame.pack(fill=tk.X)
         
         ttk.Button(action_frame, text="Save Parameters", style='Action.TButton',
-                  command=self._save_parameters).pack(side=tk.LEFT, padx=5)
+                  command=lambda: self._with_session(self._save_parameters)).pack(side=tk.LEFT, padx=5)
         
         ttk.Button(action_frame, text="Load Parameters",
                   command=self._load_parameters).pack(side=tk.LEFT, padx=5)
         
         ttk.Button(action_frame, text="Transmit to Device", style='Action.TButton',
-                  command=self._transmit_parameters).pack(side=tk.LEFT, padx=5)
+                  command=lambda: self._with_session(self._transmit_parameters)).pack(side=tk.LEFT, padx=5)
         
         ttk.Button(action_frame, text="Request Parameters",
                   command=self._request_parameters).pack(side=tk.LEFT, padx=5)
@@ -383,6 +500,7 @@ class DCMApplication:
     
     def _select_mode(self, mode):
         """Handle mode selection"""
+        started = time.perf_counter()
         self.current_mode = mode
         
         for m, btn in self.mode_buttons.items():
@@ -396,16 +514,42 @@ class DCMApplication:
                                       foreground='#27ae60')
         
         self._display_parameters_for_mode(mode)
+        self.root.update_idletasks()
+        self._record_timing('mode_switch', time.perf_counter() - started)
     
     def _display_parameters_for_mode(self, mode):
-        """Display parameter inputs for selected mode"""
-        for widget in self.param_frame.winfo_children():
-            widget.destroy()
-        
-        self.param_widgets = {}
+        """Show the parameter form for a mode, building it the first time"""
+        if self.visible_form is None:
+            # first form replaces the placeholder message
+            for widget in self.param_frame.winfo_children():
+                widget.destroy()
+        
+        form = self.param_forms.get(mode)
+        if form is None:
+            form = self.param_forms[mode] = self._build_parameter_form(mode)
+        if self.visible_form is not form:
+            if self.visible_form is not None:
+                self.visible_form['frame'].pack_forget()
+            form['frame'].pack(fill=tk.BOTH, expand=True)
+            self.visible_form = form
+        
+        self.param_widgets = form['widgets']
+        self._refresh_parameter_form()
+    
+    def _refresh_parameter_form(self):
+        """Copy the current parameters into the visible form"""
+        for name, widget_info in self.param_widgets.items():
+            value = str(getattr(self.parameters, name))
+            if widget_info['var'].get() != value:
+                widget_info['var'].set(value)
+    
+    def _build_parameter_form(self, mode):
+        """Create the entry rows for a mode inside their own frame"""
+        container = ttk.Frame(self.param_frame)
+        widgets = {}
         
-        canvas = tk.Canvas(self.param_frame, highlightthickness=0)
-        scrollbar = ttk.Scrollbar(self.param_frame, orient="vertical", command=canvas.yview)
+        canvas = tk.Canvas(container, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(container, orient="vertical", command=canvas.yview)
         scrollable_frame = ttk.Frame(canvas)
         
         scrollable_frame.bind("<Configure>",
@@ -433,177 +577,41 @@ class DCMApplication:
                      font=('Helvetica', 10), foreground='#7f8c8d').grid(
                          row=0, column=2, sticky=tk.W, padx=5)
             
-            ttk.Label(param_row, text=f"Range: {param_info['range']}", 
-                     font=('Helvetica', 9), foreground='#95a5a6').grid(
-                         row=0, column=3, sticky=tk.W, padx=10)
+            range_label = ttk.Label(param_row, text=f"Range: {param_info['range']}", 
+                     font=('Helvetica', 9), foreground='#95a5a6')
+            range_label.grid(row=0, column=3, sticky=tk.W, padx=10)
             
-            self.param_widgets[param_info['name']] = {
+            widgets[param_info['name']] = {
                 'var': entry_var,
                 'entry': entry,
-                'type': param_info['type']
+                'type': param_info['type'],
+                'range_label': range_label
             }
+            entry_var.trace_add("write", lambda *_, name=param_info['name']: self._check_param_entry(name))
         
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
+        return {'frame': container, 'widgets': widgets}
     
     def _get_mode_parameters(self, mode):
-        """Return parameters for the given mode based on Deliverable 2 requirements"""
-        mode_info = parse_mode(mode)
-        is_rate_adaptive = mode_info.rate
-        
-        # Common parameters for all modes
-        common = [
-            {'name': 'LRL', 'label': 'Lower Rate Limit', 'unit': 'ppm', 
-             'range': '30-175', 'type': 'int'},
-        ]
-        
-        # URL for modes with sensing
-        url_param = [
-            {'name': 'URL', 'label': 'Upper Rate Limit', 'unit': 'ppm', 
-             'range': '50-175', 'type': 'int'},
-        ]
-        
-        # Rate adaptive parameters
-        rate_params = [
-            {'name': 'MSR', 'label': 'Maximum Sensor Rate', 'unit': 'ppm', 
-             'range': '50-175', 'type': 'int'},
-            {'name': 'activity_threshold', 'label': 'Activity Threshold', 'unit': 'level', 
-             'range': '1-7 (V-Low to V-High)', 'type': 'int'},
-            {'name': 'reaction_time', 'label': 'Reaction Time', 'unit': 'sec', 
-             'range': '10-50', 'type': 'int'},
-            {'name': 'recovery_time', 'label': 'Recovery Time', 'unit': 'min', 
-             'range': '2-16', 'type': 'int'},
-            {'name': 'response_factor', 'label': 'Response Factor', 'unit': 'level', 
-             'range': '1-16', 'type': 'int'},
-        ]
-        
-        # Atrial parameters (Deliverable 2: pulse width 1-30 ms, amplitude 0.1-5.0V)
-        atrial = [
-            {'name': 'atrial_amp', 'label': 'Atrial Amplitude', 'unit': 'V', 
-             'range': '0.1-5.0', 'type': 'float'},
-            {'name': 'atrial_width', 'label': 'Atrial Pulse Width', 'unit': 'ms', 
-             'range': '1-30', 'type': 'int'},
-            {'name': 'atrial_sensitivity', 'label': 'Atrial Sensitivity', 'unit': 'V', 
-             'range': '0.0-5.0', 'type': 'float'},
-            {'name': 'ARP', 'label': 'Atrial Refractory Period', 'unit': 'ms', 
-             'range': '150-500', 'type': 'int'},
-        ]
-        
-        # Ventricular parameters (Deliverable 2: pulse width 1-30 ms, amplitude 0.1-5.0V)
-        ventricular = [
-            {'name': 'ventricular_amp', 'label': 'Ventricular Amplitude', 'unit': 'V', 
-             'range': '0.1-5.0', 'type': 'float'},
-            {'name': 'ventricular_width', 'label': 'Ventricular Pulse Width', 'unit': 'ms', 
-             'range': '1-30', 'type': 'int'},
-            {'name': 'ventricular_sensitivity', 'label': 'Ventricular Sensitivity', 'unit': 'V', 
-             'range': '0.0-5.0', 'type': 'float'},
-            {'name': 'VRP', 'label': 'Ventricular Refractory Period', 'unit': 'ms', 
-             'range': '150-500', 'type': 'int'},
-        ]
-        
-        params = []
-        
-        # AOO mode: LRL, atrial amplitude, atrial pulse width
-        if mode == PaceMakerMode.AOO:
-            params = [common[0], atrial[0], atrial[1]]
-        # VOO mode: LRL, ventricular amplitude, ventricular pulse width
-        elif mode == PaceMakerMode.VOO:
-            params = [common[0], ventricular[0], ventricular[1]]
-        # AAI mode: LRL, URL, all atrial parameters
-        elif mode == PaceMakerMode.AAI:
-            params = [common[0], *url_param, *atrial]
-        # VVI mode: LRL, URL, all ventricular parameters
-        elif mode == PaceMakerMode.VVI:
-            params = [common[0], *url_param, *ventricular]
-        # AOOR mode: LRL, MSR, rate params, atrial amplitude, atrial pulse width
-        elif mode == PaceMakerMode.AOOR:
-            params = [common[0], rate_params[0], *rate_params[1:], atrial[0], atrial[1]]
-        # VOOR mode: LRL, MSR, rate params, ventricular amplitude, ventricular pulse width
-        elif mode == PaceMakerMode.VOOR:
-            params = [common[0], rate_params[0], *rate_params[1:], ventricular[0], ventricular[1]]
-        # AAIR mode: LRL, URL, MSR, rate params, all atrial parameters
-        elif mode == PaceMakerMode.AAIR:
-            params = [common[0], *url_param, rate_params[0], *rate_params[1:], *atrial]
-        # VVIR mode: LRL, URL, MSR, rate params, all ventricular parameters
-        elif mode == PaceMakerMode.VVIR:
-            params = [common[0], *url_param, rate_params[0], *rate_params[1:], *ventricular]
-        # DDDR mode: dual-chamber pacing with av delay and rate response
-        elif mode == PaceMakerMode.DDDR:
-            dual_timing = [
-                {'name': 'AV_delay', 'label': 'AV Delay', 'unit': 'ms',
-                 'range': '30-300', 'type': 'int'},
-                {'name': 'PVARP', 'label': 'Post-Ventricular Atrial Refractory Period', 'unit': 'ms',
-                 'range': '150-500', 'type': 'int'},
-            ]
-            params = [common[0], *url_param, rate_params[0], *rate_params[1:], *atrial, *ventricular, *dual_timing]
-        
-        return params
+        """Return the form rows for the given mode from the parameter schema"""
+        return form_fields(mode)
     
     def _validate_mode_parameters(self, mode):
-        """Validate parameters for current mode based on Deliverable 2 requirements"""
-        mode_info = parse_mode(mode)
-        is_rate_adaptive = mode_info.rate
-        
-        # LRL validation
-        if not(30 <= self.parameters.LRL <= 175):
-            raise ValueError(f"LRL {self.parameters.LRL} out of range (30-175 ppm)")
-        
-        # URL validation for modes with sensing
-        if mode_info.sensed != 'O':
-            if not(50 <= self.parameters.URL <= 175):
-                raise ValueError(f"URL {self.parameters.URL} out of range (50-175 ppm)")
-            if self.parameters.LRL >= self.parameters.URL:
-                raise ValueError(f"URL must be greater than LRL")
-        
-        # MSR validation for rate adaptive modes
-        if is_rate_adaptive:
-            if not(50 <= self.parameters.MSR <= 175):
-                raise ValueError(f"MSR {self.parameters.MSR} out of range (50-175 ppm)")
-            if self.parameters.MSR < self.parameters.URL:
-                raise ValueError(f"MSR must be >= URL")
-        
-        # Atrial parameters
-        if mode_info.paced == 'A' or mode_info.sensed == 'A':
-            if not (0.1 <= self.parameters.atrial_amp <= 5.0):
-                raise ValueError(f"Atrial Amplitude {self.parameters.atrial_amp} out of range (0.1-5.0 V)")
-            if not (1 <= self.parameters.atrial_width <= 30):
-                raise ValueError(f"Atrial Pulse Width {self.parameters.atrial_width} out of range (1-30 ms)")
-            if mode_info.sensed == 'A':
-                if not (0.0 <= self.parameters.atrial_sensitivity <= 5.0):
-                    raise ValueError(f"Atrial Sensitivity {self.parameters.atrial_sensitivity} out of range (0.0-5.0 V)")
-                if not (150 <= self.parameters.ARP <= 500):
-                    raise ValueError(f"ARP {self.parameters.ARP} out of range (150-500 ms)")
-        
-        # Ventricular parameters
-        if mode_info.paced == 'V' or mode_info.sensed == 'V':
-            if not (0.1 <= self.parameters.ventricular_amp <= 5.0):
-                raise ValueError(f"Ventricular Amplitude {self.parameters.ventricular_amp} out of range (0.1-5.0 V)")
-            if not (1 <= self.parameters.ventricular_width <= 30):
-                raise ValueError(f"Ventricular Pulse Width {self.parameters.ventricular_width} out of range (1-30 ms)")
-            if mode_info.sensed == 'V':
-                if not (0.0 <= self.parameters.ventricular_sensitivity <= 5.0):
-                    raise ValueError(f"Ventricular Sensitivity {self.parameters.ventricular_sensitivity} out of range (0.0-5.0 V)")
-                if not (150 <= self.parameters.VRP <= 500):
-                    raise ValueError(f"VRP {self.parameters.VRP} out of range (150-500 ms)")
-        
-        # Rate adaptive parameters
-        if is_rate_adaptive:
-            if not (1 <= self.parameters.activity_threshold <= 7):
-                raise ValueError(f"Activity Threshold {self.parameters.activity_threshold} out of range (1-7)")
-            if not (10 <= self.parameters.reaction_time <= 50):
-                raise ValueError(f"Reaction Time {self.parameters.reaction_time} out of range (10-50 sec)")
-            if not (2 <= self.parameters.recovery_time <= 16):
-                raise ValueError(f"Recovery Time {self.parameters.recovery_time} out of range (2-16 min)")
-            if not (1 <= self.parameters.response_factor <= 16):
-                raise ValueError(f"Response Factor {self.parameters.response_factor} out of range (1-16)")
-
-        if mode == PaceMakerMode.DDDR:
-            if not (30 <= self.parameters.AV_delay <= 300):
-                raise ValueError(f"AV Delay {self.parameters.AV_delay} out of range (30-300 ms)")
-            if not (150 <= self.parameters.PVARP <= 500):
-                raise ValueError(f"PVARP {self.parameters.PVARP} out of range (150-500 ms)")
-        
-        return True
+        """Validate the parameters the given mode uses against the parameter schema"""
+        return validator_for(mode).validate(self.parameters)
+    
+    def _check_param_entry(self, name):
+        """flag an out-of-range entry while it is being typed"""
+        widget_info = self.param_widgets.get(name)
+        if widget_info is None or not self.current_mode:
+            return
+        try:
+            value = FIELDS_BY_NAME[name].parse(widget_info['var'].get().strip())
+            error = validator_for(self.current_mode).check_field(name, value, self.parameters)
+        except ValueError:
+            error = "Not a number"
+        widget_info['range_label'].config(foreground='#e74c3c' if error else '#95a5a6')
     
     def _save_parameters(self):
         """Validate and save parameters"""
@@ -629,9 +637,8 @@ class DCMApplication:
             
             self._validate_mode_parameters(self.current_mode)
             
-            params_file = os.path.join(os.path.dirname(__file__), "..", "storage", "params.json")
-            with open(params_file, "w") as f:
-                json.dump(self.parameters.to_dict(), f, indent=4)
+            save_parameters(self.parameters, username=self.current_user,
+                            mode=self.current_mode.value)
             
             messagebox.showinfo("Success", 
                               f"Parameters saved for {self.current_mode.value} mode.")
@@ -662,10 +669,21 @@ class DCMApplication:
         
         if self.is_connected:
             # Disconnect
+            if self.link_supervisor:
+                self.link_supervisor.stop()
+                self.link_supervisor = None
             if self.serial_interface:
                 self.serial_interface.disconnect()
+                tx = self.serial_interface.tx
+                if tx is not None:
+                    for name, stats in tx.latency().items():
+                        self._record_timing(f"tx_{name}_p95", stats["p95_ms"] / 1000)
+            self._close_egram_ring()
             self.serial_interface = None
             self.is_connected = False
+            self.egram_streaming = False
+            if self.egram_window and self.egram_window.winfo_exists():
+                self.egram_stream_btn.config(text="Start Streaming")
             self.ventricular_inhibit_active = False
             self.connect_btn.config(text="Connect")
             self.telemetry_status.config(text="Disconnected", foreground='red')
@@ -674,26 +692,32 @@ class DCMApplication:
             # Connect
             port = self.port_var.get()
             try:
+                from core.serial_interface import SerialInterface
                 self.serial_interface = SerialInterface(port, baudrate=115200)
-                self.serial_interface.connect()
+                # writes go through the TX queue so a stalled adapter can't freeze the UI
+                self.serial_interface.connect(tx_queue=True)
                 
                 # Set up callbacks
-               # self.serial_interface.ack_callback = self._on_parameter_ack
-                #self.serial_interface.egram_callback = self._on_egram_data
-             
-    # ... existing code ...
-    
-                # Set up callbacks
+                iface = self.serial_interface
                 def on_ack():
-                    print("[GUI] ACK received from device")
-                    self.root.after(0, lambda: messagebox.showinfo("Success", 
-                        "Parameters successfully transmitted and verified on device."))
-                
-                # def on_egram(ch, val):
-                #     print(f"[GUI] EGRAM → ch={ch}, value={val}")
+                    # read thread: the interface has just matched the ACK to its push
+                    self.root.after(0, self._on_parameter_ack, iface.acked_seq, iface.last_acked)
                 
                 self.serial_interface.ack_callback = on_ack
-                self.serial_interface.egram_callback = self._on_egram_data    
+                # one call per read, stamped from the device sample clock
+                self._reset_egram_filter()
+                from core.egram_shm import SharedEgramRing, publish_ring
+                self.egram_ring = SharedEgramRing.create()
+                publish_ring(self.egram_ring)
+                self.serial_interface.egram_batch_callback = self._on_egram_batch
+
+                # reopen the port, re-push parameters and restart egram after a
+                # board reset or cable re-seat
+                from core.link_supervisor import LinkSupervisor, same_device
+                self.link_supervisor = LinkSupervisor(self.serial_interface, find_port=same_device(port))
+                self.link_supervisor.state_callback = (
+                    lambda state, detail: self.root.after(0, self._on_link_state, state, detail))
+                self.link_supervisor.start()
     
                 self.is_connected = True
                 self.ventricular_inhibit_active = False
@@ -703,25 +727,69 @@ class DCMApplication:
                 self.telemetry_canvas.itemconfig(self.telemetry_led, fill='green', outline='darkgreen')
                 messagebox.showinfo("Connected", f"Successfully connected to {port}")
             except Exception as e:
+                self._close_egram_ring()
                 messagebox.showerror("Connection Error", f"Failed to connect to {port}:\n{str(e)}")
                 self.is_connected = False
     
-    # def _on_parameter_ack(self):
-    #     """Callback when parameter transmission is acknowledged"""
-    #     self.root.after(0, lambda: messagebox.showinfo("Success", 
-    #         "Parameters successfully transmitted and verified on device."))
-    
-    def _on_egram_data(self, channel, value):
-        """Callback when egram data is received"""
-        if channel == 0:  # Atrial
-            self.egram_data['atrial'].append((time.time(), value))
-        elif channel == 1:  # Ventricular
-            self.egram_data['ventricular'].append((time.time(), value))
-        
-        # Update egram display if window is open
-        if self.egram_window and self.egram_window.winfo_exists():
-            self.root.after(0, self._update_egram_display)
+    def _on_parameter_ack(self, seq, acked):
+        """Journal the push the device confirmed, on the Tk thread"""
+        push = self.unacked_pushes.pop(seq, None)
+        for older in [s for s in self.unacked_pushes if s < seq]:
+            del self.unacked_pushes[older]   # superseded, their ACK can no longer come
+        if push is None or acked is None:
+            return
+        username, mode = push
+        # the wire dict has no sensitivities, journal the full set with the pushed fields over it
+        record_programmed(replace(self.parameters, **acked[0]), username=username, mode=mode)
+        messagebox.showinfo("Success", "Parameters successfully transmitted and verified on device.")
+
+    def _on_link_state(self, state, detail):
+        """LinkSupervisor state changes, on the Tk thread"""
+        if not self.is_connected or not self.telemetry_status:
+            return
+        # the filters must not run across the gap in the signal
+        self._reset_egram_filter()
+        if state == "reconnecting":
+            self.telemetry_status.config(text="Reconnecting...", foreground='#d35400')
+            self.telemetry_canvas.itemconfig(self.telemetry_led, fill='orange', outline='#d35400')
+        elif state == "connected":
+            self.telemetry_status.config(text="Connected", foreground='green')
+            self.telemetry_canvas.itemconfig(self.telemetry_led, fill='green', outline='darkgreen')
+
+    def _on_egram_batch(self, timestamps, atrial, ventricular):
+        """Callback with every egram sample from one serial read"""
+        ring = self.egram_ring
+        if ring is not None:
+            ring.write(timestamps, atrial, ventricular)
+        self._egram_sink(timestamps, atrial, ventricular)
     
+    def _close_egram_ring(self):
+        """Withdraw and free the shared egram ring; call after the port is closed"""
+        ring, self.egram_ring = self.egram_ring, None
+        if ring is None:
+            return
+        from core.egram_shm import unpublish_ring
+        unpublish_ring(ring)
+        try:
+            ring.close()
+        except BufferError:
+            pass    # a write still in flight holds a view, unlink frees the segment anyway
+        ring.unlink()
+
+    def _store_egram_batch(self, timestamps, atrial, ventricular):
+        """Append a (possibly filtered) batch to the egram deques and the trigger.
+        While the filters fill up after a reset a batch can be short or empty"""
+        if not len(timestamps):
+            return
+        with self.egram_lock:
+            self.egram_data['atrial'].extend(zip(timestamps, atrial))
+            self.egram_data['ventricular'].extend(zip(timestamps, ventricular))
+            self.egram_written += len(timestamps)
+        engine = self.egram_trigger
+        if engine is not None:
+            engine.feed(timestamps, atrial, ventricular)
+        # no Tk calls here: the egram window's refresh loop picks the samples up
+
     def _transmit_parameters(self):
         """Transmit parameters to the pacemaker device"""
         if not self.is_connected or not self.serial_interface:
@@ -759,7 +827,9 @@ class DCMApplication:
                 "MSR": self.parameters.MSR,
                 "rate_smoothing": self.parameters.rate_smoothing
             }
-            self.serial_interface.send_parameters(params_dict, mode_id(self.current_mode))
+            seq = self.serial_interface.send_parameters(params_dict, mode_id(self.current_mode))
+            # journaled once the device ACKs it, see _on_parameter_ack
+            self.unacked_pushes[seq] = (self.current_user, self.current_mode.value)
             messagebox.showinfo("Transmitted", 
                               "Parameters transmitted to device.\n"
                               "Waiting for verification...")
@@ -800,7 +870,11 @@ class DCMApplication:
                 "MSR": self.parameters.MSR,
                 "rate_smoothing": self.parameters.rate_smoothing
             }
-            self.serial_interface.send_parameters(params_dict, mode_id(self.current_mode))
+            # pre-empts queued traffic and replaces a push still waiting to go out
+            from core.tx_queue import PRIORITY_URGENT
+            seq = self.serial_interface.send_parameters(params_dict, mode_id(self.current_mode),
+                                                        priority=PRIORITY_URGENT)
+            self.unacked_pushes[seq] = (self.current_user, self.current_mode.value)
             self.ventricular_inhibit_active = active
             if self.telemetry_status:
                 if active:
@@ -817,10 +891,34 @@ class DCMApplication:
                                "Please connect to the device first.")
             return
         
-        # Note: This would need to be implemented in serial_interface
-        messagebox.showinfo("Request Sent", 
-                          "Parameter request sent to device.\n"
-                          "Parameters will be displayed when received.")
+        if not self.current_mode:
+            messagebox.showwarning("No Mode Selected", 
+                                 "Please select a pacing mode before verifying.")
+            return
+        
+        # read-back blocks for up to a second, keep it off the Tk thread
+        iface = self.serial_interface
+        params, mode = self.parameters, self.current_mode
+        
+        def worker():
+            try:
+                result = iface.verify_parameters(params, mode_id(mode))
+            except Exception as e:
+                result = e
+            self.root.after(0, self._on_parameter_readback, result)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def _on_parameter_readback(self, result):
+        """Report the field-by-field comparison of the device's parameter block"""
+        if isinstance(result, Exception):
+            messagebox.showerror("Read-back Failed", f"Could not read parameters: {result}")
+        elif not result:
+            messagebox.showinfo("Verified", "Device parameters match the DCM.")
+        else:
+            lines = [f"{name}: DCM {want}, device {got}" for name, want, got in result]
+            messagebox.showwarning("Mismatch", 
+                                 "Device parameters differ from the DCM:\n" + "\n".join(lines))
     
     def _show_egram_window(self):
         """Display egram window"""
@@ -844,12 +942,62 @@ class DCMApplication:
         
         ttk.Button(control_frame, text="Clear", command=self._clear_egram).pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(control_frame, text="Analyze", command=self._analyze_egram).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(control_frame, text="Export", command=self._export_egram).pack(side=tk.LEFT, padx=5)
+        self.egram_analysis_label = ttk.Label(control_frame, text="", font=('Helvetica', 9))
+        self.egram_analysis_label.pack(side=tk.LEFT, padx=10)
+        
+        # Vector redraws every segment each frame; Raster scrolls a pixel
+        # buffer; Sweep writes over the screen left to right like a monitor
+        self.egram_renderer_var = tk.StringVar(value="Raster")
+        renderer = ttk.Combobox(control_frame, textvariable=self.egram_renderer_var,
+                                values=["Vector", "Raster", "Sweep"], state="readonly", width=8)
+        renderer.pack(side=tk.RIGHT, padx=5)
+        renderer.bind("<<ComboboxSelected>>", lambda e: self._clear_egram_renderer())
+        ttk.Label(control_frame, text="Renderer:").pack(side=tk.RIGHT)
+        # raw samples stay available with the filters switched off
+        self.egram_filter_var = tk.BooleanVar(value=self.egram_filter_enabled)
+        ttk.Checkbutton(control_frame, text="Filter", variable=self.egram_filter_var,
+                        command=self._toggle_egram_filter).pack(side=tk.RIGHT, padx=5)
+        
+        # Trigger controls: freeze a window around level / slope / rate events
+        trigger_frame = ttk.Frame(self.egram_window, padding=(10, 0))
+        trigger_frame.pack(fill=tk.X)
+        ttk.Label(trigger_frame, text="Trigger:").pack(side=tk.LEFT)
+        self.trigger_kind_var = tk.StringVar(value="rate")
+        ttk.Combobox(trigger_frame, textvariable=self.trigger_kind_var, values=["level", "slope", "rate"],
+                     state="readonly", width=6).pack(side=tk.LEFT, padx=2)
+        self.trigger_channel_var = tk.StringVar(value="ventricular")
+        ttk.Combobox(trigger_frame, textvariable=self.trigger_channel_var, values=["atrial", "ventricular"],
+                     state="readonly", width=11).pack(side=tk.LEFT, padx=2)
+        ttk.Label(trigger_frame, text="Threshold").pack(side=tk.LEFT, padx=(8, 2))
+        self.trigger_threshold_var = tk.StringVar(value="3000")
+        ttk.Entry(trigger_frame, textvariable=self.trigger_threshold_var, width=8).pack(side=tk.LEFT)
+        ttk.Label(trigger_frame, text="Rate (bpm)").pack(side=tk.LEFT, padx=(8, 2))
+        self.trigger_low_var = tk.StringVar(value="40")
+        ttk.Entry(trigger_frame, textvariable=self.trigger_low_var, width=4).pack(side=tk.LEFT)
+        ttk.Label(trigger_frame, text="-").pack(side=tk.LEFT)
+        self.trigger_high_var = tk.StringVar(value="180")
+        ttk.Entry(trigger_frame, textvariable=self.trigger_high_var, width=4).pack(side=tk.LEFT)
+        ttk.Label(trigger_frame, text="Pre (s)").pack(side=tk.LEFT, padx=(8, 2))
+        self.trigger_pre_var = tk.StringVar(value="2.0")
+        ttk.Entry(trigger_frame, textvariable=self.trigger_pre_var, width=4).pack(side=tk.LEFT)
+        ttk.Label(trigger_frame, text="Post (s)").pack(side=tk.LEFT, padx=(8, 2))
+        self.trigger_post_var = tk.StringVar(value="3.0")
+        ttk.Entry(trigger_frame, textvariable=self.trigger_post_var, width=4).pack(side=tk.LEFT)
+        self.trigger_btn = ttk.Button(trigger_frame, text="Arm", command=self._toggle_egram_trigger)
+        self.trigger_btn.pack(side=tk.LEFT, padx=8)
+        self.trigger_label = ttk.Label(trigger_frame, text="", font=('Helvetica', 9))
+        self.trigger_label.pack(side=tk.LEFT)
+        
         # Canvas for egram display
         canvas_frame = ttk.Frame(self.egram_window)
         canvas_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         self.egram_canvas = tk.Canvas(canvas_frame, bg='white', height=500)
         self.egram_canvas.pack(fill=tk.BOTH, expand=True)
+        self._reset_egram_renderer()
         
         # Labels for channels
         ttk.Label(canvas_frame, text="Atrial (Blue) / Ventricular (Red)", 
@@ -857,6 +1005,20 @@ class DCMApplication:
         
         # Initial display
         self._update_egram_display()
+        if self._egram_refresh is None:
+            self._egram_refresh = self.root.after(50, self._refresh_egram_window)
+    
+    def _refresh_egram_window(self):
+        """The single redraw loop of the egram window: every 50 ms, while the
+        window is open, draw whatever samples arrived since the last pass"""
+        self._egram_refresh = None
+        if not self.egram_window or not self.egram_window.winfo_exists():
+            return
+        written = self.egram_written
+        if written != self._egram_refresh_n:
+            self._egram_refresh_n = written
+            self._update_egram_display()
+        self._egram_refresh = self.root.after(50, self._refresh_egram_window)
     
     def _toggle_egram_streaming(self):
         """Start/stop egram data streaming"""
@@ -865,25 +1027,113 @@ class DCMApplication:
                                "Please connect to the device first.")
             return
         
-        if self.egram_streaming:
-            # Stop streaming
-            self.egram_streaming = False
-            self.egram_stream_btn.config(text="Start Streaming")
-            # Note: Would need stop command in serial_interface
-        else:
-            # Start streaming
-            self.egram_streaming = True
-            self.egram_stream_btn.config(text="Stop Streaming")
-            # Note: Would need start command in serial_interface
-            messagebox.showinfo("Streaming Started", 
-                              "Egram data streaming started.\n"
-                              "Data will be displayed in real-time.")
+        try:
+            if self.egram_streaming:
+                # the supervisor won't restart a stream that was stopped
+                self.serial_interface.stop_egram()
+            else:
+                # remembered as iface.egram_request, so a reconnect restarts it
+                self.serial_interface.request_egram()
+        except Exception as e:
+            messagebox.showerror("Streaming Error", f"Failed to send the egram command: {e}",
+                                 parent=self.egram_window)
+            return
+        self.egram_streaming = not self.egram_streaming
+        self.egram_stream_btn.config(text="Stop Streaming" if self.egram_streaming else "Start Streaming")
     
     def _clear_egram(self):
         """Clear egram display"""
-        self.egram_data['atrial'].clear()
-        self.egram_data['ventricular'].clear()
-        self._update_egram_display()
+        with self.egram_lock:
+            self.egram_data['atrial'].clear()
+            self.egram_data['ventricular'].clear()
+        self._reset_egram_filter()
+        self._clear_egram_renderer()
+    
+    def _reset_egram_filter(self):
+        """Start the egram conditioning over: baseline removal, mains notch and
+        low-pass (core.filters.default_filter_bank) when filtering is on.
+        Swapping in a fresh bank instead of calling reset() on the old one
+        keeps the serial thread from ever seeing a half-reset bank. The bank
+        delays the signal by about 1 s; its output keeps the input timestamps
+        and the first batches after a reset come out short."""
+        if self.egram_filter_enabled:
+            from core.filters import default_filter_bank
+            self._egram_sink = default_filter_bank().pipe(self._store_egram_batch)
+        else:
+            self._egram_sink = self._store_egram_batch
+    
+    def _toggle_egram_filter(self):
+        self.egram_filter_enabled = self.egram_filter_var.get()
+        self._reset_egram_filter()
+    
+    def _export_egram(self):
+        """Save the egram history as CSV or chunked columnar binary"""
+        path = filedialog.asksaveasfilename(
+            parent=self.egram_window, defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Columnar egram", "*.egc")])
+        if not path:
+            return
+        from core.egram_export import export_egram
+        from core.storage import get_engine
+        try:
+            # copy the deques, the serial thread keeps appending while we write
+            with self.egram_lock:
+                snapshot = {ch: list(data) for ch, data in self.egram_data.items()}
+            rows = export_egram(snapshot, path)
+            times = [t for data in snapshot.values() for t, _ in data]
+            engine = get_engine()
+            session_id = engine.start_egram_session(
+                username=self.current_user,
+                mode=self.current_mode.value if self.current_mode else None,
+                path=path, started=min(times) if times else None)
+            engine.finish_egram_session(session_id, rows, ended=max(times) if times else None)
+            messagebox.showinfo("Export Complete", f"Wrote {rows} samples to {path}",
+                                parent=self.egram_window)
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Failed to export: {str(e)}",
+                                 parent=self.egram_window)
+    
+    def _analyze_egram(self):
+        """Ship the current egram history to the analysis pool"""
+        from core.analysis import window_from_buffer, summarize, detect_beats
+        with self.egram_lock:
+            window = window_from_buffer(self.egram_data)
+        # both jobs finish in any order, the label is rendered from whatever has arrived
+        self.egram_analysis = {}
+        self.egram_analysis_label.config(text="Analyzing...")
+        results = self.egram_analysis
+        self.analysis_executor.submit(
+            summarize, window, callback=lambda r, e: self._on_egram_analysis(results, 'summary', r, e))
+        self.analysis_executor.submit(
+            detect_beats, window, callback=lambda r, e: self._on_egram_analysis(results, 'beats', r, e))
+    
+    def _on_egram_analysis(self, results, kind, result, error):
+        """Runs on the Tk thread once the summary or beat detection job finishes"""
+        if results is not self.egram_analysis:
+            return  # a newer Analyze click superseded this run
+        if not self.egram_window or not self.egram_window.winfo_exists():
+            return
+        results[kind] = (result, error)
+        self._render_egram_analysis()
+    
+    def _render_egram_analysis(self):
+        """Analysis label text from the summary and beat results received so far"""
+        summary, summary_error = self.egram_analysis.get('summary', (None, None))
+        beats, beats_error = self.egram_analysis.get('beats', (None, None))
+        if summary_error or beats_error:
+            self.egram_analysis_label.config(text=f"Analysis failed: {summary_error or beats_error}")
+            return
+        parts = []
+        if summary is not None:
+            a, v = summary['atrial'], summary['ventricular']
+            parts.append(f"A: n={a['count']} rms={a.get('rms', 0):.1f} | "
+                         f"V: n={v['count']} rms={v.get('rms', 0):.1f}")
+        if beats is not None:
+            parts.append(f"A rate {beats['atrial']['rate_bpm']:.0f} bpm, "
+                         f"V rate {beats['ventricular']['rate_bpm']:.0f} bpm")
+        if len(parts) < 2:
+            parts.append("Analyzing...")
+        self.egram_analysis_label.config(text=" | ".join(parts))
     
     def _update_egram_display(self):
         """Update the egram canvas with current data"""
@@ -891,11 +1141,16 @@ class DCMApplication:
             return
         
         canvas = self.egram_canvas
-        canvas.delete("all")
-        
         width = canvas.winfo_width()
         height = canvas.winfo_height()
         
+        if self.egram_renderer_var.get() in ("Raster", "Sweep"):
+            if width >= 10 and height >= 10:
+                self._update_egram_raster(canvas, width, height)
+            return
+        
+        canvas.delete("all")
+        
         if width < 10 or height < 10:
             return
         
@@ -940,10 +1195,98 @@ class DCMApplication:
                     canvas.create_line(points[i][0], points[i][1], 
                                      points[i+1][0], points[i+1][1], 
                                      fill='red', width=2)
-        
-        # Schedule next update
-        if self.egram_streaming:
-            self.root.after(50, self._update_egram_display)
+    
+    def _toggle_egram_trigger(self):
+        """Arm or disarm the trigger engine with the settings in the trigger row"""
+        if self.egram_trigger is not None:
+            self.egram_trigger = None
+            self.trigger_btn.config(text="Arm")
+            self.trigger_label.config(text="")
+            return
+        from core.egram_trigger import Trigger, TriggerEngine
+        try:
+            trigger = Trigger(self.trigger_kind_var.get(), self.trigger_channel_var.get(),
+                              float(self.trigger_threshold_var.get()),
+                              low_bpm=float(self.trigger_low_var.get()),
+                              high_bpm=float(self.trigger_high_var.get()))
+            clock = self.serial_interface.clock if self.serial_interface else None
+            engine = TriggerEngine([trigger], pre=float(self.trigger_pre_var.get()),
+                                   post=float(self.trigger_post_var.get()),
+                                   sample_rate=(clock.rate if clock and clock.rate else 1000.0))
+        except ValueError as e:
+            messagebox.showerror("Trigger", f"Invalid trigger: {e}", parent=self.egram_window)
+            return
+        engine.capture_callback = self._on_egram_capture
+        self.egram_trigger = engine
+        self.trigger_btn.config(text="Disarm")
+        self.trigger_label.config(text=f"Armed: {trigger.name}")
+    
+    def _on_egram_capture(self, snapshot):
+        """Serial thread: write the snapshot off-thread, acquisition carries on"""
+        from core.egram_trigger import save_snapshot
+        def worker():
+            try:
+                path = save_snapshot(snapshot, CAPTURE_DIR)
+                text = f"Captured {snapshot.trigger.name} -> {os.path.basename(path)}"
+            except Exception as e:
+                text = f"Capture failed: {e}"
+            self.root.after(0, lambda: self._show_capture_status(text))
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def _show_capture_status(self, text):
+        if self.egram_window and self.egram_window.winfo_exists():
+            self.trigger_label.config(text=text)
+    
+    def _reset_egram_renderer(self):
+        """Drop the raster buffer so the next frame starts from the full history"""
+        self.egram_raster = None
+        self.egram_photo = None
+        self._egram_raster_n = None
+    
+    def _clear_egram_renderer(self):
+        self._reset_egram_renderer()
+        self.egram_canvas.delete("all")
+        self._update_egram_display()
+    
+    def _new_egram_samples(self, since):
+        """(written, times, atrial, ventricular) of the samples appended after
+        the first `since` ever written; None means everything still held"""
+        # walk back from the newest end only as far as the new samples, so a
+        # frame costs O(new) instead of copying the whole history
+        with self.egram_lock:
+            written = self.egram_written
+            atrial = self.egram_data['atrial']
+            ventricular = self.egram_data['ventricular']
+            count = len(atrial) if since is None else min(written - since, len(atrial))
+            new_a = list(islice(reversed(atrial), count))[::-1]
+            new_v = list(islice(reversed(ventricular), count))[::-1]
+        return (written, [t for t, _ in new_a], [v for _, v in new_a],
+                [v for _, v in new_v])
+    
+    def _update_egram_raster(self, canvas, width, height):
+        """Draw only the samples that arrived since the last frame, then one blit"""
+        from gui.egram_raster import RasterEgram, SweepEgram
+        start = time.perf_counter()
+        sweep = self.egram_renderer_var.get() == "Sweep"
+        if (self.egram_raster is None or self.egram_raster.size != (width, height)
+                or isinstance(self.egram_raster, SweepEgram) != sweep):
+            canvas.delete("all")
+            self.egram_raster = SweepEgram(width, height) if sweep else RasterEgram(width, height)
+            self.egram_photo = tk.PhotoImage(width=width, height=height)
+            canvas.create_image(0, 0, image=self.egram_photo, anchor='nw')
+            self._egram_raster_n = None
+        
+        written, new_t, atrial, ventricular = self._new_egram_samples(self._egram_raster_n)
+        self._egram_raster_n = written
+        if not new_t:
+            return
+        if sweep:
+            self.egram_raster.push(new_t, atrial, ventricular)
+        else:
+            self.egram_raster.push(atrial, ventricular)
+        self.egram_raster.blit(self.egram_photo)
+        # kept, not printed: this runs at the display rate
+        self.timings["egram_raster_frame"] = time.perf_counter() - start
     
     def _handle_logout(self):
         """Handle user logout"""
@@ -951,13 +1294,23 @@ class DCMApplication:
                               "Are you sure you want to logout?\n"
                               "Make sure you have saved any parameter changes."):
             # Disconnect serial if connected
+            if self.link_supervisor:
+                self.link_supervisor.stop()
+                self.link_supervisor = None
             if self.is_connected and self.serial_interface:
                 self.serial_interface.disconnect()
+            self._close_egram_ring()
             
             # Close egram window if open
             if self.egram_window and self.egram_window.winfo_exists():
                 self.egram_window.destroy()
             
+            if self._analysis_executor is not None:
+                self._analysis_executor.shutdown()
+                self._analysis_executor = None
+            
+            end_session(self.session_token)
+            self.session_token = None
             self.current_user = None
             self.current_mode = None
             self.is_connected = False
@@ -0,0 +1,240 @@
+"""
+Raster egram renderer: traces are drawn into an RGB NumPy buffer and blitted
+to a tk.PhotoImage in one call per frame, instead of one Canvas item per
+segment. New samples scroll the buffer left and only the new columns are
+drawn, so a frame costs the same whatever the history length.
+"""
+
+import numpy as np
+
+# RGB per channel, and where each trace sits: (centre as a fraction of the
+# height, direction values move in), same layout as the vector display
+TRACE_COLORS = {'atrial': (0, 0, 255), 'ventricular': (255, 0, 0)}
+TRACE_LAYOUT = {'atrial': (0.5, -1.0), 'ventricular': (0.5, 1.0)}
+BACKGROUND = (255, 255, 255)
+GRID_COLOR = (224, 224, 224)
+AXIS_COLOR = (136, 136, 136)
+
+
+class RasterEgram:
+    """
+    Scrolling strip chart of the atrial and ventricular traces.
+
+    push() adds samples; every `samples_per_column` samples make one pixel
+    column, drawn as the min-max envelope of its samples joined to the
+    previous column with a vertical span, so spikes are never lost to
+    decimation. blit() hands the whole frame to a PhotoImage as one PPM.
+    """
+    def __init__(self, width, height, value_range=(0, 4095), samples_per_column=1, grid=50):
+        self.width = int(width)
+        self.height = int(height)
+        self.value_range = value_range
+        self.samples_per_column = max(1, int(samples_per_column))
+        self.grid = grid
+        self.columns = 0                     # columns drawn since creation, keeps the grid in phase
+        self._rows = np.arange(self.height)[:, None]
+        self._pending = {ch: np.empty(0) for ch in TRACE_COLORS}
+        self._last_y = {ch: None for ch in TRACE_COLORS}
+        self._header = f"P6 {self.width} {self.height} 255\n".encode()
+        self.pixels = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.pixels[:] = self._background(np.arange(self.width))
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def _background(self, cols):
+        """grid and centre line for absolute column numbers `cols`, shape (h, n, 3)"""
+        strip = np.empty((self.height, len(cols), 3), dtype=np.uint8)
+        strip[:] = BACKGROUND
+        strip[:, np.asarray(cols) % self.grid == 0] = GRID_COLOR
+        strip[::self.grid] = GRID_COLOR
+        strip[self.height // 2] = AXIS_COLOR
+        return strip
+
+    def _to_y(self, channel, values):
+        lo, hi = self.value_range
+        centre, direction = TRACE_LAYOUT[channel]
+        y = self.height * centre + direction * (values - lo) / (hi - lo) * (self.height / 4)
+        return np.clip(np.rint(y), 0, self.height - 1).astype(np.int32)
+
+    def push(self, atrial, ventricular):
+        """add samples (equal length per channel); returns the number of new columns"""
+        per = self.samples_per_column
+        envelopes = {}
+        n = None
+        for channel, values in (('atrial', atrial), ('ventricular', ventricular)):
+            data = np.concatenate([self._pending[channel], np.asarray(values, dtype=np.float64)])
+            n = len(data) // per if n is None else min(n, len(data) // per)
+            envelopes[channel] = data
+        if not n:
+            for channel, data in envelopes.items():
+                self._pending[channel] = data
+            return 0
+        for channel, data in envelopes.items():
+            self._pending[channel] = data[n * per:]
+            block = data[:n * per].reshape(n, per)
+            envelopes[channel] = (self._to_y(channel, block.min(axis=1)),
+                                  self._to_y(channel, block.max(axis=1)),
+                                  self._to_y(channel, block[:, -1]))
+        self._scroll(n)
+        for channel, (y_a, y_b, y_last) in envelopes.items():
+            self._draw(channel, y_a, y_b, y_last)
+        return n
+
+    def _scroll(self, n):
+        """shift the image left by n columns and lay background under the new ones"""
+        n_new = min(n, self.width)
+        if n_new < self.width:
+            self.pixels[:, :-n_new] = self.pixels[:, n_new:]
+        first = self.columns + n - n_new
+        self.pixels[:, -n_new:] = self._background(np.arange(first, first + n_new))
+        if n > self.width:
+            # everything scrolled off, the old joins are meaningless
+            self._last_y = {ch: None for ch in TRACE_COLORS}
+        self.columns += n
+        self._new = n_new
+
+    def _draw(self, channel, y_a, y_b, y_last, columns=None):
+        """
+        fill each new column between its envelope rows and the previous
+        column's last sample; `columns` are the pixel columns (default: the
+        rightmost ones)
+        """
+        n_new = self._new
+        y_a, y_b, y_last = y_a[-n_new:], y_b[-n_new:], y_last[-n_new:]
+        prev = np.empty_like(y_last)
+        last = self._last_y[channel]
+        prev[0] = y_last[0] if last is None else last
+        prev[1:] = y_last[:-1]
+        lo = np.minimum(np.minimum(y_a, y_b), prev)
+        hi = np.maximum(np.maximum(y_a, y_b), prev)
+        mask = (self._rows >= lo) & (self._rows <= hi)          # (height, n_new)
+        if columns is None:
+            self.pixels[:, -n_new:][mask] = TRACE_COLORS[channel]
+        else:
+            region = self.pixels[:, columns]
+            region[mask] = TRACE_COLORS[channel]
+            self.pixels[:, columns] = region
+        self._last_y[channel] = int(y_last[-1])
+
+    def clear(self):
+        self.pixels[:] = self._background(np.arange(self.columns, self.columns + self.width) - self.width)
+        self._pending = {ch: np.empty(0) for ch in TRACE_COLORS}
+        self._last_y = {ch: None for ch in TRACE_COLORS}
+
+    def ppm(self):
+        """the frame as binary PPM bytes"""
+        return self._header + self.pixels.tobytes()
+
+    def blit(self, photo):
+        """copy the frame into a tk.PhotoImage of the same size, one Tk call"""
+        photo.configure(data=self.ppm(), format='ppm')
+
+
+class SweepEgram(RasterEgram):
+    """
+    Clinical sweep display: x is sample time modulo `seconds`, so a sample
+    never moves once drawn. Each push draws the columns the new samples
+    cover and blanks `erase` columns ahead of them (the erase bar), and
+    blit() only sends those columns to the PhotoImage. A frame costs the
+    same whatever the history length.
+
+    Samples in the column still being filled wait for the next push, so
+    the trace lags the newest sample by at most one column.
+    """
+    def __init__(self, width, height, seconds=5.0, erase=20, value_range=(0, 4095), grid=50):
+        super().__init__(width, height, value_range=value_range, grid=grid)
+        self.seconds = seconds
+        self.erase = erase
+        self.origin = None          # time at x = 0 on the first sweep
+        self.last_column = None     # unwrapped column drawn last
+        self.dirty = [(0, self.width)]  # (x0, x1) pixel spans changed since the last blit
+        self._pending_t = np.empty(0)
+
+    def push(self, times, atrial, ventricular):
+        """add timestamped samples; returns the number of columns drawn"""
+        times = np.concatenate([self._pending_t, np.asarray(times, dtype=np.float64)])
+        data = {ch: np.concatenate([self._pending[ch], np.asarray(values, dtype=np.float64)])
+                for ch, values in (('atrial', atrial), ('ventricular', ventricular))}
+        n = min(len(times), *(len(values) for values in data.values()))
+        if not n:
+            return 0
+        times = times[:n]
+        if self.origin is None:
+            self.origin = times[0]
+        # unwrapped column of every sample; the newest column is still filling
+        u = np.floor((times - self.origin) * (self.width / self.seconds)).astype(np.int64)
+        done = u < u[-1]
+        if self.last_column is not None:
+            done &= u > self.last_column        # late samples for a drawn column are dropped
+        keep = u >= u[-1]
+        self._pending_t = times[keep]
+        for channel in data:
+            self._pending[channel] = data[channel][:n][keep]
+        if not done.any():
+            return 0
+        u_done = u[done]
+        first = u_done[0] if self.last_column is None else self.last_column + 1
+        last = u_done[-1]
+        # after a long gap only the last screenful is worth drawing
+        first = max(first, last - self.width + 1)
+        columns = np.arange(first, last + 1)
+        # samples grouped by column; columns with no sample get interpolated
+        starts = np.flatnonzero(np.r_[True, u_done[1:] != u_done[:-1]])
+        sample_cols = u_done[starts]
+        ends = np.r_[starts[1:], len(u_done)] - 1
+        self._new = len(columns)
+        xs = columns % self.width
+        self.pixels[:, xs] = self._background(xs)
+        for channel, values in data.items():
+            values = values[:n][done]
+            v_min = np.minimum.reduceat(values, starts)
+            v_max = np.maximum.reduceat(values, starts)
+            v_last = np.interp(columns, sample_cols, values[ends])
+            index = np.searchsorted(sample_cols, columns)
+            has = (index < len(sample_cols)) & (sample_cols[np.minimum(index, len(sample_cols) - 1)] == columns)
+            index = np.minimum(index, len(sample_cols) - 1)
+            lo = np.where(has, v_min[index], v_last)
+            hi = np.where(has, v_max[index], v_last)
+            self._draw(channel, self._to_y(channel, lo), self._to_y(channel, hi),
+                       self._to_y(channel, v_last), columns=xs)
+        self.last_column = int(last)
+        # erase bar ahead of the trace
+        ahead = np.arange(last + 1, last + 1 + min(self.erase, self.width - len(columns))) % self.width
+        if len(ahead):
+            self.pixels[:, ahead] = self._background(ahead)
+        self._mark_dirty(first % self.width, len(columns) + len(ahead))
+        self.columns += len(columns)
+        return len(columns)
+
+    def _mark_dirty(self, x0, count):
+        """record `count` columns from x0 (wrapping) as changed"""
+        x0, count = int(x0), min(int(count), self.width)
+        end = x0 + count
+        if end <= self.width:
+            self.dirty.append((x0, end))
+        else:
+            self.dirty += [(x0, self.width), (0, end - self.width)]
+
+    def clear(self):
+        super().clear()
+        self.pixels[:] = self._background(np.arange(self.width))
+        self.origin = None
+        self.last_column = None
+        self._pending_t = np.empty(0)
+        self.dirty = [(0, self.width)]
+
+    def ppm(self, x0=0, x1=None):
+        """columns x0..x1 of the frame as binary PPM bytes"""
+        x1 = self.width if x1 is None else x1
+        if (x0, x1) == (0, self.width):
+            return super().ppm()
+        strip = np.ascontiguousarray(self.pixels[:, x0:x1])
+        return f"P6 {x1 - x0} {self.height} 255\n".encode() + strip.tobytes()
+
+    def blit(self, photo):
+        """send only the columns changed since the last blit"""
+        for x0, x1 in self.dirty:
+            photo.tk.call(photo.name, 'put', self.ppm(x0, x1), '-format', 'ppm', '-to', x0, 0)
+        self.dirty = []
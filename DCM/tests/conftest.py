@@ -0,0 +1,31 @@
+import os
+import pytest
+from core import storage
+
+TEST_DB_FILE = os.path.join(os.path.dirname(__file__), "test_dcm.sqlite3")
+
+def _remove_db(path):
+    storage.close_engines()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+@pytest.fixture
+def test_db(monkeypatch):
+    """path of a scratch database that storage.get_engine() opens by default, removed before and after"""
+    monkeypatch.setattr(storage, "DB_FILE", TEST_DB_FILE)
+    _remove_db(TEST_DB_FILE)
+    yield TEST_DB_FILE
+    _remove_db(TEST_DB_FILE)
+
+@pytest.fixture
+def param_values():
+    """one valid value for every parameter, a fresh dict per test"""
+    return dict(
+        LRL=60, URL=120, MSR=120, rate_smoothing=0,
+        atrial_amp=3.5, atrial_width=1, atrial_sensitivity=0.75, ARP=250,
+        ventricular_amp=3.5, ventricular_width=1, ventricular_sensitivity=2.5, VRP=320,
+        PVARP=250, AV_delay=150,
+        activity_threshold=4, reaction_time=30, recovery_time=5, response_factor=8,
+        atr_cmp_ref_pwm=60, vent_cmp_ref_pwm=90,
+    )
@@ -0,0 +1,59 @@
+import threading
+import numpy as np
+import pytest
+from core import analysis, egram
+
+@pytest.fixture(scope="module")
+def executor():
+    ex = analysis.AnalysisExecutor(max_workers=1)
+    yield ex
+    ex.shutdown(wait=True)
+
+def test_window_from_buffer(): #ANL-1
+    buf = egram.EgramBuffer()
+    buf.add_sample("atrial", 1, timestamp=0.0)
+    buf.add_sample("atrial", 3, timestamp=0.1)
+    buf.add_sample("ventricular", 5, timestamp=0.0)
+
+    window = analysis.window_from_buffer(buf)
+    assert list(window["atrial"]) == [1, 3]
+    assert list(window["atrial_t"]) == [0.0, 0.1]
+    assert list(window["ventricular"]) == [5]
+
+    # the GUI keeps (timestamp, value) pairs instead of EgramSample objects
+    window = analysis.window_from_buffer({"atrial": [(0.0, 2)], "ventricular": []})
+    assert list(window["atrial"]) == [2]
+    assert len(window["ventricular"]) == 0
+
+def test_detect_beats(): #ANL-2
+    t = np.arange(0, 5, 0.01)
+    # one spike per second -> 60 bpm
+    vals = np.where((t % 1.0) < 0.05, 100.0, 0.0)
+    window = {"atrial": vals, "atrial_t": t, "ventricular": vals, "ventricular_t": t}
+    beats = analysis.detect_beats(window, threshold=50)
+    assert beats["atrial"]["beats"] == 4
+    assert beats["atrial"]["rate_bpm"] == pytest.approx(60.0)
+    with pytest.raises(ValueError):
+        analysis.detect_beats({"atrial": vals}, threshold=50)       # no atrial_t
+
+def test_submit_runs_in_worker_process(executor): #ANL-3
+    window = {"atrial": np.array([1.0, 2.0, 3.0]), "ventricular": np.array([-1.0, 1.0])}
+    done = threading.Event()
+    results = []
+
+    def on_done(result, error):
+        results.append((result, error))
+        done.set()
+
+    executor.submit(analysis.summarize, window, callback=on_done)
+    assert done.wait(30)
+    result, error = results[0]
+    assert error is None
+    assert result["atrial"]["max"] == 3.0
+    assert result["ventricular"]["rms"] == pytest.approx(1.0)
+
+def test_submit_reports_worker_errors(executor): #ANL-4
+    window = {"atrial": np.ones(3), "atrial_t": np.arange(3.0)}
+    future = executor.submit(analysis.detect_beats, window, threshold="x")
+    with pytest.raises(ValueError, match="threshold"):
+        future.result(timeout=30)
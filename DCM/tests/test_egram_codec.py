@@ -0,0 +1,75 @@
+import os
+import time
+import numpy as np
+import pytest
+from core import egram_codec
+from core.egram_codec import DeltaDecoder, DeltaEncoder, decode_packed, encode_packed
+
+def test_packed_round_trip(): #ECD-1
+    atrial = np.arange(32) * 100
+    ventricular = 4095 - np.arange(32)
+    payload = encode_packed(70000, atrial, ventricular)
+    assert len(payload) == egram_codec.packed_size(32)
+    counter, a, v = decode_packed(payload)
+    assert counter == 70000 % 65536
+    assert a.tolist() == atrial.tolist() and v.tolist() == ventricular.tolist()
+
+def test_bad_payloads(): #ECD-2
+    with pytest.raises(ValueError):
+        decode_packed(b"\x00\x00\x01")
+    with pytest.raises(ValueError):
+        encode_packed(0, [1, 2], [1])
+    with pytest.raises(ValueError):
+        encode_packed(0, range(egram_codec.MAX_SAMPLES_PER_FRAME + 1), range(egram_codec.MAX_SAMPLES_PER_FRAME + 1))
+    assert egram_codec.counter_gap(65530, 4) == 10
+
+def test_link_rate(): #ECD-3
+    legacy = egram_codec.sample_rate(samples_per_frame=0)
+    assert legacy == pytest.approx(11520 / 23)
+    assert egram_codec.sample_rate(samples_per_frame=32) > 5 * legacy
+
+def test_delta_round_trip(): #ECD-5
+    rng = np.random.default_rng(1)
+    atrial = np.concatenate([2048 + rng.integers(-3, 4, 40), [0, 65535, 100], 2000 + np.arange(17) * 40])
+    ventricular = (np.arange(60) * 1000) % 65536
+    encoder, decoder = DeltaEncoder(keyframe_interval=4), DeltaDecoder()
+    out = []
+    for lo in range(0, 60, 10):
+        out.append(decoder.decode(encoder.encode(lo, atrial[lo:lo + 10], ventricular[lo:lo + 10])))
+    assert np.concatenate([a for _, a, _ in out]).tolist() == atrial.tolist()
+    assert np.concatenate([v for _, _, v in out]).tolist() == ventricular.tolist()
+    # small deltas pack into nibbles: header + keyframe + 10 bytes
+    assert len(DeltaEncoder().encode(0, [5] * 11, [7] * 11)) == 4 + 4 + 10
+
+def test_delta_resyncs_on_keyframe(): #ECD-6
+    encoder, decoder = DeltaEncoder(keyframe_interval=3), DeltaDecoder()
+    frames = [encoder.encode(i * 4, [i] * 4, [i] * 4) for i in range(7)]
+    results = [decoder.decode(f) for i, f in enumerate(frames) if i != 1]   # frame 1 lost
+    assert [r is None for r in results] == [False, True, False, False, False, False]
+    assert results[2][1].tolist() == [3] * 4 and decoder.stats["skipped"] == 1
+    trace = egram_codec.synthetic_trace(seconds=2)
+    result = egram_codec.compare_encodings(*trace)
+    assert result["lossless"] and result["delta_hz"] > 2 * result["packed_hz"]
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+@pytest.mark.parametrize("version", [1, 2, "delta"])
+def test_packed_stream(version): #ECD-4
+    from core.pty_device import PtyDevice
+    from core.serial_interface import SerialInterface
+    delta = version == "delta"
+    version = 2 if delta else version
+    with PtyDevice(rate=2000, burst=64, frame_version=version) as device:
+        iface = SerialInterface(device.port, frame_version=version)
+        batches = []
+        iface.egram_batch_callback = lambda ts, a, v: batches.append((a, v))
+        iface.connect()
+        try:
+            iface.request_egram(egram_codec.DEFAULT_SAMPLES_PER_FRAME, delta=delta)
+            deadline = time.time() + 2.0
+            while iface.egram_stats["samples"] < 512 and time.time() < deadline:
+                time.sleep(0.02)
+        finally:
+            iface.disconnect()
+    assert iface.egram_stats["samples"] >= 512 and iface.egram_stats["lost"] == 0
+    atrial = [x for a, _ in batches for x in a]
+    assert set(atrial) == {20, 200}
@@ -0,0 +1,75 @@
+import csv
+import os
+import numpy as np
+import pytest
+from core import egram, egram_export
+
+@pytest.fixture
+def tmp_file(tmp_path):
+    return lambda name: str(tmp_path / name)
+
+def _write_session(path, seconds=10, fs=100, chunk_size=128):
+    ts = np.arange(seconds * fs) / fs
+    with egram_export.ColumnarExporter(path, chunk_size=chunk_size) as exp:
+        # feed in odd-sized batches like the serial reader would
+        for i in range(0, len(ts), 37):
+            exp.write_batch(ts[i:i + 37], ts[i:i + 37] * 10, -ts[i:i + 37])
+    return ts
+
+def test_columnar_round_trip(tmp_file): #EXP-1
+    path = tmp_file("session.egc")
+    ts = _write_session(path)
+    with egram_export.ColumnarReader(path) as reader:
+        assert len(reader) == len(ts)
+        assert all(c.count <= 128 for c in reader.chunks)
+        out = [np.concatenate(col) for col in zip(*reader.query())]
+    assert np.array_equal(out[0], ts)
+    assert np.allclose(out[1], ts * 10, atol=1e-3)
+    assert np.allclose(out[2], -ts, atol=1e-3)
+
+def test_time_query_skips_chunks(tmp_file): #EXP-2
+    path = tmp_file("session.egc")
+    _write_session(path)
+    with egram_export.ColumnarReader(path) as reader:
+        touched = []
+        original = reader.read_chunk
+        reader.read_chunk = lambda info: touched.append(info) or original(info)
+        ts = np.concatenate([b[0] for b in reader.query(2.0, 3.0)])
+    assert ts[0] == pytest.approx(2.0) and ts[-1] == pytest.approx(3.0)
+    assert len(ts) == 101
+    assert len(touched) == 2  # 101 rows straddle at most two 128-row chunks
+
+def test_reader_without_index(tmp_file): #EXP-3
+    path = tmp_file("session.egc")
+    ts = _write_session(path)
+    # simulate a recording that was cut off before close() wrote the index
+    with open(path, "rb") as f:
+        data = f.read()
+    index_size = 8 * egram_export._INDEX_ENTRY.size + egram_export._TRAILER.size
+    with open(path, "wb") as f:
+        f.write(data[:-index_size])
+    with egram_export.ColumnarReader(path) as reader:
+        assert len(reader) == len(ts)
+
+    # a half-written last chunk is ignored
+    with open(path, "wb") as f:
+        f.write(data[:-(index_size + 10)])
+    with egram_export.ColumnarReader(path) as reader:
+        assert len(reader) == 7 * 128
+
+def test_export_buffer_to_csv(tmp_file): #EXP-4
+    buf = egram.EgramBuffer()
+    buf.add_batch([0.0, 0.5, 1.0], [1, 2, 3], [4, 5, 6])
+    path = tmp_file("session.csv")
+    assert egram_export.export_egram(buf, path, chunk_size=2) == 3
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == egram_export.CSV_HEADER
+    assert [float(x) for x in rows[3]] == [1.0, 3.0, 6.0]
+
+def test_rejects_foreign_file(tmp_file): #EXP-5
+    path = tmp_file("other.bin")
+    with open(path, "wb") as f:
+        f.write(b"not an egram file")
+    with pytest.raises(ValueError):
+        egram_export.ColumnarReader(path)
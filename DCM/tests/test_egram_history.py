@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from core import egram_history
+
+def _filled(n=10000, fs=100.0, batch=123):
+    hist = egram_history.EgramHistory()
+    ts = np.arange(n) / fs
+    vals = np.sin(ts)
+    for i in range(0, n, batch):
+        hist.add_batch(ts[i:i + batch], vals[i:i + batch], -vals[i:i + batch])
+    return hist, ts, vals
+
+def test_get_range_is_view(): #HIS-1
+    hist, ts, vals = _filled()
+    t, v = hist.get_range("atrial", 10.0, 12.0)
+    assert t[0] == pytest.approx(10.0) and t[-1] == pytest.approx(12.0)
+    assert len(t) == 201
+    assert np.allclose(v, vals[1000:1201])
+    assert np.shares_memory(v, hist.values["atrial"].data)
+
+def test_views_survive_growth(): #HIS-2
+    hist = egram_history.EgramHistory()
+    hist.add_batch([0.0, 1.0], [1, 2], [3, 4])
+    t, v = hist.get_range("ventricular")
+    hist.add_batch(np.arange(2, 5000), np.zeros(4998), np.zeros(4998))
+    assert list(v) == [3, 4]
+    assert len(hist) == 5000
+
+def test_summary_envelope(): #HIS-3
+    hist, ts, vals = _filled()
+    t, lo, hi = hist.get_summary("ventricular", max_points=500)
+    assert len(t) <= 500
+    assert lo.min() == pytest.approx((-vals).min())
+    assert hi.max() == pytest.approx((-vals).max())
+    assert np.all(lo <= hi)
+
+    # a narrow window is served from raw samples
+    t, lo, hi = hist.get_summary("atrial", 5.0, 6.0, max_points=500)
+    assert len(t) == 101 and np.array_equal(lo, hi)
+
+def test_out_of_order_timestamps_are_clamped(): #HIS-4
+    hist = egram_history.EgramHistory()
+    hist.add_batch([1.0, 2.0], [0, 0], [0, 0])
+    hist.add_batch([1.5, 3.0], [0, 0], [0, 0])
+    t, _ = hist.get_range("atrial")
+    assert list(t) == [1.0, 2.0, 2.0, 3.0]
+    with pytest.raises(ValueError):
+        hist.get_range("surface", 0, 1)
+
+def test_mismatched_columns_are_rejected(): #HIS-5
+    hist = egram_history.EgramHistory()
+    hist.add_batch([0.0, 1.0], [1, 2], [3, 4])
+    with pytest.raises(ValueError):
+        hist.add_batch([2.0, 3.0], [5], [6, 7])
+    assert len(hist) == 2 and len(hist.values["atrial"].view()) == 2
+    hist.clear()
+    assert len(hist) == 0 and hist.levels == [] and hist.time_span() == (0.0, 0.0)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+tk = pytest.importorskip("tkinter")
+from gui.egram_raster import TRACE_COLORS, RasterEgram, SweepEgram
+
+def trace_rows(raster, channel, column):
+    hit = np.all(raster.pixels[:, column] == TRACE_COLORS[channel], axis=1)
+    return np.flatnonzero(hit)
+
+def test_spike_survives_decimation(): #RST-1
+    raster = RasterEgram(100, 200, samples_per_column=10)
+    atrial = np.zeros(1000)
+    atrial[555] = 4095                          # one sample wide
+    assert raster.push(atrial, np.full(1000, 2000)) == 100
+    rows = trace_rows(raster, 'atrial', 55)
+    assert rows.min() == 50 and rows.max() == 100   # full-scale is h/4 above centre
+    assert trace_rows(raster, 'atrial', 30).tolist() == [100]
+
+def test_scroll_draws_only_new_columns(): #RST-2
+    raster = RasterEgram(50, 80)
+    raster.push(np.full(50, 4095), np.full(50, 2000))
+    before = raster.pixels.copy()
+    assert raster.push([0] * 5, [2000] * 5) == 5
+    assert np.array_equal(raster.pixels[:, :45], before[:, 5:])
+    assert raster.columns == 55
+    # the first new column joins the old level down to the new one
+    assert trace_rows(raster, 'atrial', 45).tolist() == list(range(20, 41))
+
+def test_partial_columns_wait(): #RST-3
+    raster = RasterEgram(20, 40, samples_per_column=4)
+    assert raster.push([1, 2, 3], [1, 2, 3]) == 0
+    assert raster.push([4, 5], [4, 5]) == 1
+    assert len(raster._pending['atrial']) == 1
+    # more than a screenful in one go keeps only the newest columns
+    assert raster.push(np.zeros(400), np.zeros(400)) == 100
+    assert raster.columns == 101
+
+def test_ppm_blit(): #RST-4
+    raster = RasterEgram(30, 20)
+    raster.push(np.arange(30) * 100, np.arange(30) * 100)
+    data = raster.ppm()
+    assert data.startswith(b"P6 30 20 255\n") and len(data) == len(b"P6 30 20 255\n") + 30 * 20 * 3
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    try:
+        photo = tk.PhotoImage(width=30, height=20)
+        raster.blit(photo)
+        assert photo.get(29, 10) == tuple(int(c) for c in raster.pixels[10, 29])
+        sweep = SweepEgram(30, 20, seconds=1.0)
+        sweep.push(np.arange(0, 0.5, 0.01), np.full(50, 4095), np.zeros(50))
+        sweep.blit(photo)
+        assert photo.get(5, 5) == tuple(int(c) for c in sweep.pixels[5, 5]) and not sweep.dirty
+    finally:
+        root.destroy()
+
+def test_sweep_draws_in_place(): #RST-5
+    sweep = SweepEgram(100, 80, seconds=1.0, erase=10)      # 100 columns per second
+    t = np.arange(0, 0.5, 0.001)
+    assert sweep.push(t, np.full(len(t), 4095), np.full(len(t), 2000)) == 49
+    assert sweep.dirty == [(0, 100), (0, 59)]               # first frame, then columns plus erase bar
+    sweep.dirty = []
+    before = sweep.pixels.copy()
+    t = np.arange(0.5, 0.6, 0.001)
+    assert sweep.push(t, np.zeros(len(t)), np.full(len(t), 2000)) == 10
+    # earlier columns stay where they were; only the new ones and the bar change
+    assert sweep.dirty == [(49, 69)]
+    assert np.array_equal(sweep.pixels[:, :49], before[:, :49])
+    assert trace_rows(sweep, 'atrial', 55).tolist() == [40]
+    assert len(trace_rows(sweep, 'atrial', 65)) == 0         # erased ahead of the trace
+
+def test_sweep_wraps_and_fills_gaps(): #RST-6
+    sweep = SweepEgram(100, 80, seconds=1.0, erase=5)
+    sweep.push([0.0], [0], [2000])
+    # sparse samples: the columns between them are interpolated, not left blank
+    t = np.arange(0.1, 1.3, 0.05)
+    sweep.push(t, np.full(len(t), 4095), np.full(len(t), 2000))
+    # 1.25 s is still filling and 1.21-1.24 s have no sample yet
+    assert sweep.last_column == 120
+    assert all(len(trace_rows(sweep, 'atrial', x)) for x in range(100))
+    assert sweep.dirty[-2:] == [(21, 100), (0, 21)]
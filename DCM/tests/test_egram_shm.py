@@ -0,0 +1,70 @@
+import pytest
+from core import egram_shm
+
+@pytest.fixture
+def ring():
+    r = egram_shm.SharedEgramRing.create(capacity=8)
+    yield r
+    r.close()
+    r.unlink()
+
+def test_reader_follows_writer(ring): #SHM-1
+    reader = ring.reader()
+    ring.write([1.0, 2.0, 3.0], [10, 20, 30], [-1, -2, -3])
+
+    ts, a, v = reader.read()
+    assert list(ts) == [1.0, 2.0, 3.0]
+    assert list(a) == [10, 20, 30]
+    assert list(v) == [-1, -2, -3]
+
+    ts, a, v = reader.read()
+    assert len(ts) == 0
+
+def test_multiple_readers_attach_by_name(ring): #SHM-2
+    other = egram_shm.SharedEgramRing.attach(ring.name)
+    r1 = ring.reader()
+    r2 = other.reader()
+
+    ring.write([1.0, 2.0], [5, 6], [7, 8])
+    assert list(r1.read()[1]) == [5, 6]
+    assert list(r2.read()[2]) == [7, 8]
+    other.close()
+
+def test_wraparound_and_overrun(ring): #SHM-3
+    reader = ring.reader()
+    ring.write(range(6), range(6), range(6))
+    assert list(reader.read()[1]) == [0, 1, 2, 3, 4, 5]
+
+    # wraps the end of the ring, reader is still within one lap
+    ring.write(range(6, 12), range(6, 12), range(6, 12))
+    assert list(reader.read()[1]) == [6, 7, 8, 9, 10, 11]
+
+    # writer laps the reader, the oldest samples are reported as dropped
+    ring.write(range(12, 24), range(12, 24), range(12, 24))
+    ts, a, v = reader.read()
+    assert list(a) == list(range(16, 24))
+    assert reader.dropped == 4
+
+def test_attach_rejects_foreign_segment(): #SHM-4
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=256)
+    try:
+        with pytest.raises(ValueError):
+            egram_shm.SharedEgramRing.attach(shm.name)
+    finally:
+        shm.close()
+        shm.unlink()
+
+def test_published_ring_is_found_by_name(ring, tmp_path): #SHM-5
+    path = str(tmp_path / "ring")
+    with pytest.raises(FileNotFoundError):
+        egram_shm.attach_published(path)
+    egram_shm.publish_ring(ring, path)
+    other = egram_shm.attach_published(path)
+    reader = other.reader()
+    ring.write([1.0], [2.0], [3.0])
+    assert list(reader.read()[1]) == [2.0]
+    other.close()
+    egram_shm.unpublish_ring(ring, path)
+    with pytest.raises(FileNotFoundError):
+        egram_shm.attach_published(path)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from core.egram_export import ColumnarReader
+from core.egram_trigger import RingBuffer, Trigger, TriggerEngine, _TriggerState, evaluate, save_snapshot
+
+def feed_in_batches(func, t, values, batch):
+    out = []
+    for i in range(0, len(t), batch):
+        out += list(func(t[i:i + batch], values[i:i + batch]))
+    return out
+
+def test_level_and_slope_across_batches(): #TRG-1
+    t = np.arange(100) / 1000.0
+    values = np.where((t >= 0.032) & (t < 0.060), 3000.0, 1000.0)   # edges on a batch boundary
+    for kind, threshold, direction, expected in [("level", 2000, "rising", [0.032]),
+                                                 ("level", 2000, "either", [0.032, 0.060]),
+                                                 ("slope", 1e6, "falling", [0.060])]:
+        trigger = Trigger(kind, "atrial", threshold, direction=direction)
+        state = _TriggerState()
+        fired = feed_in_batches(lambda tb, vb: evaluate(trigger, state, tb, vb), t, values, 32)
+        assert fired == pytest.approx(expected)
+    with pytest.raises(ValueError):
+        Trigger("level", "aorta", 1)
+    with pytest.raises(ValueError):
+        Trigger("rate", "atrial", 1, low_bpm=100, high_bpm=60)
+
+def test_rate_out_of_range(): #TRG-2
+    rate = 1000.0
+    beats = [0.0, 1.0, 2.0, 2.3, 2.35, 3.3, 6.0]           # 2.35 is inside the refractory period
+    t = np.arange(int(7 * rate)) / rate
+    values = np.zeros(len(t))
+    for b in beats:
+        values[int(b * rate) + 1:int(b * rate) + 11] = 3000
+    trigger = Trigger("rate", "ventricular", 1500, low_bpm=40, high_bpm=150)
+    state = _TriggerState()
+    fired = feed_in_batches(lambda tb, vb: evaluate(trigger, state, tb, vb), t, values, 50)
+    # 2.3 follows 2.0 at 200 bpm; nothing after 3.3 for 1.5 s is a lost beat, reported once
+    assert fired == pytest.approx([2.301, 3.301 + 1.5], abs=1e-6)
+
+def test_capture_window_and_holdoff(): #TRG-3
+    rate = 1000.0
+    t = 100 + np.arange(int(10 * rate)) / rate
+    atrial = np.zeros(len(t))
+    atrial[[3000, 3500, 7000]] = 4000                       # 3500 falls inside the holdoff
+    engine = TriggerEngine([Trigger("level", "atrial", 2000)], pre=0.5, post=1.0, sample_rate=rate)
+    captured = []
+    engine.capture_callback = captured.append
+    returned = feed_in_batches(lambda tb, ab: engine.feed(tb, ab, ab * 0), t, atrial, 64)
+    assert returned == captured and len(captured) == 2
+    first = captured[0]
+    assert first.time == pytest.approx(103.0) and first.complete
+    assert first.timestamps[0] == pytest.approx(102.5) and first.timestamps[-1] == pytest.approx(104.0)
+    assert len(first.atrial) == 1501 and first.atrial.max() == 4000
+    assert captured[1].time == pytest.approx(107.0)
+    assert engine.stats["fired"] == 2 and engine.stats["samples"] == len(t)
+
+def test_ring_buffer_and_save(tmp_path): #TRG-4
+    ring = RingBuffer(100)
+    t = np.arange(250, dtype=np.float64)
+    for i in range(0, 250, 30):
+        ring.extend(t[i:i + 30], t[i:i + 30] * 2, -t[i:i + 30])
+    ts, a, v = ring.ordered()
+    assert np.array_equal(ts, t[150:]) and np.array_equal(a, ts * 2) and ring.oldest() == 150
+    ring.extend(t + 1000, t, t)                             # bigger than the ring
+    assert np.array_equal(ring.ordered()[0], t[150:] + 1000)
+
+    engine = TriggerEngine([Trigger("level", "ventricular", 0.5)], pre=20, post=10, capacity=25)
+    snapshot, = feed_in_batches(lambda tb, vb: engine.feed(tb, tb * 0, vb), t, (t > 100).astype(float), 10)
+    assert snapshot.time == 101 and not snapshot.complete   # the ring lost the start of the window
+    assert snapshot.timestamps[0] == 95 and snapshot.timestamps[-1] == 111
+    path = save_snapshot(snapshot, str(tmp_path / "captures"))
+    assert path.endswith("_ventricular_level.egc")
+    with ColumnarReader(path) as reader:
+        stored = np.concatenate([batch[0] for batch in reader.query()])
+    assert np.array_equal(stored, snapshot.timestamps)
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from core import egram, filters
+
+FS = 1000.0
+
+def _tone(freq, seconds=2.0, offset=0.0):
+    t = np.arange(int(FS * seconds)) / FS
+    return offset + np.sin(2 * np.pi * freq * t)
+
+def test_chunked_matches_one_shot(): #FLT-1
+    x = np.column_stack((_tone(5, offset=100), _tone(60, offset=-50)))
+    whole = filters.default_filter_bank(FS).process(x)
+
+    bank = filters.default_filter_bank(FS)
+    parts = [bank.process(x[i:i + 37]) for i in range(0, len(x), 37)]
+    assert np.allclose(np.concatenate(parts), whole)
+
+def test_notch_removes_mains(): #FLT-2
+    stage = filters.FirStage(filters.notch_taps(60.0, FS))
+    out = stage.process(_tone(60)[:, None])
+    settled = out[stage.delay * 2:]
+    assert np.max(np.abs(settled)) < 0.05
+
+    # a 10 Hz signal passes through untouched
+    stage.reset()
+    out = stage.process(_tone(10)[:, None])[stage.delay * 2:]
+    assert np.max(np.abs(out)) == pytest.approx(1.0, abs=0.05)
+
+def test_baseline_removal(): #FLT-3
+    t = np.arange(4000) / FS
+    drift = 300 + 50 * t  # offset plus slow ramp
+    stage = filters.BaselineStage(401)
+    out = stage.process(drift[:, None])
+    assert np.max(np.abs(out[400:])) < 1e-6
+
+def test_pipe_into_egram_buffer(): #FLT-4
+    buf = egram.EgramBuffer(maxlen=100)
+    bank = filters.FilterBank([filters.FirStage([0.5, 0.5])])
+    callback = bank.pipe(buf.add_batch)
+    callback([0.0, 0.1, 0.2], [2, 4, 6], [0, 0, 10])
+
+    assert [s.value for s in buf.get_all("atrial")] == [2.0, 3.0, 5.0]
+    assert [s.value for s in buf.get_all("ventricular")] == [0.0, 0.0, 5.0]
+    assert [s.timestamp for s in buf.get_all("atrial")] == [0.0, 0.1, 0.2]
+
+def test_output_stamped_at_input_time(): #FLT-6
+    bank = filters.default_filter_bank(FS)
+    t = 100.0 + np.arange(3000) / FS
+    x = np.zeros(len(t))
+    x[1500] = 1000.0                                   # impulse at t = 101.5 s
+    times, out = [], []
+    for i in range(0, len(t), 64):
+        ts, a, _ = bank.process_batch(t[i:i + 64], x[i:i + 64], x[i:i + 64])
+        times += ts
+        out.append(a)
+    out = np.concatenate(out)
+    # the first `delay` samples are swallowed by the filters filling up
+    assert len(times) == len(out) == len(t) - bank.delay
+    assert times[0] == t[0]
+    assert times[int(np.argmax(np.abs(out)))] == pytest.approx(101.5)
+
+def test_iir_notch(): #FLT-7
+    stage = filters.IirStage(filters.notch_sos(60.0, FS))
+    assert np.max(np.abs(stage.process(_tone(60)[:, None])[500:])) < 0.01
+    stage.reset()
+    assert np.max(np.abs(stage.process(_tone(10)[:, None])[500:])) == pytest.approx(1.0, abs=0.01)
+    # the stop band is 2 * width wide at -3 dB
+    stage.reset()
+    assert np.max(np.abs(stage.process(_tone(56)[:, None])[1000:])) == pytest.approx(0.707, abs=0.03)
+    # primed with the first sample: a DC offset passes without ringing
+    stage.reset()
+    assert np.allclose(stage.process(np.full((50, 2), [300.0, -50.0])), [300.0, -50.0])
+    with pytest.raises(ValueError):
+        filters.notch_sos(600.0, FS)
+
+def test_default_bank_passband(): #FLT-8
+    # P/T-wave and low-frequency egram content must survive the default bank
+    for freq in (1, 2, 5, 10, 40):
+        bank = filters.default_filter_bank(FS)
+        out = bank.process(np.column_stack((_tone(freq, 6.0), _tone(freq, 6.0))))
+        assert np.max(np.abs(out[3000:])) == pytest.approx(1.0, abs=0.05), freq
+
+def test_iir_blocks_match_sample_loop(): #FLT-9
+    x = np.random.default_rng(0).normal(100.0, 50.0, size=(1000, 2))
+    sos = filters.notch_sos(60.0, FS)
+    b0, b1, b2, _, a1, a2 = sos[0]
+    stage = filters.IirStage(sos, block=16)
+    expected = np.empty_like(x)
+    for c in range(2):
+        z1, z2 = stage._prime(x[0])[0, c]
+        for i, v in enumerate(x[:, c]):
+            y = b0 * v + z1
+            z1, z2 = b1 * v - a1 * y + z2, b2 * v - a2 * y
+            expected[i, c] = y
+    out = np.concatenate([stage.process(x[i:i + 37]) for i in range(0, len(x), 37)])
+    assert np.allclose(out, expected)
@@ -0,0 +1,69 @@
+import binascii
+import os
+import pytest
+from core import framing
+from core.framing import FrameDecoder, encode_frame
+
+def test_table_crc_matches_reference(): #FRM-1
+    data = bytes(range(256)) * 3
+    assert framing.crc16(data) == binascii.crc_hqx(data, 0xFFFF)
+    assert framing.crc16(b"123456789") == 0x29B1      # CRC-16/CCITT-FALSE check value
+    assert framing.crc8(b"123456789") == 0xF4         # CRC-8 (poly 0x07) check value
+    with pytest.raises(ValueError):
+        encode_frame(0xE0, bytes(256))
+
+def test_round_trip_split_reads(): #FRM-2
+    frames = [(0xE0, bytes(range(21))), (0xAA, b""), (0x67, b"\x16\xa5" * 10)]
+    stream = b"".join(encode_frame(cmd, payload) for cmd, payload in frames)
+    decoder = FrameDecoder()
+    out = []
+    for i in range(0, len(stream), 3):
+        out += decoder.feed(stream[i:i + 3])
+    assert out == frames
+    assert decoder.stats["discarded"] == 0 and not decoder.buffer
+
+def test_resync_after_corruption(): #FRM-3
+    good = [encode_frame(0xE0, bytes([i]) * 21) for i in range(10)]
+    stream = bytearray(b"".join(good))
+    stream[len(good[0]) * 3 + 6] ^= 0x10              # payload byte of the 4th frame
+    decoder = FrameDecoder(accept_v1=False)
+    out = decoder.feed(bytes(stream))
+    assert [p[0] for _, p in out] == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+    assert decoder.stats["crc_errors"] == 1
+    # only the damaged frame is skipped, never more
+    assert decoder.stats["discarded"] == len(good[3])
+
+def test_mixed_v1_and_v2(): #FRM-4
+    decoder = FrameDecoder({0xE0: 21, 0xAA: 0})
+    v1_egram = bytes((framing.START_BYTE, 0xE0)) + bytes(19) + bytes((7, 9))
+    stream = b"\x00\x42" + v1_egram + encode_frame(0x67, b"abc") + bytes((framing.START_BYTE, 0xAA))
+    assert decoder.feed(stream) == [(0xE0, bytes(19) + bytes((7, 9))), (0x67, b"abc"), (0xAA, b"")]
+    assert decoder.stats == {"frames": 1, "v1_frames": 2, "discarded": 2,
+                             "header_errors": 0, "crc_errors": 0}
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+def test_v2_link(): #FRM-5
+    from core.pty_device import PtyDevice
+    from core.serial_interface import SerialInterface
+    with PtyDevice(frame_version=2) as device:
+        iface = SerialInterface(device.port, frame_version=2)
+        iface.connect()
+        try:
+            iface.send_parameters({"LRL": 70, "URL": 120}, 3)
+            mode, values = iface.read_parameters()
+            assert mode == 3 and values["LRL"] == 70
+            assert iface.decoder.stats["frames"] >= 1 and iface.decoder.stats["v1_frames"] == 0
+        finally:
+            iface.disconnect()
+
+def test_v2_link_ignores_v1_inside_damaged_frame(): #FRM-6
+    from core.serial_interface import CMD_ACK, SerialInterface
+    # a v1 ACK (0x16 0xAA) hidden in a payload, then the frame's CRC is broken
+    damaged = bytearray(encode_frame(0x67, b"\x01\x16\xaa\x02"))
+    damaged[-1] ^= 0xFF
+    stream = bytes(damaged) + encode_frame(0xE0, bytes(21))
+    iface = SerialInterface("unused", frame_version=2)
+    assert iface.decoder.feed(stream) == [(0xE0, bytes(21))]
+    assert iface.decoder.stats["v1_frames"] == 0 and iface.decoder.stats["crc_errors"] == 1
+    # the same bytes on a v1 link would have produced a spurious ACK
+    assert (CMD_ACK, b"") in SerialInterface("unused").decoder.feed(stream)
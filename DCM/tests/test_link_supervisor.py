@@ -0,0 +1,130 @@
+import os
+import time
+import pytest
+from core.link_supervisor import STATE_CONNECTED, STATE_RECONNECTING, STATE_STOPPED, LinkSupervisor
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+
+def wait_for(cond, timeout=3.0):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+@pytest.fixture
+def board():
+    """a PtyDevice that can be unplugged and plugged back in (under a new name)"""
+    from core.pty_device import PtyDevice
+    devices = [PtyDevice()]
+    yield devices
+    for d in devices:
+        d.close()
+
+def connect(port, tx_queue):
+    from core.serial_interface import SerialInterface
+    iface = SerialInterface(port)
+    iface.connect(tx_queue=tx_queue)
+    return iface
+
+@pytest.mark.parametrize("tx_queue", [False, True])
+def test_replug_restores_parameters_and_stream(board, tx_queue): #LNK-1
+    from core.pty_device import PtyDevice
+    iface = connect(board[0].port, tx_queue)
+    states = []
+    supervisor = LinkSupervisor(iface, find_port=lambda: board[-1].port if board[-1]._running else None)
+    supervisor.state_callback = lambda state, detail: states.append(state)
+    supervisor.start()
+    try:
+        acked = []
+        iface.ack_callback = lambda: acked.append(1)
+        iface.send_parameters({"LRL": 72, "URL": 130}, 2)
+        assert wait_for(lambda: acked)
+        iface.request_egram()
+        assert wait_for(iface.egram_seen.is_set)
+
+        board[0].close()                       # cable pulled
+        assert wait_for(lambda: states == [STATE_RECONNECTING])
+        time.sleep(0.2)
+        board.append(PtyDevice())              # board comes back
+        assert wait_for(lambda: supervisor.state == STATE_CONNECTED)
+        assert [mode for mode, _ in board[1].received] == [2]
+        assert board[1].params["LRL"] == 72 and board[1].params["URL"] == 130
+        assert board[1].streaming
+        record = supervisor.history[0]
+        assert record["attempts"] > 1 and record["open_to_egram_s"] < 1.0
+    finally:
+        supervisor.stop()
+        iface.disconnect()
+    assert states[-1] == STATE_STOPPED and iface.link_lost_callback is None
+
+def test_backoff_is_bounded(board): #LNK-2
+    iface = connect(board[0].port, False)
+    calls = []
+    supervisor = LinkSupervisor(iface, find_port=lambda: calls.append(time.perf_counter()),
+                                min_backoff=0.01, max_backoff=0.04)
+    supervisor.start()
+    board[0].close()
+    time.sleep(0.5)
+    supervisor.stop()
+    gaps = [b - a for a, b in zip(calls, calls[1:])]
+    assert len(calls) > 8 and max(gaps) < 0.1 and gaps[0] < gaps[-1]
+
+def test_no_supervisor_keeps_old_behaviour(board): #LNK-3
+    iface = connect(board[0].port, False)
+    board[0].close()
+    time.sleep(0.1)
+    assert iface.running                       # still retrying, nothing reconnects it
+    iface.disconnect()
+
+def test_failed_repush_retries(board): #LNK-4
+    from core.pty_device import PtyDevice
+    iface = connect(board[0].port, False)
+    supervisor = LinkSupervisor(iface, find_port=lambda: board[-1].port if board[-1]._running else None,
+                                min_backoff=0.01, max_backoff=0.05)
+    states = []
+    supervisor.state_callback = lambda state, detail: states.append((state, detail))
+    supervisor.start()
+    try:
+        acked = []
+        iface.ack_callback = lambda: acked.append(1)
+        iface.send_parameters({"LRL": 72}, 2)
+        assert wait_for(lambda: acked)
+
+        send = iface.send_parameters
+        failures = []
+        def flaky_send(*args):
+            if not failures:
+                failures.append(args)
+                raise OSError("port dropped during recovery")
+            return send(*args)
+        iface.send_parameters = flaky_send
+
+        board[0].close()
+        board.append(PtyDevice())
+        assert wait_for(lambda: failures and supervisor.history)
+        assert supervisor.state == STATE_CONNECTED
+        assert supervisor._thread.is_alive()   # survived the failed re-push
+        assert wait_for(lambda: board[1].params.get("LRL") == 72)
+        assert supervisor.history[0]["attempts"] >= 2
+        assert (STATE_RECONNECTING, "port dropped during recovery") in states
+    finally:
+        supervisor.stop()
+        iface.disconnect()
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_programming_errors_stop_the_supervisor(board): #LNK-5
+    iface = connect(board[0].port, False)
+    states = []
+    supervisor = LinkSupervisor(iface, find_port=lambda: board[0].port, min_backoff=0.01)
+    supervisor.state_callback = lambda state, detail: states.append((state, detail))
+    calls = []
+    def broken(port=None):
+        calls.append(port)
+        raise TypeError("bug in reconnect")
+    iface.reconnect = broken
+    supervisor.start()
+    board[0].close()
+    assert wait_for(lambda: states and states[-1][0] == STATE_STOPPED)
+    assert states[-1][1] == "bug in reconnect" and len(calls) == 1   # not retried
+    supervisor.stop()
+    iface.disconnect()
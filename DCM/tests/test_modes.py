@@ -34,3 +34,15 @@ def test_future_mode_extension(): #MOD-4
    
 
 
+
+def test_lookup_tables(): #MOD-5
+    for mode in modes.PaceMakerMode:
+        assert modes.mode_from_id(modes.mode_id(mode)) is mode
+        assert modes.parse_mode(mode) is modes.MODE_INFO[mode]
+        assert modes.parse_mode(mode.value.lower()) is modes.MODE_INFO[mode]
+    assert modes.REQUIRED_PARAMS[modes.PaceMakerMode.VVI] == (
+        "LRL", "URL", "ventricular_amp", "ventricular_width", "ventricular_sensitivity", "VRP")
+    with pytest.raises(TypeError):
+        modes.MODE_IDS[modes.PaceMakerMode.AOO] = 5
+    with pytest.raises(ValueError):
+        modes.mode_from_id(42)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from core import pacing_sim
+from core.params import Parameters
+
+@pytest.fixture
+def base(param_values):
+    return dict(param_values, MSR=150)
+
+def reference_sensor_rate(p, activity, dt):
+    """one parameter set, one step at a time"""
+    threshold = pacing_sim.ACTIVITY_THRESHOLDS_G[p["activity_threshold"] - 1]
+    span = p["MSR"] - p["LRL"]
+    rate, out = p["LRL"], []
+    for a in activity:
+        target = p["LRL"] + min(max(pacing_sim.RESPONSE_GAIN * p["response_factor"] * (a - threshold), 0), span)
+        step = target - rate
+        rate += min(max(step, -span / (p["recovery_time"] * 60) * dt), span / p["reaction_time"] * dt)
+        out.append(rate)
+    return np.array(out)
+
+def test_sensor_rate_matches_reference(base): #PSM-1
+    rng = np.random.default_rng(0)
+    n = 40
+    table = dict(base, response_factor=rng.integers(1, 17, n), activity_threshold=rng.integers(1, 8, n),
+                 reaction_time=rng.integers(10, 51, n), recovery_time=rng.integers(2, 17, n))
+    activity = np.stack([pacing_sim.synthetic_activity(1800, seed=s) for s in range(3)])
+    rates = pacing_sim.sensor_rate(table, activity)
+    assert rates.shape == (3 * n, 1800)
+    for m in range(3):
+        for i in (0, 17, n - 1):
+            row = {k: (v[i] if np.ndim(v) else v) for k, v in table.items()}
+            assert np.allclose(rates[m * n + i], reference_sensor_rate(row, activity[m], 1.0), atol=1e-3)
+
+    # LRL to MSR takes reaction_time, MSR back to LRL takes recovery_time
+    step = np.r_[np.full(100, 1.0), np.zeros(400)]
+    rate = pacing_sim.sensor_rate(Parameters(**base), step)[0]
+    assert rate[29] == pytest.approx(150) and rate[28] < 150
+    assert rate[100 + 299] == pytest.approx(60) and rate[100 + 298] > 60
+    with pytest.raises(ValueError):
+        pacing_sim.sensor_rate({"LRL": 60}, step)
+
+def test_single_chamber_modes(base): #PSM-2
+    rest = np.zeros(60)
+    fast_sinus = dict(intrinsic_rate=80.0)
+    aai = pacing_sim.simulate(base, "AAI", rest, **fast_sinus)
+    assert not aai["atrial_paced"].any() and np.all(aai["atrial_rate"] == 80)
+    aoo = pacing_sim.simulate(base, "AOO", rest, **fast_sinus)
+    assert aoo["atrial_paced"].all() and np.all(aoo["atrial_rate"] == 60)
+    # complete heart block: VVIR paces at the sensor rate over the escape rhythm
+    run = np.r_[np.zeros(30), np.full(60, 0.8)]
+    vvir = pacing_sim.simulate(base, "VVIR", run, intrinsic_rate=70.0, conduction=False)
+    assert vvir["ventricular_paced"].all()
+    assert vvir["ventricular_rate"][0, 0] == 60 and vvir["ventricular_rate"][0, -1] == 150
+    vvi = pacing_sim.simulate(base, "VVI", run, intrinsic_rate=70.0, conduction=False)
+    assert np.all(vvi["sensor_rate"] == 60)           # no rate response without R
+    # a sinus rhythm inside VRP isn't sensed
+    vvi = pacing_sim.simulate(dict(base, VRP=500), "VVI", rest, intrinsic_rate=130.0)
+    assert vvi["ventricular_paced"].all()
+
+def test_dual_chamber_tracking_and_block(base): #PSM-3
+    sinus = np.arange(50.0, 200.0)                    # ramp through URL and the 2:1 point
+    result = pacing_sim.simulate(base, "DDDR", np.zeros(len(sinus)), intrinsic_rate=sinus)
+    block, v = result["block"][0], result["ventricular_rate"][0]
+    two_to_one = 60000.0 / (base["AV_delay"] + base["PVARP"])    # 150 ppm
+    assert np.all(result["atrial_paced"][0] == (sinus <= 60))
+    assert np.all(block[sinus <= 120] == pacing_sim.BLOCK_NONE)
+    assert np.all(block[(sinus > 120) & (sinus < two_to_one)] == pacing_sim.BLOCK_WENCKEBACH)
+    assert np.all(block[sinus >= two_to_one] == pacing_sim.BLOCK_2_TO_1)
+    assert np.all(v[(sinus > 60) & (sinus <= 120)] == sinus[(sinus > 60) & (sinus <= 120)])
+    assert np.all(v[block == pacing_sim.BLOCK_WENCKEBACH] == 120)
+    assert np.all(v[block == pacing_sim.BLOCK_2_TO_1] == sinus[block == pacing_sim.BLOCK_2_TO_1] / 2)
+    # the AV delay runs out before the 160 ms PR: every beat is paced
+    assert result["ventricular_paced"].all()
+    # AV delay longer than the PR: tracked beats conduct on their own
+    long_av = pacing_sim.simulate(dict(base, AV_delay=200), "DDDR", np.zeros(len(sinus)), intrinsic_rate=sinus)
+    tracked = long_av["block"][0] == pacing_sim.BLOCK_NONE
+    assert not long_av["ventricular_paced"][0][tracked].any() and long_av["ventricular_paced"][0][~tracked].all()
+
+def test_screen_grid(base): #PSM-4
+    axes = {"response_factor": [1, 8, 16], "MSR": [130, 150, 190]}     # MSR 190 is out of range
+    activity = np.stack([np.full(600, 0.02), np.r_[np.zeros(60), np.full(540, 0.8)]])
+    out = pacing_sim.screen(base, axes, "DDDR", activity, chunk_size=4)
+    assert out["index"].tolist() == [0, 1, 3, 4, 6, 7]
+    assert out["peak_sensor_rate"].shape == (2, 6)
+    assert np.all(out["peak_sensor_rate"][0] == 60) and np.all(out["time_at_msr_s"][0] == 0)
+    # factor 1 only adds 30 ppm/g x 0.66 g above threshold, the others reach MSR
+    assert out["peak_sensor_rate"][1, :2] == pytest.approx([79.8, 79.8])
+    assert out["peak_sensor_rate"][1, 2:].tolist() == [130, 150] * 2
+    # more response factor, more time spent at MSR
+    at_msr = out["time_at_msr_s"][1].reshape(3, 2)
+    assert np.all(np.diff(at_msr, axis=0) >= 0) and at_msr[0, 1] < at_msr[2, 1]
+    single = pacing_sim.screen(base, axes, "DDDR", activity[1])
+    assert np.array_equal(single["mean_rate"], out["mean_rate"][1])
@@ -0,0 +1,61 @@
+import pytest
+from core import param_journal, storage
+
+@pytest.fixture
+def journal(test_db):
+    engine = storage.StorageEngine(test_db)
+    yield param_journal.ParameterJournal(engine)
+    engine.close()
+
+BASE = {"LRL": 60, "URL": 120, "atrial_amp": 3.5}
+
+def test_only_diffs_are_stored(journal): #JRN-1
+    journal.record(BASE, mode="AAI", at=100.0)
+    journal.record({**BASE, "LRL": 70}, mode="AAI", at=200.0)
+    assert journal.record({**BASE, "LRL": 70}, mode="AAI", at=250.0) is None  # no change
+
+    entries = journal.changes(0, 1000)
+    assert entries[0]["snapshot"] and entries[0]["fields"] == BASE
+    assert not entries[1]["snapshot"] and entries[1]["fields"] == {"LRL": 70}
+
+def test_point_in_time_lookup(journal): #JRN-2
+    for i in range(40):
+        journal.record({**BASE, "LRL": 60 + i}, mode="VVI" if i % 2 else "AAI", at=float(i))
+
+    assert journal.at(-1.0) is None
+    params, mode = journal.at(25.5)
+    assert params["LRL"] == 85 and mode == "VVI"
+    assert journal.at(1000.0)[0]["LRL"] == 99
+
+    # snapshots bound the replay
+    snapshots = [e for e in journal.changes(-1, 100) if e["snapshot"]]
+    assert len(snapshots) == 40 // param_journal.SNAPSHOT_INTERVAL + 1
+
+def test_state_survives_restart(journal): #JRN-3
+    journal.record(BASE, at=1.0)
+    journal.record({**BASE, "URL": 130}, at=2.0)
+    reopened = param_journal.ParameterJournal(journal.engine)
+    assert reopened.record({**BASE, "URL": 130}, at=3.0) is None
+    reopened.record({**BASE, "URL": 140}, at=4.0)
+    assert reopened.changes(3.5, 5)[0]["fields"] == {"URL": 140}
+
+def test_align_with_egram(journal): #JRN-4
+    journal.record(BASE, mode="AAI", at=10.0)
+    journal.record({**BASE, "LRL": 80}, mode="AAI", at=20.0)
+    segments = journal.segments(15.0, 30.0)
+    assert [s[0] for s in segments] == [15.0, 20.0]
+    assert segments[1][1]["LRL"] == 80
+
+    idx = param_journal.align(segments, [14.0, 15.0, 19.9, 20.0, 29.0])
+    assert list(idx) == [-1, 0, 0, 1, 1]
+
+def test_second_process_is_not_overwritten(journal, test_db): #JRN-5
+    other = param_journal.ParameterJournal(storage.StorageEngine(test_db))
+    journal.record(BASE, username="a", at=1.0)
+    other.record({**BASE, "LRL": 90}, username="b", at=2.0)      # e.g. a second DCM window
+    # back at LRL 60: a diff against the stale cached state would store nothing
+    assert journal.record(BASE, username="b", at=3.0) is not None
+    assert journal.at(3.0)[0]["LRL"] == 60 and other.at(2.5)[0]["LRL"] == 90
+    assert [fields["LRL"] for _, fields, _ in journal.history(username="b")] == [90, 60]
+    assert journal.latest("a")[1] == BASE
+    other.engine.close()
@@ -0,0 +1,48 @@
+import dataclasses
+import pytest
+from core import param_schema, params
+from core.modes import PaceMakerMode
+
+def test_schema_covers_parameters(): #SCH-1
+    names = [f.name for f in dataclasses.fields(params.Parameters)]
+    assert sorted(names) == sorted(f.name for f in param_schema.FIELDS)
+    # sensitivities are set on the device itself, not sent
+    assert {name for name, _ in param_schema.WIRE_LAYOUT} - {"mode"} <= set(names)
+
+def test_mode_forms(): #SCH-2
+    aoo = [f["name"] for f in param_schema.form_fields(PaceMakerMode.AOO)]
+    assert aoo == ["LRL", "atrial_amp", "atrial_width"]
+    aoor = [f["name"] for f in param_schema.form_fields("AOOR")]
+    assert aoor == ["LRL", "MSR", "activity_threshold", "reaction_time", "recovery_time",
+                    "response_factor", "atrial_amp", "atrial_width"]
+    dddr = [f["name"] for f in param_schema.form_fields(PaceMakerMode.DDDR)]
+    assert dddr[-2:] == ["AV_delay", "PVARP"] and "VRP" in dddr and "ARP" in dddr
+
+def test_mode_validation_and_rules(param_values): #SCH-3
+    bad_url = dict(param_values, URL=40)
+    assert param_schema.validator_for("AOO").validate(bad_url)   # URL not used by AOO
+    with pytest.raises(ValueError):
+        param_schema.validator_for("AAI").validate(bad_url)
+    assert params.Parameters(**param_values).validate() is True
+
+    errors = param_schema.validator_for(None).errors(dict(param_values, LRL=130, MSR=110))
+    assert errors == ["URL must be greater than LRL", "MSR must be >= URL", "MSR must be greater than LRL"]
+
+    vvi = param_schema.validator_for(PaceMakerMode.VVI)
+    assert vvi is param_schema.validator_for("vvi")          # compiled once
+    assert vvi.check_field("VRP", 100) is not None
+    assert vvi.check_field("URL", 55, param_values) == "URL must be greater than LRL"
+    assert vvi.check_field("URL", 100, param_values) is None
+    assert [bool(e) for e in vvi.check_batch([param_values, dict(param_values, VRP=600)])] == [False, True]
+
+def test_schema_ranges_fit_the_packet(): #SCH-5
+    limits = {"B": 0xFF, "H": 0xFFFF}
+    for name, code in param_schema.WIRE_LAYOUT:
+        if name in param_schema.FIELDS_BY_NAME and code in limits:
+            spec = param_schema.FIELDS_BY_NAME[name]
+            assert 0 <= spec.low and spec.high <= limits[code], name
+    # every field at the top of its range round-trips
+    top = {f.name: f.high for f in param_schema.FIELDS}
+    mode, values = param_schema.decode_parameters(param_schema.encode_parameters(top, 8))
+    assert mode == 8 and values["PVARP"] == 255 and values["VRP"] == 500
+    assert values["atrial_amp"] == pytest.approx(5.0)
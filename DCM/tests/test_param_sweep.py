@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from core import param_schema, param_sweep, params
+
+def test_column_masks_match_row_validation(param_values): #SWP-1
+    rng = np.random.default_rng(0)
+    n = 500
+    table = dict(param_values)
+    table["LRL"] = rng.integers(20, 180, n)
+    table["URL"] = rng.integers(40, 180, n)
+    table["AV_delay"] = rng.integers(10, 320, n)
+    table["atrial_amp"] = rng.uniform(0.0, 5.5, n)
+    validator = param_schema.validator_for("DDDR")
+    masks = validator.check_columns(table)
+
+    for i in range(n):
+        row = {k: (v[i] if np.ndim(v) else v) for k, v in table.items()}
+        assert (masks[i] == 0) == (not validator.errors(row))
+    bad = int(np.flatnonzero(table["LRL"] < 30)[0])
+    assert "LRL" in param_schema.describe(masks[bad])
+
+def test_structured_array_input(): #SWP-2
+    table = np.zeros(3, dtype=[("LRL", "i4"), ("URL", "i4")])
+    table["LRL"] = [60, 100, 60]
+    table["URL"] = [120, 90, 200]
+    masks = param_schema.validator_for("VVI").check_columns(table)
+    assert masks[0] == 0
+    assert param_schema.describe(masks[1]) == ["URL must be greater than LRL"]
+    assert param_schema.describe(masks[2]) == ["URL"]
+
+def test_sweep_yields_valid_rows_lazily(param_values): #SWP-3
+    axes = {"LRL": range(40, 140, 10), "AV_delay": [20, 100, 200], "response_factor": [1, 8, 16]}
+    assert param_sweep.grid_size(axes) == 90
+    rows = list(param_sweep.sweep(param_values, axes, mode="DDDR", chunk_size=7))
+    # AV_delay 20 is out of range, LRL must stay below URL=120
+    assert len(rows) == 8 * 2 * 3
+    for i, row in rows:
+        assert params.Parameters(**row).validate()
+        assert isinstance(row["LRL"], int)
+
+    # grid indices are stable, so a run can pick up where it stopped
+    index, _ = rows[10]
+    assert list(param_sweep.sweep(param_values, axes, mode="DDDR", start=index + 1)) == rows[11:]
+
+def test_bad_axis(param_values): #SWP-4
+    with pytest.raises(ValueError):
+        next(param_sweep.sweep(param_values, {"heart_rate": [60]}))
+    with pytest.raises(ValueError):
+        next(param_sweep.sweep(param_values, {"LRL": []}))
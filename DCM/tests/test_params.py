@@ -1,4 +1,6 @@
+import json
 import os
+import time
 import pytest
 from core import params
 
@@ -6,7 +8,7 @@ TEST_FILE = os.path.join(os.path.dirname(__file__),"test_params.json")
 params.PARAMS_FILE = TEST_FILE
 
 @pytest.fixture(autouse=True)
-def cleanup():
+def cleanup(test_db):
     """ensure a clean slate before each test"""
     if os.path.exists(TEST_FILE):
         os.remove(TEST_FILE)
@@ -14,6 +16,10 @@ def cleanup():
     if os.path.exists(TEST_FILE):
         os.remove(TEST_FILE)
 
+@pytest.fixture
+def full_params(param_values):
+    return lambda **overrides: params.Parameters(**dict(param_values, **overrides))
+
 def test_valid_save_and_load(): #PAR-1
     p = params.Parameters(
         LRL=60,
@@ -72,4 +78,41 @@ def test_invalid_amp(): #PAR-4
         ARP=250,
     )
     with pytest.raises(ValueError):
-        p.validate()
\ No newline at end of file
+        p.validate()
+
+def test_history_is_kept(full_params): #PAR-5
+    params.save_parameters(full_params(LRL=60), username="diego", mode="VVI")
+    params.save_parameters(full_params(LRL=70), username="diego", mode="VVI")
+    params.save_parameters(full_params(LRL=80), username="mehr", mode="AAI")
+
+    assert params.load_parameters().LRL == 80
+    assert params.load_parameters("diego").LRL == 70
+    history = params.parameter_history("diego")
+    assert [p.LRL for _, p in history] == [60, 70]
+
+    params.reset_parameters_file()
+    with pytest.raises(FileNotFoundError):
+        params.load_parameters()
+    # the reset is journaled, the history before it stays
+    assert [p.LRL for _, p in params.parameter_history("diego")] == [60, 70]
+    assert params.parameters_at(time.time() + 1) is None
+    params.save_parameters(full_params(LRL=90), username="diego")
+    assert params.load_parameters().LRL == 90
+
+def test_legacy_params_file_is_migrated(full_params): #PAR-6
+    with open(TEST_FILE, "w") as f:
+        json.dump(full_params(LRL=55).to_dict(), f)
+    assert params.load_parameters().LRL == 55
+
+def test_transmitted_push_is_journaled_in_full(full_params, param_values): #PAR-7
+    wire = {k: v for k, v in param_values.items()
+            if k not in ("atrial_sensitivity", "ventricular_sensitivity")}
+    with pytest.raises(ValueError, match="atrial_sensitivity"):
+        params.record_programmed(wire, username="diego", mode="VVI")
+    assert params.parameters_at(time.time() + 1) is None
+
+    # what the GUI journals on an ACK: the current set with the pushed fields over it
+    from dataclasses import replace
+    params.record_programmed(replace(full_params(), **dict(wire, LRL=75)), username="diego", mode="VVI")
+    found, mode = params.parameters_at(time.time() + 1)
+    assert found.LRL == 75 and found.atrial_sensitivity == 0.75 and mode == "VVI"
@@ -0,0 +1,62 @@
+import os
+import time
+import numpy as np
+import pytest
+from core.sample_clock import SampleClock
+from benchmarks.sample_clock import benchmark as simulated_link
+
+def test_counter_unwrap(): #CLK-1
+    clock = SampleClock()
+    assert clock.unwrap(65500, 32) == 65500
+    assert clock.unwrap(65532, 32) == 65532
+    assert clock.unwrap(28, 32) == 65536 + 28          # wrapped
+    assert clock.unwrap(100, 32) == 65536 + 100        # 40 samples lost, still counted
+    assert clock.unwrap(60000, 32) == 60000            # far behind: device restarted
+    assert clock.observations == 0
+    assert SampleClock().advance(5) == 0
+
+def test_even_monotonic_stamps(): #CLK-2
+    clock = SampleClock()
+    first = clock.stamp(np.arange(0, 10), 100.0)
+    assert np.all(first == 100.0)                      # nothing to fit yet
+    stamps = clock.stamp(np.arange(10, 20), 100.010)
+    assert np.allclose(np.diff(stamps), 0.001) and stamps[-1] == pytest.approx(100.010)
+    late = clock.stamp(np.arange(20, 30), 100.012)     # arrived early: jitter, not a faster clock
+    assert late[0] > stamps[-1] and np.allclose(np.diff(late), np.diff(late)[0])
+    with pytest.raises(ValueError):
+        SampleClock().times([1, 2])
+
+def test_fit_removes_jitter(): #CLK-3
+    result = simulated_link(seconds=20, drift_ppm=200, jitter=0.005)
+    assert result["monotonic"]
+    assert result["clock_jitter_ms"] < result["naive_jitter_ms"] / 50
+    assert result["clock_interval_error_ms"] < 0.1 < result["naive_interval_error_ms"]
+    assert result["rate_error_ppm"] < 100
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+def test_interface_uses_device_counters(): #CLK-4
+    from core.pty_device import PtyDevice
+    from core.serial_interface import SerialInterface
+    with PtyDevice(rate=2000, burst=64, frame_version=2) as device:
+        iface = SerialInterface(device.port, frame_version=2)
+        stamps = []
+        iface.egram_batch_callback = lambda ts, a, v: stamps.append(ts)
+        iface.connect()
+        try:
+            iface.request_egram(32)
+            deadline = time.time() + 3.0
+            while sum(map(len, stamps)) < 3000 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            iface.disconnect()
+    ts = np.concatenate(stamps[1:])
+    assert np.all(np.diff(ts) > 0)
+    assert iface.clock.rate == pytest.approx(2000, rel=0.05)
+    # within a read samples are spaced by the fitted period, not piled on one instant
+    assert np.allclose(np.diff(stamps[-1]), 1 / iface.clock.rate, rtol=1e-3)  # epoch floats: ~0.2 us steps
+
+def test_first_read_uses_nominal_rate(): #CLK-5
+    from core.serial_interface import SerialInterface
+    stamps = SerialInterface("unused").clock.stamp(range(5), 10.0)
+    assert np.allclose(np.diff(stamps), 1e-3)
+    assert stamps[-1] == pytest.approx(10.0)
@@ -0,0 +1,149 @@
+import os
+import pytest
+from core import param_schema
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+
+@pytest.fixture
+def block(param_values):
+    return dict(param_values, ventricular_amp=3.3)    # not exact in float32
+
+@pytest.fixture
+def link():
+    from core.pty_device import PtyDevice
+    from core.serial_interface import SerialInterface
+    device = PtyDevice()
+    iface = SerialInterface(device.port)
+    iface.connect()
+    yield device, iface
+    iface.disconnect()
+    device.close()
+
+def test_read_back_block(link, block): #SER-1
+    device, iface = link
+    iface.send_parameters(block, 3)
+    reported = []
+    iface.params_callback = lambda mode, values: reported.append(mode)
+    mode, values = iface.read_parameters()
+    assert mode == 3 and reported == [3]
+    assert values["VRP"] == 320
+    assert values["ventricular_amp"] == pytest.approx(3.3, abs=1e-6)   # float32 on the wire
+    assert iface.verify_parameters(block, 3) == []
+
+def test_mismatches_are_reported(link, block): #SER-2
+    device, iface = link
+    iface.send_parameters(block, 3)
+    iface.read_parameters()
+    device.params = dict(device.params, VRP=300, atrial_amp=3.4)
+    mismatches = iface.verify_parameters(block, 2)
+    assert mismatches == [("mode", 2, 3), ("VRP", 320, 300),
+                          ("atrial_amp", 3.5, pytest.approx(3.4, abs=1e-6))]
+
+def test_silent_device_times_out(link): #SER-3
+    device, iface = link
+    device.responsive = False
+    with pytest.raises(TimeoutError):
+        iface.read_parameters(timeout=0.2)
+
+def test_diff_tolerance(block): #SER-4
+    reported = dict(block, atrial_amp=3.5004, atrial_width=1)
+    assert param_schema.diff_parameters(dict(block, atrial_width=1.2), reported) == []
+    assert param_schema.diff_parameters(block, dict(reported, atrial_amp=3.52)) == [("atrial_amp", 3.5, 3.52)]
+
+def test_each_ack_answers_its_own_push(block): #SER-5
+    from core.serial_interface import CMD_ACK, CMD_PARAMS_REPORT, SerialInterface
+    iface = SerialInterface("unused")
+    written = []
+    iface.serial = type("Port", (), {"write": lambda self, data: written.append(data)})()
+    a, b, c, d = (dict(block, LRL=lrl) for lrl in (60, 70, 80, 90))
+    assert iface.send_parameters(a, 1) == 1
+    iface._handle_frame(CMD_ACK, b"")
+    assert iface.last_acked == (a, 1) and iface.acked_seq == 1
+    # B's ACK is lost: the next ACK belongs to C, B is never credited
+    iface.send_parameters(b, 1)
+    iface.send_parameters(c, 1)
+    iface._handle_frame(CMD_ACK, b"")
+    assert iface.last_acked == (c, 1) and iface.acked_seq == 3
+    iface._handle_frame(CMD_ACK, b"")                   # nothing in flight
+    assert iface.acked_seq == 3
+    # an ACK after ack_timeout is not this push's
+    iface.ack_timeout = -1
+    iface.send_parameters(d, 2)
+    iface._handle_frame(CMD_ACK, b"")
+    assert iface.last_acked == (c, 1)
+    # a matching read-back confirms a push without an ACK
+    iface.send_parameters(d, 2)
+    iface._handle_frame(CMD_PARAMS_REPORT, param_schema.encode_parameters(dict(d, LRL=95), 2))
+    assert iface.last_acked == (c, 1)
+    iface._handle_frame(CMD_PARAMS_REPORT, param_schema.encode_parameters(d, 2))
+    assert iface.last_acked == (d, 2) and iface.acked_seq == 5
+    assert len(written) == 5
+
+def test_bad_frame_does_not_drop_the_link(): #SER-6
+    import threading
+    from core.egram_codec import CMD_EGRAM_PACKED
+    from core.framing import encode_frame
+    from core.serial_interface import CMD_ACK, SerialInterface
+
+    class FakePort:
+        def __init__(self, data):
+            self.data = bytearray(data)
+
+        @property
+        def in_waiting(self):
+            return len(self.data)
+
+        def read(self, n):
+            out, self.data[:n] = bytes(self.data[:n]), b""
+            return out
+
+    # a CRC-valid packed egram frame whose payload is far too short, then an ACK
+    iface = SerialInterface("unused", frame_version=2)
+    iface.serial = FakePort(encode_frame(CMD_EGRAM_PACKED, b"\x00\x01\x02") + encode_frame(CMD_ACK, b""))
+    lost, acked = [], threading.Event()
+    iface.link_lost_callback = lost.append
+    iface.ack_callback = acked.set
+    iface.running = True
+    reader = threading.Thread(target=iface._read_loop, daemon=True)
+    reader.start()
+    try:
+        assert acked.wait(2)
+        assert iface.running and lost == [] and iface.frame_errors == 1
+    finally:
+        iface.running = False
+        reader.join(1)
+
+def test_stalled_write_does_not_block_acks(block): #SER-7
+    import threading
+    from core.serial_interface import CMD_ACK, SerialInterface
+    iface = SerialInterface("unused")
+    writing, release = threading.Event(), threading.Event()
+
+    def stalled_write(data):
+        writing.set()
+        release.wait(2)
+    iface.serial = type("Port", (), {"write": lambda self, data: stalled_write(data)})()
+    pusher = threading.Thread(target=iface.send_parameters, args=(block, 1), daemon=True)
+    pusher.start()
+    try:
+        assert writing.wait(1)
+        # the read thread can still match the ACK while the adapter is stuck
+        reader = threading.Thread(target=iface._handle_frame, args=(CMD_ACK, b""), daemon=True)
+        reader.start()
+        reader.join(0.5)
+        assert not reader.is_alive()
+        assert iface.acked_seq == 1
+    finally:
+        release.set()
+        pusher.join(1)
+
+def test_stop_egram(link): #SER-8
+    import time
+    device, iface = link
+    iface.request_egram()
+    assert iface.egram_seen.wait(1) and iface.egram_request == (0, False)
+    iface.stop_egram()
+    deadline = time.time() + 1
+    while device.streaming and time.time() < deadline:
+        time.sleep(0.01)
+    assert not device.streaming and iface.egram_request is None
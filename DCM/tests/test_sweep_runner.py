@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+import pytest
+from core import sweep_runner
+from core.param_schema import decode_parameters
+
+RESULTS = os.path.join(os.path.dirname(__file__), "test_sweep.jsonl")
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    if os.path.exists(RESULTS):
+        os.remove(RESULTS)
+    yield
+    if os.path.exists(RESULTS):
+        os.remove(RESULTS)
+
+class FakeInterface:
+    """answers every push with an ACK and a burst of egram"""
+    def __init__(self, ack=True):
+        self.ack_callback = None
+        self.egram_batch_callback = None
+        self.ack = ack
+        self.stray_ack = False
+        self.sent = []
+        self.acked_seq = 0
+
+    def request_egram(self):
+        pass
+
+    def send_parameters(self, params, mode_id_val=0):
+        self.sent.append(dict(params))
+        seq = len(self.sent)
+        if self.ack:
+            threading.Timer(0.005, self._respond, (seq,)).start()
+        elif self.stray_ack:
+            # an ACK the interface could not match to this push
+            threading.Timer(0.005, self.ack_callback).start()
+        return seq
+
+    def _respond(self, seq):
+        self.acked_seq = seq
+        self.ack_callback()
+        time.sleep(0.01)
+        now = time.time()
+        self.egram_batch_callback([now + i / 1000 for i in range(50)], [20] * 50, [30] * 50)
+
+ROWS = [(i, {"LRL": 60 + 10 * i}) for i in range(4)]
+
+def test_rows_are_recorded(): #SWR-1
+    iface = FakeInterface()
+    stats = sweep_runner.SweepRunner(iface, RESULTS, window=0.05).run(ROWS)
+    assert stats["ok"] == 4
+    records = sweep_runner.load_results(RESULTS)
+    assert [r["index"] for r in records] == [0, 1, 2, 3]
+    assert records[2]["params"] == {"LRL": 80}
+    assert records[0]["samples"] == 50
+    assert records[0]["summary"]["atrial"]["mean"] == 20
+    assert iface.ack_callback is None      # callbacks restored
+
+def test_resume_after_interruption(): #SWR-2
+    iface = FakeInterface()
+    sweep_runner.SweepRunner(iface, RESULTS, window=0.02).run(ROWS, limit=2)
+    with open(RESULTS, "a") as f:
+        f.write('{"index": 2, "stat')          # killed mid-write
+    stats = sweep_runner.SweepRunner(iface, RESULTS, window=0.02).run(ROWS)
+    assert stats == {"ok": 2, "no_ack": 0, "interrupted": 0, "skipped": 2}
+    assert sweep_runner.completed_indices(RESULTS) == {0, 1, 2, 3}
+    assert len(iface.sent) == 4
+
+def test_missing_ack_is_retried_later(): #SWR-3
+    iface = FakeInterface(ack=False)
+    runner = sweep_runner.SweepRunner(iface, RESULTS, window=0.02, ack_timeout=0.02, retries=1)
+    assert runner.run(ROWS[:1])["no_ack"] == 1
+    assert len(iface.sent) == 2
+    assert sweep_runner.load_results(RESULTS)[0]["status"] == sweep_runner.STATUS_NO_ACK
+
+    iface.ack = True
+    assert sweep_runner.SweepRunner(iface, RESULTS, window=0.02).run(ROWS[:1])["ok"] == 1
+
+def test_ack_must_match_the_push(): #SWR-6
+    iface = FakeInterface(ack=False)
+    iface.stray_ack = True
+    runner = sweep_runner.SweepRunner(iface, RESULTS, window=0.02, ack_timeout=0.05, retries=1)
+    assert runner.run(ROWS[:1])["no_ack"] == 1 and len(iface.sent) == 2
+
+def test_row_source_errors_reach_the_caller(): #SWR-7
+    def rows():
+        yield ROWS[0]
+        raise ValueError("bad axis")
+    iface = FakeInterface()
+    with pytest.raises(ValueError, match="bad axis"):
+        sweep_runner.SweepRunner(iface, RESULTS, window=0.02).run(rows())
+    assert iface.ack_callback is None and sweep_runner.completed_indices(RESULTS) == {0}
+
+def test_writer_errors_reach_the_caller(monkeypatch): #SWR-8
+    def broken(*item):
+        raise RuntimeError("detector failed")
+    monkeypatch.setattr(sweep_runner, "_record", broken)
+    rows = [(i, {"LRL": 60 + i}) for i in range(100)]      # more than the results queue holds
+    iface = FakeInterface()
+    runner = sweep_runner.SweepRunner(iface, RESULTS, window=0.02)
+    errors = []
+
+    def run():
+        try:
+            runner.run(rows)
+        except RuntimeError as e:
+            errors.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()               # run() didn't block on the full results queue
+    assert [str(e) for e in errors] == ["detector failed"]
+    assert len(iface.sent) < 100 and iface.ack_callback is None
+
+def test_stop_mid_capture_is_retried(): #SWR-5
+    iface = FakeInterface()
+    runner = sweep_runner.SweepRunner(iface, RESULTS, window=5.0)
+    threading.Timer(0.2, runner.stop).start()
+    started = time.time()
+    stats = runner.run(ROWS)
+    assert time.time() - started < 2.0
+    assert stats["interrupted"] == 1 and stats["ok"] == 0
+    record, = sweep_runner.load_results(RESULTS)
+    assert record["status"] == sweep_runner.STATUS_INTERRUPTED and record["samples"] == 50
+    assert sweep_runner.completed_indices(RESULTS) == set()
+
+    stats = sweep_runner.SweepRunner(iface, RESULTS, window=0.02).run(ROWS)
+    assert stats["ok"] == 4 and [p["LRL"] for p in iface.sent] == [60, 60, 70, 80, 90]
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+def test_against_pty_device(): #SWR-4
+    from core.pty_device import PtyDevice
+    from core.serial_interface import SerialInterface
+    with PtyDevice(rate=500) as device:
+        iface = SerialInterface(device.port)
+        iface.connect()
+        try:
+            stats = sweep_runner.SweepRunner(iface, RESULTS, mode_id_val=8, window=0.2).run(ROWS[:2])
+        finally:
+            iface.disconnect()
+    assert stats["ok"] == 2
+    assert [p["LRL"] for _, p in device.received] == [60, 70]
+    assert device.received[0][0] == 8
+    assert all(r["samples"] > 0 for r in sweep_runner.load_results(RESULTS))
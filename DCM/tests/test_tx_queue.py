@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+import pytest
+from core.tx_queue import PRIORITY_BULK, PRIORITY_CONTROL, PRIORITY_URGENT, TxQueue
+
+class StalledPort:
+    """write() blocks until released, like a wedged USB-serial adapter"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.written = []
+
+    def write(self, data):
+        self.release.wait(2.0)
+        self.written.append(bytes(data))
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        time.sleep(0.005)
+    return cond()
+
+def test_urgent_preempts_bulk(): #TXQ-1
+    port = StalledPort()
+    tx = TxQueue(port.write)
+    tx.start()
+    tx.put(b"first", PRIORITY_BULK)           # the writer is stuck on this one
+    time.sleep(0.05)
+    start = time.perf_counter()
+    for i in range(5):
+        tx.put(b"bulk%d" % i, PRIORITY_BULK)
+    tx.put(b"control", PRIORITY_CONTROL)
+    tx.put(b"inhibit", PRIORITY_URGENT)
+    assert time.perf_counter() - start < 0.05  # callers never wait on the port
+    port.release.set()
+    assert wait_for(lambda: len(port.written) == 8)
+    assert port.written[:3] == [b"first", b"inhibit", b"control"]
+    assert port.written[3:] == [b"bulk%d" % i for i in range(5)]
+    tx.stop()
+
+def test_superseded_pushes_coalesce(): #TXQ-2
+    port = StalledPort()
+    tx = TxQueue(port.write)
+    tx.start()
+    tx.put(b"busy", PRIORITY_BULK)
+    time.sleep(0.05)
+    tx.put(b"params-1", PRIORITY_BULK, key="params")
+    tx.put(b"other", PRIORITY_CONTROL)
+    tx.put(b"params-2", PRIORITY_CONTROL, key="params")
+    tx.put(b"params-3", PRIORITY_BULK, key="params")   # keeps the control priority
+    assert tx.pending() == 2 and tx.stats["coalesced"] == 2
+    port.release.set()
+    tx.stop(drain=True)
+    assert port.written == [b"busy", b"other", b"params-3"]
+
+def test_latency_per_class(): #TXQ-3
+    now = [0.0]
+    written = []
+    def write(data):
+        now[0] += 0.004 if data == b"u" else 0.010
+        written.append(data)
+    tx = TxQueue(write, clock=lambda: now[0])
+    tx.put(b"b", PRIORITY_BULK)
+    tx.put(b"u", PRIORITY_URGENT)
+    tx.start()
+    tx.stop(drain=True)
+    latency = tx.latency()
+    assert written == [b"u", b"b"]
+    assert latency["urgent"]["max_ms"] == pytest.approx(4.0)
+    assert latency["bulk"]["max_ms"] == pytest.approx(14.0)
+    assert "control" not in latency and tx.stats["sent"] == 2
+    with pytest.raises(ValueError):
+        tx.put(b"x", 7)
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+def test_serial_interface_queue(): #TXQ-4
+    from core.pty_device import PtyDevice
+    from core.serial_interface import SerialInterface
+    with PtyDevice() as device:
+        iface = SerialInterface(device.port)
+        iface.connect(tx_queue=True)
+        try:
+            iface.send_parameters({"LRL": 50}, 1)
+            iface.send_parameters({"LRL": 65}, 1, priority=PRIORITY_URGENT)
+            assert iface.read_parameters()[1]["LRL"] == 65
+            # two pushes and the request: each was written or coalesced away
+            assert iface.tx.stats["sent"] + iface.tx.stats["coalesced"] == 3
+        finally:
+            iface.disconnect()
+    assert not iface.tx.running
@@ -1,15 +1,17 @@
 import os
 import pytest
-from core import user_management
+from core import storage, user_management
 
 TEST_USER_FILE = os.path.join(os.path.dirname(__file__), "test_users.json")
 user_management.USER_FILE = TEST_USER_FILE #override default file
 
 @pytest.fixture(autouse=True)
-def clear_file():
-    """Reset users.json after each test"""
-    user_management.reset_users()
+def clear_file(test_db):
+    """Start each test from an empty database and no users.json"""
+    if os.path.exists(TEST_USER_FILE):
+        os.remove(TEST_USER_FILE)
     yield
+    user_management.reset_users()
     if os.path.exists(TEST_USER_FILE):
         os.remove(TEST_USER_FILE)
 
@@ -41,4 +43,134 @@ def test_reset_users(): #UM-4s
     assert "temp" in user_management.list_users()
 
     user_management.reset_users()
-    assert user_management.list_users() == []
\ No newline at end of file
+    assert user_management.list_users() == []
+
+def test_hashes_are_salted(): #UM-5
+    user_management.register_user("ann", "same")
+    user_management.register_user("ben", "same")
+    users = user_management._loadUsers()
+    assert users["ann"] != users["ben"]
+    assert users["ann"].startswith("scrypt$")
+
+
+def test_legacy_hash_is_migrated(): #UM-6
+    import hashlib
+    user_management._saveUsers({"old": hashlib.sha256(b"pw").hexdigest()})
+
+    assert user_management.authenticate_user("old", "nope") is False
+    assert user_management.authenticate_user("old", "pw") is True
+    # the stored hash was upgraded on the successful login
+    assert user_management._loadUsers()["old"].startswith("scrypt$")
+    assert user_management.authenticate_user("old", "pw") is True
+
+
+def test_unknown_user_costs_a_kdf(monkeypatch): #UM-13
+    user_management.register_user("erin", "pw")
+    calls = []
+    scrypt = user_management._scrypt
+    monkeypatch.setattr(user_management, "_scrypt", lambda *a: calls.append(a) or scrypt(*a))
+    user_management.authenticate_user("nobody", "pw")     # first miss also makes the dummy hash
+    calls.clear()
+    assert user_management.authenticate_user("erin", "nope") is False
+    assert user_management.authenticate_user("nobody", "nope") is False
+    assert len(calls) == 2 and calls[0][2:] == calls[1][2:]   # same cost parameters
+
+
+def test_register_async(): #UM-14
+    import threading
+    results = []
+    for password in ("pw", "other"):
+        done = threading.Event()
+        user_management.register_user_async(
+            "frank", password, lambda ok, error: (results.append((ok, error)), done.set()))
+        assert done.wait(10)
+    assert results == [(True, None), (False, None)]     # the second is a duplicate
+    assert user_management.authenticate_user("frank", "pw") is True
+
+
+def test_authenticate_async(monkeypatch): #UM-7
+    import sqlite3
+    import threading
+    user_management.register_user("dana", "pw")
+    done = threading.Event()
+    results = []
+    callback = lambda ok, error: (results.append((ok, error)), done.set())
+    user_management.authenticate_user_async("dana", "pw", callback)
+    assert done.wait(10)
+    assert results == [(True, None)]
+
+    # a failing check is reported as an error, not as a wrong password
+    def locked(username, password):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(user_management, "authenticate_user", locked)
+    done.clear()
+    user_management.authenticate_user_async("dana", "pw", callback)
+    assert done.wait(10)
+    assert results[1][0] is False and isinstance(results[1][1], sqlite3.OperationalError)
+
+
+def test_session_tokens(): #UM-8
+    token = user_management.start_session("erin")
+    assert user_management.check_session(token) == "erin"
+    assert user_management.check_session("bogus") is None
+
+    user_management.end_session(token)
+    assert user_management.check_session(token) is None
+
+    expired = user_management.start_session("erin")
+    user_management._sessions[expired] = ("erin", 0.0)
+    assert user_management.check_session(expired) is None
+
+
+def test_external_change_is_picked_up(test_db): #UM-9
+    user_management.register_user("fay", "pw")
+    assert "fay" in user_management.list_users()
+
+    # another DCM process changes the database behind our back
+    other = storage.StorageEngine(os.path.abspath(test_db))
+    other.delete_user("fay")
+    other.add_user("gus", "hash")
+    other.close()
+    assert user_management.list_users() == ["gus"]
+
+
+def test_legacy_json_is_migrated(): #UM-10
+    import json
+    with open(TEST_USER_FILE, "w") as f:
+        json.dump({"hal": user_management._hashPassword("pw"), "ivy": "hash"}, f)
+
+    assert sorted(user_management.list_users()) == ["hal", "ivy"]
+    assert user_management.authenticate_user("hal", "pw") is True
+
+    # migration only happens once, later JSON edits are ignored
+    with open(TEST_USER_FILE, "w") as f:
+        json.dump({"jon": "hash"}, f)
+    assert "jon" not in user_management.list_users()
+
+
+def test_storage_scales_past_user_limit(): #UM-11
+    engine = storage.get_engine()
+    for i in range(2000):
+        assert engine.add_user(f"bulk{i}", "hash")
+    assert engine.count_users() == 2000
+    assert engine.add_user("bulk0", "other") is False
+    # the facade still enforces the product limit
+    assert user_management.register_user("late", "pw") is False
+
+
+def test_reads_are_cached(test_db): #UM-12
+    user_management.register_user("kai", "pw")
+    engine = storage.get_engine()
+    loads = []
+    get_users = engine.get_users
+    engine.get_users = lambda: loads.append(1) or get_users()
+    for _ in range(5):
+        assert user_management.list_users() == ["kai"]
+    assert len(loads) == 1
+    # a write here invalidates, so does a commit by another process
+    user_management.remove_user("kai")
+    assert user_management.list_users() == [] and len(loads) == 2
+    other = storage.StorageEngine(os.path.abspath(test_db))
+    other.add_user("lea", "hash")
+    other.close()
+    assert user_management.list_users() == ["lea"] and len(loads) == 3